@@ -1,13 +1,36 @@
-import dotenv
+import os
 import sys
 
-from PySide6 import QtWidgets
+from src.app.startup_profile import start_profile, stop_profile, startup_phase
+from src.config import STARTUP_PROFILE_ENV, STARTUP_BUDGET_MS
 
-from src.ui.window import MainWindow
+# MM_STARTUP_PROFILE=1 prints where the start up time goes
+if os.environ.get(STARTUP_PROFILE_ENV):
+    start_profile()
 
-dotenv.load_dotenv()
-app = QtWidgets.QApplication(sys.argv)
-app.setApplicationName("MusicMarkuppApp")
-window = MainWindow()
-window.show()
-sys.exit(app.exec())
\ No newline at end of file
+with startup_phase("imports"):
+    import dotenv
+    from PySide6 import QtWidgets
+    from PySide6.QtCore import QTimer
+
+    from src.ui.window import MainWindow
+
+
+def _report_startup():
+    profile = stop_profile()
+    if profile is not None:
+        print(profile.report(STARTUP_BUDGET_MS), file=sys.stderr, flush=True)
+
+
+with startup_phase("environment"):
+    dotenv.load_dotenv()
+with startup_phase("application"):
+    app = QtWidgets.QApplication(sys.argv)
+    app.setApplicationName("MusicMarkuppApp")
+with startup_phase("window"):
+    window = MainWindow()
+with startup_phase("show"):
+    window.show()
+# runs once the first frame is up
+QTimer.singleShot(0, _report_startup)
+sys.exit(app.exec())
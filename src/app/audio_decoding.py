@@ -0,0 +1,180 @@
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.config import MIDI_SF_PATH
+
+FFPROBE = shutil.which('ffprobe')
+
+
+def probe_duration(path: Path, timeout: float = 30.0) -> Optional[int]:
+    # Duration in ms from the container header, None if it can't be told without decoding
+    if path.suffix.lower() == '.wav':
+        try:
+            with wave.open(str(path)) as wav:
+                return int(wav.getnframes() * 1000 / wav.getframerate())
+        except (wave.Error, EOFError, OSError, ZeroDivisionError):
+            pass
+    if FFPROBE is None:
+        return None
+    try:
+        result = subprocess.run(
+            [FFPROBE, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', str(path)],
+            capture_output=True, text=True, timeout=timeout
+        )
+        return int(float(result.stdout.strip()) * 1000) if result.returncode == 0 else None
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
+FFMPEG = shutil.which('ffmpeg')
+FLUIDSYNTH = shutil.which('fluidsynth')
+
+
+@dataclass
+class DecodedAudio:
+    # 16-bit PCM, frames x channels
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def duration(self) -> int:
+        return self.frames * 1000 // self.sample_rate
+
+    @property
+    def nbytes(self) -> int:
+        return self.samples.nbytes
+
+    def slice(self, start: int, end: int) -> np.ndarray:
+        # Frames between start and end ms, clamped to the audio
+        first = min(self.frames, max(0, start * self.sample_rate // 1000))
+        last = min(self.frames, max(first, end * self.sample_rate // 1000))
+        return self.samples[first:last]
+
+
+def decode_audio(path: Path, sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                 timeout: float = 600.0) -> DecodedAudio:
+    # The whole file as 16-bit PCM, resampled and down/upmixed when asked to.
+    # PCM WAV is read directly, anything else goes through ffmpeg, MIDI is rendered with fluidsynth first.
+    if path.suffix.lower() in ('.mid', '.midi'):
+        return _decode_midi(path, sample_rate, channels, timeout)
+    if path.suffix.lower() == '.wav':
+        try:
+            audio = _read_wav(path)
+        except (wave.Error, EOFError):
+            # compressed or float WAV
+            audio = None
+        # ffmpeg resamples better, when it's around
+        if audio is not None and (FFMPEG is None or sample_rate in (None, audio.sample_rate)):
+            return _convert(audio, sample_rate, channels)
+    return _decode_ffmpeg(path, sample_rate, channels, timeout)
+
+
+def _read_wav(path: Path) -> DecodedAudio:
+    with wave.open(str(path)) as wav:
+        width, channel_count, sample_rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+        data = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 2:
+        samples = np.frombuffer(data, dtype='<i2')
+    elif width in (3, 4):
+        # the two most significant bytes of every little-endian sample
+        samples = np.frombuffer(data, dtype=np.uint8).reshape(-1, width)[:, -2:].copy().view('<i2').ravel()
+    else:
+        raise wave.Error(f"unsupported sample width {width}")
+    return DecodedAudio(samples.reshape(-1, channel_count).astype(np.int16, copy=False), sample_rate)
+
+
+def _convert(audio: DecodedAudio, sample_rate: Optional[int], channels: Optional[int]) -> DecodedAudio:
+    samples = audio.samples
+    if channels is not None and channels != audio.channels:
+        mono = samples.mean(axis=1, dtype=np.float64)
+        samples = np.repeat(mono[:, None], channels, axis=1).round().astype(np.int16)
+    if sample_rate is not None and sample_rate != audio.sample_rate and len(samples):
+        # Linear interpolation, only used when ffmpeg isn't around to resample properly
+        frames = len(samples) * sample_rate // audio.sample_rate
+        positions = np.arange(frames) * (audio.sample_rate / sample_rate)
+        samples = np.stack([np.interp(positions, np.arange(len(samples)), samples[:, channel])
+                            for channel in range(samples.shape[1])], axis=1).round().astype(np.int16)
+    return DecodedAudio(samples, sample_rate or audio.sample_rate)
+
+
+def _decode_ffmpeg(path: Path, sample_rate: Optional[int], channels: Optional[int], timeout: float) -> DecodedAudio:
+    if FFMPEG is None:
+        raise IOError(f"Can't decode {path.name}: ffmpeg isn't installed.")
+    if sample_rate is None or channels is None:
+        source_rate, source_channels = _probe_format(path, timeout)
+        sample_rate = sample_rate or source_rate
+        channels = channels or source_channels
+    try:
+        result = subprocess.run(
+            [FFMPEG, '-v', 'error', '-nostdin', '-i', str(path), '-f', 's16le', '-acodec', 'pcm_s16le',
+             '-ac', str(channels), '-ar', str(sample_rate), 'pipe:1'],
+            capture_output=True, timeout=timeout
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise IOError(f"Can't decode {path.name}: {e}.")
+    if result.returncode != 0:
+        raise IOError(f"Can't decode {path.name}: {result.stderr.decode(errors='replace').strip()}.")
+    samples = np.frombuffer(result.stdout, dtype='<i2')
+    return DecodedAudio(samples[:len(samples) - len(samples) % channels].reshape(-1, channels), sample_rate)
+
+
+def _probe_format(path: Path, timeout: float) -> Tuple[int, int]:
+    if FFPROBE is None:
+        raise IOError(f"Can't decode {path.name} at its own rate: ffprobe isn't installed.")
+    try:
+        result = subprocess.run(
+            [FFPROBE, '-v', 'error', '-select_streams', 'a:0', '-show_entries', 'stream=sample_rate,channels',
+             '-of', 'csv=p=0', str(path)],
+            capture_output=True, text=True, timeout=timeout
+        )
+        sample_rate, channels = result.stdout.strip().split(',')[:2]
+        return int(sample_rate), int(channels)
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        raise IOError(f"Can't read the audio format of {path.name}: {e}.")
+
+
+def _decode_midi(path: Path, sample_rate: Optional[int], channels: Optional[int], timeout: float) -> DecodedAudio:
+    if FLUIDSYNTH is None:
+        raise IOError(f"Can't render {path.name}: fluidsynth isn't installed.")
+    with tempfile.TemporaryDirectory() as directory:
+        rendered = Path(directory) / 'rendered.wav'
+        try:
+            subprocess.run([FLUIDSYNTH, '-ni', MIDI_SF_PATH, str(path), '-F', str(rendered), '-r', '44100'],
+                           capture_output=True, timeout=timeout, check=True)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise IOError(f"Can't render {path.name}: {e}.")
+        return decode_audio(rendered, sample_rate, channels, timeout)
+
+
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+WAV_HEADER_SIZE = _WAV_HEADER.size
+
+
+def wav_header(frames: int, channels: int, sample_rate: int) -> bytes:
+    # The canonical header of a 16-bit PCM file, the samples follow it
+    data_size = frames * channels * 2
+    return _WAV_HEADER.pack(b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels, sample_rate,
+                            sample_rate * channels * 2, channels * 2, 16, b'data', data_size)
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    return wav_header(samples.shape[0], samples.shape[1], sample_rate) + \
+        np.ascontiguousarray(samples, dtype='<i2').tobytes()
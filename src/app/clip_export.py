@@ -0,0 +1,277 @@
+import io
+import json
+import os
+import tarfile
+import wave
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Tuple, Iterable, Iterator, Callable, Dict, Set
+
+from src.app.audio_decoding import decode_audio, encode_wav
+from src.app.file_system_utils import atomic_write
+from src.app.markup_data import MarkupData, MarkupValue
+from src.config import CLIP_EXPORT_WORKERS
+
+# Files of an export directory
+MANIFEST_FILE = 'manifest.jsonl'
+SETTINGS_FILE = 'export.json'
+SHARD_INDEX_FILE = 'shards.jsonl'
+CLIPS_DIRECTORY = 'clips'
+
+
+@dataclass
+class ClipExportSettings:
+    # None keeps the source's sample rate or channel count
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    # None writes a directory tree of clips, otherwise tar shards of about this many bytes
+    shard_size: Optional[int] = None
+    workers: int = CLIP_EXPORT_WORKERS
+
+
+@dataclass
+class ClipSource:
+    content_hash: str
+    relative_path: Path
+    labels: List[MarkupValue]
+
+
+@dataclass
+class ClipExportProgress:
+    # counted in labels, labels with the same range share one clip
+    labels: int = 0
+    written: int = 0
+    # clips already exported by a previous run with the same settings
+    up_to_date: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)
+    finished: bool = False
+
+
+class ClipExportCancelled(Exception):
+    pass
+
+
+def clip_sources(data: MarkupData) -> Iterator[ClipSource]:
+    # Labeled entries that aren't corrupted, in entry order
+    for content_hash, relative_path, is_corrupted, labels in data.labeled_entries():
+        if not is_corrupted:
+            yield ClipSource(content_hash, relative_path, labels)
+
+
+def clip_key(content_hash: str, start: int, end: int) -> str:
+    # The content hash changes with the file, so a clip under the same key never goes stale
+    return f'{content_hash}_{start}_{end}'
+
+
+def export_clips(sources: Iterable[ClipSource], dataset_dir: Path, output_dir: Path, settings: ClipExportSettings,
+                 on_progress: Optional[Callable[[ClipExportProgress], None]] = None,
+                 is_cancelled: Callable[[], bool] = lambda: False) -> ClipExportProgress:
+    # Cuts every label into its own WAV clip, decoding each source file once in a process pool, and writes
+    # manifest.jsonl with a record per label. Clips left by an earlier run with the same settings are kept,
+    # so an interrupted export picks up where it stopped. Raises ClipExportCancelled when cancelled,
+    # the clips written so far are kept for the next run.
+    output_dir.mkdir(parents=True, exist_ok=True)
+    exported = _ExportedClips(output_dir, settings)
+    progress = ClipExportProgress()
+    window = max(1, settings.workers) * 2
+    pending: Dict[Future, Tuple[ClipSource, Dict[str, List[MarkupValue]]]] = {}
+
+    def collect(done: Set[Future], manifest):
+        for future in done:
+            source, clips = pending.pop(future)
+            try:
+                sample_rate, channels, results = future.result()
+            except Exception as e:
+                progress.failed += sum(len(labels) for labels in clips.values())
+                progress.errors.append(f"{source.relative_path}: {e}")
+                continue
+            for key, frames, clip in results:
+                if not frames:
+                    progress.failed += len(clips[key])
+                    progress.errors.append(f"{source.relative_path}: {key} is outside the audio")
+                    continue
+                location = exported.add(key, sample_rate, channels, frames, clip)
+                _write_records(manifest, source, clips[key], location, sample_rate, channels, frames)
+                progress.written += len(clips[key])
+        if on_progress is not None:
+            on_progress(progress)
+
+    with ProcessPoolExecutor(max(1, settings.workers)) as executor, atomic_write(output_dir / MANIFEST_FILE) as manifest:
+        try:
+            for source in sources:
+                if is_cancelled():
+                    raise ClipExportCancelled()
+                clips: Dict[str, List[MarkupValue]] = {}
+                for label in source.labels:
+                    clips.setdefault(clip_key(source.content_hash, label.start, label.end), []).append(label)
+                progress.labels += len(source.labels)
+
+                missing = {}
+                for key, labels in clips.items():
+                    known = exported.get(key)
+                    if known is None:
+                        missing[key] = labels
+                        continue
+                    location, sample_rate, channels, frames = known
+                    _write_records(manifest, source, labels, location, sample_rate, channels, frames)
+                    progress.up_to_date += len(labels)
+                if not missing:
+                    continue
+
+                ranges = [(key, labels[0].start, labels[0].end) for key, labels in missing.items()]
+                future = executor.submit(_cut_clips, str(dataset_dir / source.relative_path), ranges,
+                                         settings.sample_rate, settings.channels, exported.clip_directory)
+                pending[future] = source, missing
+                if len(pending) >= window:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done, manifest)
+            while pending:
+                if is_cancelled():
+                    raise ClipExportCancelled()
+                collect(wait(pending, return_when=FIRST_COMPLETED).done, manifest)
+        except ClipExportCancelled:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            exported.close()
+    progress.finished = True
+    if on_progress is not None:
+        on_progress(progress)
+    return progress
+
+
+def _write_records(manifest, source: ClipSource, labels: List[MarkupValue], location: Dict[str, str],
+                   sample_rate: int, channels: int, frames: int):
+    for label in labels:
+        record = {**location, 'content_hash': source.content_hash, 'relative_path': source.relative_path.as_posix(),
+                  'start': label.start, 'end': label.end, 'description': label.description,
+                  'sample_rate': sample_rate, 'channels': channels, 'frames': frames}
+        manifest.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+def _cut_clips(path: str, ranges: List[Tuple[str, int, int]], sample_rate: Optional[int], channels: Optional[int],
+               clip_directory: Optional[str]) -> Tuple[int, int, List[Tuple[str, int, Optional[bytes]]]]:
+    # Runs in a worker process. Clips are written to clip_directory, or returned for a tar shard.
+    audio = decode_audio(Path(path), sample_rate, channels)
+    results = []
+    for key, start, end in ranges:
+        samples = audio.slice(start, end)
+        if not len(samples):
+            results.append((key, 0, None))
+            continue
+        clip = encode_wav(samples, audio.sample_rate)
+        if clip_directory is not None:
+            clip_path = Path(clip_directory) / _clip_name(key)
+            clip_path.parent.mkdir(parents=True, exist_ok=True)
+            # a clip under its final name is always complete, clips aren't worth an fsync each
+            temporary_path = clip_path.with_name(f'.{clip_path.name}.{os.getpid()}.tmp')
+            temporary_path.write_bytes(clip)
+            os.replace(temporary_path, clip_path)
+            clip = None
+        results.append((key, len(samples), clip))
+    return audio.sample_rate, audio.channels, results
+
+
+def _clip_name(key: str) -> str:
+    return f'{key[:2]}/{key}.wav'
+
+
+class _ExportedClips:
+    # Clips of the output directory that can be reused, and where new ones go.
+    # Clip files are named after their key. Tar shards are listed in shards.jsonl once complete,
+    # a shard an interrupted run left half written is written over.
+    def __init__(self, output_dir: Path, settings: ClipExportSettings):
+        self._output_dir = output_dir
+        self._shard_size = settings.shard_size
+        state = {'version': 1, 'sample_rate': settings.sample_rate, 'channels': settings.channels,
+                 'shard_size': settings.shard_size}
+        settings_path = output_dir / SETTINGS_FILE
+        try:
+            reusable = json.loads(settings_path.read_text()) == state
+        except (OSError, ValueError):
+            reusable = False
+        with atomic_write(settings_path) as file:
+            file.write(json.dumps(state).encode('utf-8'))
+
+        # key -> (shard name, sample rate, channels, frames), for shards
+        self._shard_clips: Dict[str, Tuple[str, int, int, int]] = {}
+        self._reusable = reusable
+        self._shard_count = 0
+        self._shard: Optional[tarfile.TarFile] = None
+        self._shard_file = None
+        self._shard_index: Dict[str, List[int]] = {}
+        index_path = output_dir / SHARD_INDEX_FILE
+        if self._shard_size is not None:
+            if reusable and index_path.exists():
+                with open(index_path, encoding='utf-8') as index:
+                    for line in index:
+                        try:
+                            shard = json.loads(line)
+                        except ValueError:
+                            # torn by a crash while appending
+                            break
+                        for key, (sample_rate, channels, frames) in shard['clips'].items():
+                            self._shard_clips[key] = shard['shard'], sample_rate, channels, frames
+                        self._shard_count += 1
+            else:
+                index_path.unlink(missing_ok=True)
+
+    @property
+    def clip_directory(self) -> Optional[str]:
+        return str(self._output_dir / CLIPS_DIRECTORY) if self._shard_size is None else None
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, str], int, int, int]]:
+        # (manifest location, sample rate, channels, frames) of an exported clip
+        if not self._reusable:
+            return None
+        if self._shard_size is not None:
+            known = self._shard_clips.get(key)
+            if known is None:
+                return None
+            shard, sample_rate, channels, frames = known
+            return {'shard': shard, 'clip': f'{key}.wav'}, sample_rate, channels, frames
+        name = _clip_name(key)
+        try:
+            with wave.open(str(self._output_dir / CLIPS_DIRECTORY / name)) as clip:
+                return ({'clip': f'{CLIPS_DIRECTORY}/{name}'}, clip.getframerate(), clip.getnchannels(),
+                        clip.getnframes())
+        except (OSError, EOFError, wave.Error):
+            return None
+
+    def add(self, key: str, sample_rate: int, channels: int, frames: int, clip: Optional[bytes]) -> Dict[str, str]:
+        if self._shard_size is None:
+            return {'clip': f'{CLIPS_DIRECTORY}/{_clip_name(key)}'}
+        if self._shard is None:
+            name = self._shard_name()
+            self._shard_file = open(self._output_dir / name, 'wb')
+            self._shard = tarfile.open(fileobj=self._shard_file, mode='w', format=tarfile.USTAR_FORMAT)
+        info = tarfile.TarInfo(f'{key}.wav')
+        info.size = len(clip)
+        self._shard.addfile(info, io.BytesIO(clip))
+        self._shard_index[key] = [sample_rate, channels, frames]
+        location = {'shard': self._shard_name(), 'clip': info.name}
+        if self._shard_file.tell() >= self._shard_size:
+            self._finish_shard()
+        return location
+
+    def _shard_name(self) -> str:
+        return f'shard-{self._shard_count:05d}.tar'
+
+    def _finish_shard(self):
+        self._shard.close()
+        self._shard_file.flush()
+        os.fsync(self._shard_file.fileno())
+        self._shard_file.close()
+        with open(self._output_dir / SHARD_INDEX_FILE, 'a', encoding='utf-8') as index:
+            index.write(json.dumps({'shard': self._shard_name(), 'clips': self._shard_index}) + '\n')
+            index.flush()
+            os.fsync(index.fileno())
+        self._shard, self._shard_file = None, None
+        self._shard_index = {}
+        self._shard_count += 1
+
+    def close(self):
+        # The last shard is kept even when smaller, a cancelled run doesn't lose its clips
+        if self._shard is not None:
+            self._finish_shard()
@@ -0,0 +1,93 @@
+import hashlib
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, TypeVar, Deque, Callable, Dict, List
+
+from src.app.scan_settings import ScanSettings
+
+T = TypeVar('T')
+
+HASH_ALGORITHMS: Dict[str, Callable[[], 'hashlib._Hash']] = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+    'blake2s': hashlib.blake2s,
+}
+
+try:
+    import blake3
+
+    HASH_ALGORITHMS['blake3'] = blake3.blake3
+except ImportError:
+    pass
+
+try:
+    import xxhash
+
+    HASH_ALGORITHMS['xxh3'] = xxhash.xxh3_128
+except ImportError:
+    pass
+
+
+def available_algorithms() -> List[str]:
+    return list(HASH_ALGORITHMS)
+
+
+def hash_file(path: Path, chunk_size: int, algorithm: str = 'md5') -> str:
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}.")
+    digest = HASH_ALGORITHMS[algorithm]()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as file:
+        while read := file.readinto(buffer):
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+class ContentHasher:
+    def __init__(self, settings: ScanSettings, algorithm: Optional[str] = None):
+        self._settings = settings
+        self._algorithm = algorithm or settings.hash_algorithm
+        self._executor: Optional[Executor] = None
+        if self._algorithm not in HASH_ALGORITHMS:
+            raise ValueError(f"Unsupported hash algorithm: {self._algorithm}.")
+
+    def __enter__(self) -> 'ContentHasher':
+        workers = max(1, self._settings.hash_workers)
+        if self._settings.use_processes:
+            self._executor = ProcessPoolExecutor(workers)
+        else:
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix='content-hasher')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+    @property
+    def algorithm(self) -> str:
+        return self._algorithm
+
+    def hash_ordered(self, items: Iterable[Tuple[T, Optional[Path]]]) -> Iterator[Tuple[T, Optional[str]]]:
+        # Items come paired with a path to hash, or None when the digest is already known.
+        # Results keep the input order, and only a bounded window of files is in flight at once.
+        window = max(1, self._settings.hash_workers) * 2
+        pending: Deque[Tuple[T, Optional[Future]]] = deque()
+        in_flight = 0
+        for item, path in items:
+            future = None
+            if path is not None:
+                future = self._executor.submit(hash_file, path, self._settings.hash_chunk_size, self._algorithm)
+                in_flight += 1
+            pending.append((item, future))
+            while pending and (pending[0][1] is None or in_flight > window):
+                head, head_future = pending.popleft()
+                if head_future is not None:
+                    in_flight -= 1
+                yield head, head_future.result() if head_future is not None else None
+        while pending:
+            head, head_future = pending.popleft()
+            yield head, head_future.result() if head_future is not None else None
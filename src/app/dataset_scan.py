@@ -0,0 +1,48 @@
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from src.app.fingerprint_cache import FileFingerprint
+
+
+@dataclass
+class ScannedEntry:
+    relative_path: Path
+    fingerprint: FileFingerprint
+    content_hash: str
+    # False when the digest came from the fingerprint cache
+    hashed: bool
+
+
+@dataclass
+class ScanProgress:
+    # files found by the previous scan, the best guess of the total before the walk ends
+    expected_files: int = 0
+    files_seen: int = 0
+    files_hashed: int = 0
+    bytes_hashed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished: bool = False
+
+    def record(self, scanned: ScannedEntry):
+        self.files_seen += 1
+        if scanned.hashed:
+            self.files_hashed += 1
+            self.bytes_hashed += scanned.fingerprint.size
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.bytes_hashed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        remaining = self.expected_files - self.files_seen
+        if self.finished or self.files_seen == 0 or remaining <= 0:
+            return None
+        return self.elapsed / self.files_seen * remaining
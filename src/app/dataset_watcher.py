@@ -0,0 +1,296 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Dict, Tuple
+
+from src.app.file_system_utils import PathRules, scan_files
+from src.app.fingerprint_cache import FileFingerprint
+
+
+@dataclass
+class DatasetEvent:
+    class Kind:
+        CREATED = 'created'
+        MODIFIED = 'modified'
+        DELETED = 'deleted'
+        MOVED = 'moved'
+        # the watcher lost track of changes, only a full update_state is reliable
+        RESCAN = 'rescan'
+
+    kind: str
+    relative_path: Optional[Path] = None
+    dest_path: Optional[Path] = None
+    is_directory: bool = False
+
+
+class DatasetWatcher(ABC):
+    def __init__(self, directory: Path, rules: PathRules):
+        self._directory = directory
+        self._rules = rules
+        self._events: queue.SimpleQueue[DatasetEvent] = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def poll(self) -> List[DatasetEvent]:
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    @abstractmethod
+    def _run(self):
+        pass
+
+    def _is_tracked(self, path: Path) -> bool:
+        try:
+            return self._rules.accepts_file(path.relative_to(self._directory))
+        except ValueError:
+            return False
+
+    def _emit(self, kind: str, relative_path: Optional[Path] = None, dest_path: Optional[Path] = None,
+              is_directory: bool = False):
+        self._events.put(DatasetEvent(kind, relative_path, dest_path, is_directory))
+
+
+class PollingWatcher(DatasetWatcher):
+    # Fallback for platforms without inotify. Every poll stats the whole tree, but nothing is hashed.
+    def __init__(self, directory: Path, rules: PathRules, interval: float = 5.0):
+        super().__init__(directory, rules)
+        self._interval = interval
+        self._snapshot: Dict[Path, FileFingerprint] = {}
+
+    def _take_snapshot(self) -> Dict[Path, FileFingerprint]:
+        snapshot = {}
+        for scanned in scan_files(self._directory, self._rules):
+            snapshot[scanned.path.relative_to(self._directory)] = FileFingerprint.of(scanned.stat)
+        return snapshot
+
+    def _run(self):
+        self._snapshot = self._take_snapshot()
+        while not self._stop.wait(self._interval):
+            current = self._take_snapshot()
+            appeared = {path: fp for path, fp in current.items() if path not in self._snapshot}
+            vanished = {path: fp for path, fp in self._snapshot.items() if path not in current}
+
+            # A rename keeps the inode, size and mtime
+            appeared_by_fingerprint = {fp: path for path, fp in appeared.items()}
+            for old_path, fingerprint in vanished.items():
+                new_path = appeared_by_fingerprint.pop(fingerprint, None)
+                if new_path is not None:
+                    del appeared[new_path]
+                    self._emit(DatasetEvent.Kind.MOVED, old_path, new_path)
+                else:
+                    self._emit(DatasetEvent.Kind.DELETED, old_path)
+            for new_path in appeared:
+                self._emit(DatasetEvent.Kind.CREATED, new_path)
+            for path, fingerprint in current.items():
+                previous = self._snapshot.get(path)
+                if previous is not None and previous != fingerprint:
+                    self._emit(DatasetEvent.Kind.MODIFIED, path)
+
+            self._snapshot = current
+
+
+class InotifyWatcher(DatasetWatcher):
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_DELETE_SELF = 0x00000400
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_ONLYDIR = 0x01000000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = os.O_NONBLOCK
+    _IN_CLOEXEC = os.O_CLOEXEC
+
+    _WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+                   | _IN_ONLYDIR)
+    _EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, directory: Path, rules: PathRules, poll_interval: float = 5.0):
+        super().__init__(directory, rules)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = -1
+        self._watches: Dict[int, Path] = {}
+        self._poll_interval = poll_interval
+        # takes over once a directory can't be watched, e.g. past the inotify watch limit
+        self._fallback: Optional[PollingWatcher] = None
+        self._watch_failed = False
+
+    @staticmethod
+    def is_supported() -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        library = ctypes.util.find_library('c')
+        return library is not None and hasattr(ctypes.CDLL(library), 'inotify_init1')
+
+    def start(self):
+        self._fd = self._libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Could not initialize inotify.")
+        self._watch_failed = False
+        if not self._add_watch_tree(self._directory):
+            # Nothing has been missed yet, polling starts from the current state
+            self._fall_back_to_polling()
+            return
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self._fallback is not None:
+            self._fallback.stop()
+        self._fallback = None
+        self._close()
+
+    def poll(self) -> List[DatasetEvent]:
+        events = super().poll()
+        if self._fallback is not None:
+            events.extend(self._fallback.poll())
+        return events
+
+    def _close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+        self._fd = -1
+        self._watches.clear()
+
+    def _fall_back_to_polling(self):
+        self._close()
+        self._fallback = PollingWatcher(self._directory, self._rules, self._poll_interval)
+        self._fallback.start()
+
+    def _add_watch_tree(self, directory: Path) -> bool:
+        # False when a directory couldn't be watched, its changes would go unnoticed
+        for root, dirs, _ in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), self._WATCH_MASK)
+            if wd < 0:
+                self._watch_failed = True
+                return False
+            self._watches[wd] = Path(root)
+        return True
+
+    def _relative(self, path: Path) -> Path:
+        return path.relative_to(self._directory)
+
+    def _run(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._dispatch(self._parse(buffer))
+            if self._watch_failed:
+                # Changes under the directory that couldn't be watched were missed
+                self._emit(DatasetEvent.Kind.RESCAN)
+                self._fall_back_to_polling()
+                return
+
+    def _parse(self, buffer: bytes):
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = self._EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self._EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def _dispatch(self, events):
+        # Moves within the tree arrive as MOVED_FROM/MOVED_TO pairs sharing a cookie
+        moved_from: Dict[int, Tuple[Path, bool]] = {}
+        for wd, mask, cookie, name in events:
+            if mask & self._IN_Q_OVERFLOW:
+                self._emit(DatasetEvent.Kind.RESCAN)
+                continue
+            if mask & self._IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            parent = self._watches.get(wd)
+            if parent is None or not name:
+                continue
+            path = parent / name
+            is_directory = bool(mask & self._IN_ISDIR)
+
+            if mask & self._IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_directory)
+            elif mask & self._IN_MOVED_TO:
+                source, _ = moved_from.pop(cookie, (None, False))
+                if source is None:
+                    self._appeared(path, is_directory)
+                elif is_directory:
+                    self._retarget_watches(source, path)
+                    self._emit(DatasetEvent.Kind.MOVED, self._relative(source), self._relative(path), True)
+                elif self._is_tracked(source) or self._is_tracked(path):
+                    self._emit(DatasetEvent.Kind.MOVED, self._relative(source), self._relative(path))
+            elif mask & self._IN_CREATE:
+                # Files are reported once written (CLOSE_WRITE), directories right away
+                if is_directory:
+                    self._appeared(path, True)
+            elif mask & self._IN_CLOSE_WRITE:
+                if self._is_tracked(path):
+                    self._emit(DatasetEvent.Kind.MODIFIED, self._relative(path))
+            elif mask & self._IN_DELETE:
+                if is_directory or self._is_tracked(path):
+                    self._emit(DatasetEvent.Kind.DELETED, self._relative(path), is_directory=is_directory)
+
+        # Moved out of the watched tree
+        for source, is_directory in moved_from.values():
+            if is_directory:
+                self._remove_watches(source)
+                self._emit(DatasetEvent.Kind.DELETED, self._relative(source), is_directory=True)
+            elif self._is_tracked(source):
+                self._emit(DatasetEvent.Kind.DELETED, self._relative(source))
+
+    def _appeared(self, path: Path, is_directory: bool):
+        if is_directory:
+            self._add_watch_tree(path)
+            relative = self._relative(path)
+            if self._rules.accepts_directory(relative):
+                for scanned in scan_files(path, self._rules, relative_root=relative.as_posix()):
+                    self._emit(DatasetEvent.Kind.CREATED, self._relative(scanned.path))
+        elif self._is_tracked(path):
+            self._emit(DatasetEvent.Kind.CREATED, self._relative(path))
+
+    def _remove_watches(self, directory: Path):
+        for wd, watched in list(self._watches.items()):
+            if watched == directory or directory in watched.parents:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _retarget_watches(self, source: Path, destination: Path):
+        for wd, watched in self._watches.items():
+            if watched == source or source in watched.parents:
+                self._watches[wd] = destination / watched.relative_to(source)
+
+
+def create_watcher(directory: Path, rules: PathRules, poll_interval: float = 5.0) -> DatasetWatcher:
+    if InotifyWatcher.is_supported():
+        return InotifyWatcher(directory, rules, poll_interval)
+    return PollingWatcher(directory, rules, poll_interval)
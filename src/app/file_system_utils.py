@@ -1,8 +1,158 @@
-from pathlib import Path
+import fnmatch
+import itertools
+import os
+import re
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path, PurePath
+from typing import Iterable, Iterator, NamedTuple, Optional, List, Tuple, BinaryIO
+
+
+class ScannedFile(NamedTuple):
+    path: Path
+    stat: os.stat_result
+
+
+class PathRules:
+    def __init__(self, suffixes: Iterable[str], include: Iterable[str] = (), exclude: Iterable[str] = (),
+                 max_depth: Optional[int] = None):
+        self._suffixes = frozenset(suffix.lower() for suffix in suffixes)
+        self._include = PathRules._compile(include)
+        self._exclude = PathRules._compile(exclude)
+        self._max_depth = max_depth
+
+    @staticmethod
+    def _compile(patterns: Iterable[str]) -> Optional[re.Pattern]:
+        patterns = [pattern for pattern in patterns if pattern]
+        if not patterns:
+            return None
+        return re.compile('|'.join(f'(?:{fnmatch.translate(pattern)})' for pattern in patterns))
+
+    def accepts_suffix(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self._suffixes
+
+    def accepts_file(self, relative_path: PurePath) -> bool:
+        if not self.accepts_suffix(relative_path.name):
+            return False
+        if self._max_depth is not None and len(relative_path.parts) - 1 > self._max_depth:
+            return False
+        posix = relative_path.as_posix()
+        if self._exclude is not None and self._exclude.match(posix):
+            return False
+        return self._include is None or self._include.match(posix) is not None
+
+    def accepts_directory(self, relative_path: PurePath) -> bool:
+        if self._max_depth is not None and len(relative_path.parts) > self._max_depth:
+            return False
+        return self._exclude is None or not self._exclude.match(relative_path.as_posix())
+
+
+def _scan_directory(directory: str, relative: str, rules: PathRules) -> Tuple[List[ScannedFile], List[Tuple[str, str]]]:
+    files = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as iterator:
+            entries = sorted(iterator, key=lambda e: e.name)
+    except OSError:
+        return files, subdirectories
+
+    for entry in entries:
+        entry_relative = f'{relative}/{entry.name}' if relative else entry.name
+        try:
+            # d_type answers these without a stat call, only matching files get stat-ed
+            if entry.is_dir(follow_symlinks=False):
+                if rules.accepts_directory(PurePath(entry_relative)):
+                    subdirectories.append((entry.path, entry_relative))
+            elif rules.accepts_suffix(entry.name) and entry.is_file() \
+                    and rules.accepts_file(PurePath(entry_relative)):
+                files.append(ScannedFile(Path(entry.path), entry.stat()))
+        except OSError:
+            continue
+    return files, subdirectories
+
+
+def scan_files(directory_path, rules: PathRules, workers: int = 1, relative_root: str = '') -> Iterator[ScannedFile]:
+    # Streams files in a deterministic depth-first order. With several workers, the next subdirectories
+    # are scanned ahead in parallel while the caller consumes the ones before them, a few per worker
+    # so that a wide tree doesn't pile up listings nobody has asked for yet.
+    # relative_root places directory_path inside the tree the rules are written against.
+    root = os.fspath(directory_path)
+    if workers <= 1:
+        stack = [(root, relative_root)]
+        while stack:
+            directory, relative = stack.pop()
+            files, subdirectories = _scan_directory(directory, relative, rules)
+            yield from files
+            stack.extend(reversed(subdirectories))
+        return
+
+    window = workers * 4
+    with ThreadPoolExecutor(workers, thread_name_prefix='dataset-walker') as executor:
+        # (directory, relative path, its scan once submitted), the last one is consumed next
+        stack: List[list] = [[root, relative_root, None]]
+        in_flight = 0
+        while stack:
+            # Scans ahead from the top of the stack, its next entry is always submitted
+            for entry in reversed(stack):
+                if entry[2] is None:
+                    if in_flight >= window and entry is not stack[-1]:
+                        break
+                    entry[2] = executor.submit(_scan_directory, entry[0], entry[1], rules)
+                    in_flight += 1
+                elif in_flight >= window:
+                    break
+            future: Future = stack.pop()[2]
+            in_flight -= 1
+            files, subdirectories = future.result()
+            stack.extend([directory, relative, None] for directory, relative in reversed(subdirectories))
+            yield from files
 
 
 def iterate_files(directory_path, suffixes):
-    directory = Path(directory_path)
-    for file_path in directory.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in suffixes:
-            yield file_path
+    for scanned in scan_files(directory_path, PathRules(suffixes)):
+        yield scanned.path
+
+
+def warm_page_cache(path: Path, max_bytes: int, chunk_size: int = 1024 * 1024) -> int:
+    # Pulls up to max_bytes of the file into the OS page cache, returns how much was requested
+    try:
+        with open(path, 'rb') as file:
+            size = min(os.fstat(file.fileno()).st_size, max_bytes)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(file.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+                return size
+            buffer = bytearray(chunk_size)
+            remaining = size
+            while remaining > 0 and file.readinto(buffer):
+                remaining -= chunk_size
+            return size
+    except OSError:
+        return 0
+
+
+_atomic_write_counter = itertools.count()
+
+
+@contextmanager
+def atomic_write(path: Path) -> Iterator[BinaryIO]:
+    # Writes go to a temporary file beside path that replaces it once it's fsynced,
+    # so a crash leaves either the old file or the new one, never a torn mix
+    # Every call gets its own temporary name, concurrent writes of one path never share a file
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}.{next(_atomic_write_counter)}.tmp')
+    file = open(temporary, 'xb')
+    try:
+        with file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # the rename itself is durable once the directory is synced
+        directory = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
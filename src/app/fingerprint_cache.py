@@ -0,0 +1,144 @@
+import os
+import threading
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Iterable, Self, List, Set
+
+from src.app.snapshot import FrozenState
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @classmethod
+    def of(cls, stat_result: os.stat_result) -> Self:
+        return cls(stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+
+class FingerprintCache:
+    # Doubles as the reverse index (relative path -> content hash) of MarkupData.
+    # Pickled as columns, which are decoded into entries the first time the cache is used after a load.
+    # The scan looks files up from its worker thread while the owning thread stores its results, the lock
+    # keeps the size buckets from changing under a lookup.
+    def __init__(self):
+        self._entries: Dict[Path, Tuple[FileFingerprint, str]] = {}
+        self._by_size: Dict[int, Set[Path]] = {}
+        self._columns: Optional[dict] = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        return self._columns if self._columns is not None else self._encode(self._entries)
+
+    def __setstate__(self, state):
+        self._entries = {}
+        self._by_size = {}
+        self._columns = None
+        self._lock = threading.RLock()
+        if '_entries' in state:
+            # Projects saved before the cache was pickled as columns
+            for path, (fingerprint, content_hash) in state['_entries'].items():
+                self.store(path, fingerprint, content_hash)
+        elif state['count']:
+            self._columns = state
+
+    def snapshot(self) -> FrozenState:
+        if self._columns is not None:
+            # nothing changed since the load, the columns are never modified
+            return FrozenState(FingerprintCache, self._columns)
+        # fingerprint entries are immutable tuples, a shallow copy is enough, encoding waits for the pickling thread
+        entries = dict(self._entries)
+        return FrozenState(FingerprintCache, {}, lambda state: state.update(self._encode(entries)))
+
+    @staticmethod
+    def _encode(entries: Dict[Path, Tuple[FileFingerprint, str]]) -> dict:
+        fingerprints = [fingerprint for fingerprint, _ in entries.values()]
+        return {
+            'count': len(entries),
+            'paths': '\0'.join(path.as_posix() for path in entries).encode('utf-8'),
+            'hashes': '\0'.join(content_hash for _, content_hash in entries.values()).encode('utf-8'),
+            'sizes': array('q', [fingerprint.size for fingerprint in fingerprints]).tobytes(),
+            'mtimes': array('q', [fingerprint.mtime_ns for fingerprint in fingerprints]).tobytes(),
+            'inodes': array('Q', [fingerprint.inode for fingerprint in fingerprints]).tobytes(),
+        }
+
+    def _decoded(self) -> Dict[Path, Tuple[FileFingerprint, str]]:
+        # The first access may come from either thread
+        if self._columns is not None:
+            with self._lock:
+                columns = self._columns
+                if columns is not None:
+                    paths = bytes(columns['paths']).decode('utf-8').split('\0')
+                    hashes = bytes(columns['hashes']).decode('utf-8').split('\0')
+                    sizes = memoryview(columns['sizes']).cast('q')
+                    mtimes = memoryview(columns['mtimes']).cast('q')
+                    inodes = memoryview(columns['inodes']).cast('Q')
+                    for path, content_hash, size, mtime_ns, inode in zip(paths, hashes, sizes, mtimes, inodes):
+                        path = Path(path)
+                        self._entries[path] = (FileFingerprint(size, mtime_ns, inode), content_hash)
+                        self._by_size.setdefault(size, set()).add(path)
+                    self._columns = None
+        return self._entries
+
+    def lookup(self, relative_path: Path, fingerprint: FileFingerprint) -> Optional[str]:
+        with self._lock:
+            cached = self._decoded().get(relative_path)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        return None
+
+    def find_same_file(self, fingerprint: FileFingerprint) -> Optional[Tuple[Path, str]]:
+        # A rename or move keeps size, mtime and inode, so only one size bucket has to be searched
+        with self._lock:
+            entries = self._decoded()
+            for path in self._by_size.get(fingerprint.size, ()):
+                cached = entries[path]
+                if cached[0] == fingerprint:
+                    return path, cached[1]
+        return None
+
+    def hash_of(self, relative_path: Path) -> Optional[str]:
+        cached = self._decoded().get(relative_path)
+        return cached[1] if cached is not None else None
+
+    def store(self, relative_path: Path, fingerprint: FileFingerprint, content_hash: str):
+        with self._lock:
+            self.discard(relative_path)
+            self._decoded()[relative_path] = (fingerprint, content_hash)
+            self._by_size.setdefault(fingerprint.size, set()).add(relative_path)
+
+    def get(self, relative_path: Path) -> Optional[Tuple[FileFingerprint, str]]:
+        return self._decoded().get(relative_path)
+
+    def discard(self, relative_path: Path) -> Optional[Tuple[FileFingerprint, str]]:
+        with self._lock:
+            cached = self._decoded().pop(relative_path, None)
+            if cached is not None:
+                bucket = self._by_size[cached[0].size]
+                bucket.discard(relative_path)
+                if not bucket:
+                    del self._by_size[cached[0].size]
+        return cached
+
+    def paths_under(self, directory: Path) -> List[Path]:
+        return [path for path in self._decoded() if directory in path.parents]
+
+    def retain(self, relative_paths: Iterable[Path]):
+        # Drops records of files that are gone, so the cache doesn't grow with every rename
+        keep = set(relative_paths)
+        with self._lock:
+            for path in [path for path in self._decoded() if path not in keep]:
+                self.discard(path)
+
+    def clear(self):
+        with self._lock:
+            self._columns = None
+            self._entries.clear()
+            self._by_size.clear()
+
+    def __len__(self):
+        columns = self._columns
+        return columns['count'] if columns is not None else len(self._entries)
@@ -1,20 +1,68 @@
-import hashlib
-from collections import OrderedDict
+import copy
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional, Callable
+from typing import List, Optional, Callable, Iterable, Iterator, Set, Dict, Tuple, TYPE_CHECKING
 
-import pandas as pd
-from pandas import DataFrame
+import numpy as np
 
-from src.app.file_system_utils import iterate_files
-from src.config import AUDIO_FILES_PATTERN
+from src.app.content_hashing import ContentHasher, hash_file
+from src.app.dataset_scan import ScannedEntry
+from src.app.dataset_watcher import DatasetEvent
+from src.app.file_system_utils import scan_files
+from src.app.fingerprint_cache import FingerprintCache, FileFingerprint
+from src.app.markup_journal import MarkupJournal
+from src.app.markup_query import MarkupQuery
+from src.app.markup_store import MarkupStore
+from src.app.scan_settings import ScanSettings
+from src.app.snapshot import FrozenState
+from src.config import LABEL_BATCH_SIZE
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
 
 
-@dataclass
 class MarkupEntryInfo:
-    relative_path: Path
-    is_corrupted: bool = False
+    # View over a MarkupStore row
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: MarkupStore, row: int):
+        self._store = store
+        self._row = row
+
+    def __setstate__(self, state):
+        # Projects pickled before the columnar store held plain dataclasses, MarkupData converts them
+        self._store = None
+        self._row = state
+
+    def __eq__(self, other):
+        return isinstance(other, MarkupEntryInfo) and self._store is other._store and self._row == other._row
+
+    def __repr__(self):
+        return f'MarkupEntryInfo(relative_paths={self.relative_paths!r}, is_corrupted={self.is_corrupted})'
+
+    # every dataset path holding this content, the first one is shown and played
+    @property
+    def relative_paths(self) -> List[Path]:
+        return self._store.paths(self._row)
+
+    @property
+    def relative_path(self) -> Path:
+        return self._store.primary_path(self._row)
+
+    @property
+    def is_corrupted(self) -> bool:
+        return self._store.is_corrupted(self._row)
+
+    @property
+    def file_size(self) -> Optional[int]:
+        file_size = self._store.file_size(self._row)
+        return file_size if file_size >= 0 else None
+
+    # in ms, known once the file has been played
+    @property
+    def duration(self) -> Optional[int]:
+        duration = self._store.duration(self._row)
+        return duration if duration >= 0 else None
 
 
 @dataclass
@@ -24,81 +72,694 @@ class MarkupValue:
     description: str
 
 
-@dataclass
 class MarkupEntry:
-    entry_info: MarkupEntryInfo
-    values: List[MarkupValue] = field(default_factory=list)
+    # View over a MarkupStore row, values are decoded on every access
+    __slots__ = ('_store', '_row')
 
+    def __init__(self, store: MarkupStore, row: int):
+        self._store = store
+        self._row = row
 
-@dataclass
+    def __setstate__(self, state):
+        self._store = None
+        self._row = state
+
+    def __eq__(self, other):
+        return isinstance(other, MarkupEntry) and self._store is other._store and self._row == other._row
+
+    def __repr__(self):
+        return f'MarkupEntry(entry_info={self.entry_info!r}, label_count={self.label_count})'
+
+    @property
+    def entry_info(self) -> MarkupEntryInfo:
+        return MarkupEntryInfo(self._store, self._row)
+
+    @property
+    def values(self) -> List[MarkupValue]:
+        return [MarkupValue(*self._store.label(label_id)) for label_id in self._store.label_ids(self._row)]
+
+    @property
+    def label_count(self) -> int:
+        return self._store.label_count(self._row)
+
+    # position of the entry in appearance order
+    @property
+    def index(self) -> int:
+        return self._row
+
+
+@dataclass(slots=True)
 class MarkupView:
-    md5: str
+    content_hash: str
     entry: MarkupEntry
 
 
+@dataclass
+class MarkupChange:
+    class Kind:
+        ADDED = 'added'
+        # labels, paths or corruption of existing entries changed
+        CHANGED = 'changed'
+        # every entry may have changed (hash migration), listeners should rebuild
+        RESET = 'reset'
+
+    kind: str
+    content_hashes: List[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class IndexQuery:
+    skip_corrupted: bool = False
+    # only entries with exactly this many labels
+    label_count: Optional[int] = None
+    order_by_label_count: bool = False
+
+
+@dataclass
+class MarkupStatistics:
+    entries: int
+    corrupted_entries: int
+    labeled_entries: int
+    labels: int
+    # sizes and durations add up the entries where they are known, durations are in ms
+    dataset_bytes: int
+    known_durations: int
+    total_duration: int
+    labeled_duration: int
+    hash_algorithm: str
+
+
+@dataclass
+class RehashedEntry:
+    # None when none of the entry's files is left
+    content_hash: Optional[str]
+    fingerprints: Dict[Path, FileFingerprint]
+
+
 class MarkupData:
-    def __init__(self, dataset_dir: Path):
+    def __init__(self, dataset_dir: Path, scan_settings: Optional[ScanSettings] = None, scan: bool = True,
+                 store: Optional[MarkupStore] = None):
+        # store - a MarkupStore or a SqliteMarkupStore, they share the same interface
         self._directory: Path = dataset_dir
-        self._data: OrderedDict[str, MarkupEntry] = OrderedDict()
-        self.update_state()
-
-    def update_state(self):
-        new_state: OrderedDict[str, MarkupEntry] = OrderedDict()
-        for file_path in iterate_files(self._directory, AUDIO_FILES_PATTERN):
-            with open(file_path, 'rb') as file:
-                file_md5 = hashlib.md5(file.read()).hexdigest()
-                relative_path = file_path.relative_to(self._directory)
-
-                old_entry = self._data.get(file_md5)
-                old_values = old_entry.values if bool(old_entry) else []
-
-                new_state[file_md5] = MarkupEntry(
-                    MarkupEntryInfo(relative_path),
-                    old_values
+        self._scan_settings = scan_settings or ScanSettings()
+        self._hash_algorithm = self._scan_settings.hash_algorithm
+        self._store = store if store is not None else MarkupStore()
+        self._fingerprints = FingerprintCache()
+        # rows not yet confirmed by the scan in progress (None - no scan is running)
+        self._pending_verification: Optional[Set[int]] = None
+        self._scan_seen_paths: List[Path] = []
+        self._listeners: List[Callable[[MarkupChange], None]] = []
+        # rows changed since the listeners were last notified -> MarkupChange.Kind
+        self._changed_rows: Dict[int, str] = {}
+        self._reset_pending = False
+        self._journal: Optional[MarkupJournal] = None
+        # bumped by flushes of label edits and re-keying, tells whether a save is due. Scan results and
+        # durations aren't counted, the next scan finds them again.
+        self._generation = 0
+        if scan:
+            self.update_state()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pending_verification'] = None
+        state['_scan_seen_paths'] = []
+        del state['_listeners']
+        del state['_changed_rows']
+        del state['_reset_pending']
+        del state['_journal']
+        del state['_generation']
+        return state
+
+    def snapshot(self, memo: Optional[dict] = None) -> FrozenState:
+        # memo is shared with the deep copy of the project settings, which hold the same ScanSettings
+        state = self.__getstate__()
+        state['_store'] = self._store.snapshot()
+        state['_fingerprints'] = self._fingerprints.snapshot()
+        state['_scan_settings'] = copy.deepcopy(self._scan_settings, memo)
+        return FrozenState(MarkupData, state)
+
+    def __setstate__(self, state):
+        # Projects saved before the fingerprint cache existed
+        state.setdefault('_fingerprints', FingerprintCache())
+        state.setdefault('_scan_settings', ScanSettings())
+        state.setdefault('_hash_algorithm', 'md5')
+        state.setdefault('_pending_verification', None)
+        state.setdefault('_scan_seen_paths', [])
+        state['_listeners'] = []
+        state['_changed_rows'] = {}
+        state['_reset_pending'] = False
+        state['_journal'] = None
+        state['_generation'] = 0
+        if '_data' in state:
+            state['_store'] = MarkupData._convert_legacy_entries(state.pop('_data'))
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _convert_legacy_entries(data) -> MarkupStore:
+        store = MarkupStore()
+        for content_hash, legacy_entry in data.items():
+            entry_state = legacy_entry._row
+            info_state = entry_state['entry_info']._row
+            if 'relative_paths' in info_state:
+                relative_paths = info_state['relative_paths']
+            else:
+                relative_paths = [info_state['relative_path']]
+            row = store.append_entry(content_hash, relative_paths, info_state.get('is_corrupted', False))
+            for index, value in enumerate(entry_state['values']):
+                store.insert_label(row, index, value.start, value.end, value.description)
+        return store
+
+    def update_state(self, full_verify: bool = False):
+        # full_verify ignores cached fingerprints, for when file mtimes can't be trusted
+        self.begin_scan()
+        for scanned in self.scan(full_verify):
+            self.apply_scanned((scanned,))
+        self.finish_scan()
+
+    # A scan is split so that scan() can run on a worker thread. It only reads MarkupData,
+    # while begin_scan, apply_scanned and finish_scan mutate it on the owning thread.
+    def begin_scan(self):
+        if self._scan_settings.hash_algorithm != self._hash_algorithm:
+            self.migrate_hash_algorithm(self._scan_settings.hash_algorithm)
+        self._pending_verification = set(range(len(self._store)))
+        self._scan_seen_paths = []
+
+    def scan(self, full_verify: bool = False) -> Iterator[ScannedEntry]:
+        with ContentHasher(self._scan_settings, self._hash_algorithm) as hasher:
+            for (relative_path, fingerprint, cached_content_hash), hashed_content_hash in hasher.hash_ordered(
+                    self._fingerprinted_files(full_verify)):
+                yield ScannedEntry(
+                    relative_path,
+                    fingerprint,
+                    cached_content_hash or hashed_content_hash,
+                    cached_content_hash is None
                 )
-        for old_md5, old_entry in self._data.items():
-            if old_md5 not in new_state:
-                old_entry.entry_info.is_corrupted = True
-                new_state[old_md5] = old_entry
-        self._data = new_state
-
-    def get(self, md5: str) -> Optional[MarkupView]:
-        entry = self._data.get(md5)
-        if entry is not None:
-            return MarkupView(md5, entry)
+
+    def apply_scanned(self, entries: Iterable[ScannedEntry]):
+        for scanned in entries:
+            relative_path = scanned.relative_path
+            self._fingerprints.store(relative_path, scanned.fingerprint, scanned.content_hash)
+            self._scan_seen_paths.append(relative_path)
+
+            row = self._store.row_of(scanned.content_hash)
+            if row is not None and self._store.file_size(row) != scanned.fingerprint.size:
+                self._store.set_file_size(row, scanned.fingerprint.size)
+                self._touch(row)
+            if row in self._pending_verification:
+                # First sighting in this scan, the paths are rebuilt from scratch
+                self._pending_verification.discard(row)
+                if self._store.is_corrupted(row) or self._store.paths(row) != [relative_path]:
+                    self._store.set_paths(row, [relative_path])
+                    self._store.set_corrupted(row, False)
+                    self._touch(row)
+            elif row is None:
+                row = self._store.append_entry(scanned.content_hash, [relative_path],
+                                               file_size=scanned.fingerprint.size)
+                self._touch(row, MarkupChange.Kind.ADDED)
+            else:
+                paths = self._store.paths(row)
+                if relative_path not in paths:
+                    self._store.set_paths(row, paths + [relative_path])
+                    self._touch(row)
+        self._flush_changes()
+
+    def finish_scan(self):
+        for row in self._pending_verification:
+            if not self._store.is_corrupted(row):
+                self._store.set_corrupted(row, True)
+                self._touch(row)
+        self._fingerprints.retain(self._scan_seen_paths)
+        self._pending_verification = None
+        self._scan_seen_paths = []
+        self._flush_changes()
+
+    def abort_scan(self):
+        # Leaves unconfirmed entries as they were instead of marking them corrupted
+        self._pending_verification = None
+        self._scan_seen_paths = []
+
+    @property
+    def scan_in_progress(self) -> bool:
+        return self._pending_verification is not None
+
+    def is_verified(self, content_hash: str) -> bool:
+        return self._pending_verification is None or self._store.row_of(content_hash) not in self._pending_verification
+
+    @property
+    def known_file_count(self) -> int:
+        return len(self._fingerprints)
+
+    def migrate_hash_algorithm(self, algorithm: str, rehashed: Optional[List[RehashedEntry]] = None):
+        # rehashed - what rehash returned for migration_sources(), when it was run on a worker thread.
+        # Entries can't be added in between, it holds one result per entry.
+        if rehashed is None:
+            rehashed = list(self.rehash(self.migration_sources(), algorithm))
+        old_store = self._store
+        if len(rehashed) != len(old_store):
+            raise ValueError("Entries were added to the project while it was rehashed.")
+        new_store = old_store.create_empty()
+        new_fingerprints = FingerprintCache()
+        for old_row, entry in enumerate(rehashed):
+            old_hash = old_store.hash_at(old_row)
+            is_corrupted = old_store.is_corrupted(old_row)
+            new_hash = entry.content_hash
+            if new_hash is None:
+                # The file is gone, so there is nothing to rehash. The old key is kept, tagged with
+                # its algorithm, so the labels survive and can't collide with the new keys.
+                new_hash = old_hash if ':' in old_hash else f'{self._hash_algorithm}:{old_hash}'
+                is_corrupted = True
+            for relative_path, path_fingerprint in entry.fingerprints.items():
+                new_fingerprints.store(relative_path, path_fingerprint, new_hash)
+            new_row = new_store.row_of(new_hash)
+            if new_row is None:
+                new_row = new_store.append_entry(new_hash, old_store.paths(old_row), is_corrupted,
+                                                 old_store.file_size(old_row))
+                new_store.set_duration(new_row, old_store.duration(old_row))
+            for label_id in old_store.label_ids(old_row):
+                new_store.insert_label(new_row, new_store.label_count(new_row), *old_store.label(label_id))
+        self._store = new_store
+        self._fingerprints = new_fingerprints
+        self._hash_algorithm = algorithm
+        self._scan_settings.hash_algorithm = algorithm
+        self._reset_pending = True
+        self._flush_changes(edited=True)
+        old_store.close()
+
+    def migration_sources(self) -> List[List[Path]]:
+        # The paths of every entry, for rehash
+        return [self._store.paths(row) for row in range(len(self._store))]
+
+    def rehash(self, sources: List[List[Path]], algorithm: str) -> Iterator[RehashedEntry]:
+        # The slow half of migrate_hash_algorithm, it doesn't touch the store so it can run on a worker thread.
+        # Yields an entry for each of sources, in order.
+        with ContentHasher(self._scan_settings, algorithm) as hasher:
+            for relative_paths, new_hash in hasher.hash_ordered(self._migration_files(sources)):
+                fingerprints = {}
+                if new_hash is not None:
+                    for relative_path in relative_paths:
+                        try:
+                            fingerprints[relative_path] = FileFingerprint.of(self.absolute_path(relative_path).stat())
+                        except OSError:
+                            continue
+                yield RehashedEntry(new_hash, fingerprints)
+
+    def _migration_files(self, sources: List[List[Path]]):
+        for relative_paths in sources:
+            # Any surviving copy will do, they all share the content
+            path = next((path for path in map(self.absolute_path, relative_paths) if path.exists()), None)
+            yield relative_paths, path
+
+    @property
+    def hash_algorithm(self) -> str:
+        return self._hash_algorithm
+
+    def _fingerprinted_files(self, full_verify: bool):
+        for scanned in scan_files(self._directory, self._scan_settings.path_rules(), self._scan_settings.walk_workers):
+            relative_path = scanned.path.relative_to(self._directory)
+            fingerprint = FileFingerprint.of(scanned.stat)
+            cached_content_hash = None
+            if not full_verify:
+                cached_content_hash = self._fingerprints.lookup(relative_path, fingerprint)
+                if cached_content_hash is None:
+                    # Renamed or moved since the last scan
+                    same_file = self._fingerprints.find_same_file(fingerprint)
+                    cached_content_hash = same_file[1] if same_file is not None else None
+            yield (relative_path, fingerprint, cached_content_hash), scanned.path if cached_content_hash is None else None
+
+    def hash_event_files(self, events: List[DatasetEvent]) -> Dict[Path, Tuple[FileFingerprint, str]]:
+        # The slow half of apply_events, it only reads MarkupData so it can run on a worker thread.
+        # Hashes the files the events brought in or changed, apply_events reuses the ones still unchanged.
+        rules = self._scan_settings.path_rules()
+        changed = list(self._event_destinations(events).values())
+        changed.extend(event.dest_path for event in events
+                       if event.kind == DatasetEvent.Kind.MOVED and not event.is_directory
+                       and self._fingerprints.hash_of(event.relative_path) is None)
+        hashed = {}
+        for relative_path in changed:
+            if not rules.accepts_file(relative_path):
+                continue
+            path = self._directory / relative_path
+            try:
+                fingerprint = FileFingerprint.of(path.stat())
+                if self._fingerprints.lookup(relative_path, fingerprint) is None:
+                    hashed[relative_path] = (fingerprint, hash_file(path, self._scan_settings.hash_chunk_size,
+                                                                    self._hash_algorithm))
+            except OSError:
+                # gone again, apply_events finds out
+                continue
+        return hashed
+
+    def apply_events(self, events: Iterable[DatasetEvent],
+                     hashed: Optional[Dict[Path, Tuple[FileFingerprint, str]]] = None):
+        # Targeted counterpart of update_state, costs O(changes) instead of a full walk.
+        # hashed - the result of hash_event_files for the same events, files missing from it are hashed here.
+        events = list(events)
+        hashed = hashed or {}
+        destinations = self._event_destinations(events)
+        for i, event in enumerate(events):
+            if event.kind == DatasetEvent.Kind.RESCAN:
+                self.update_state()
+            elif event.is_directory:
+                for relative_path in self._fingerprints.paths_under(event.relative_path):
+                    if event.kind == DatasetEvent.Kind.MOVED:
+                        self._file_moved(relative_path, event.dest_path / relative_path.relative_to(event.relative_path))
+                    elif event.kind == DatasetEvent.Kind.DELETED:
+                        self._file_deleted(relative_path)
+            elif event.kind in (DatasetEvent.Kind.CREATED, DatasetEvent.Kind.MODIFIED):
+                self._file_changed(destinations[i], hashed)
+            elif event.kind == DatasetEvent.Kind.DELETED:
+                self._file_deleted(event.relative_path)
+            elif event.kind == DatasetEvent.Kind.MOVED:
+                self._file_moved(event.relative_path, event.dest_path, hashed)
+        self._flush_changes()
+
+    @staticmethod
+    def _event_destinations(events: List[DatasetEvent]) -> Dict[int, Path]:
+        # Where the file of each created or modified event is now, by event index.
+        # It may have been carried along by a directory move later in the same batch.
+        directory_moves = [i for i, event in enumerate(events)
+                           if event.kind == DatasetEvent.Kind.MOVED and event.is_directory]
+        destinations = {}
+        for i, event in enumerate(events):
+            if event.kind in (DatasetEvent.Kind.CREATED, DatasetEvent.Kind.MODIFIED) and not event.is_directory:
+                relative_path = event.relative_path
+                for later in (events[j] for j in directory_moves if j > i):
+                    if later.relative_path in relative_path.parents:
+                        relative_path = later.dest_path / relative_path.relative_to(later.relative_path)
+                destinations[i] = relative_path
+        return destinations
+
+    def _file_changed(self, relative_path: Path, hashed: Dict[Path, Tuple[FileFingerprint, str]]):
+        if not self._scan_settings.path_rules().accepts_file(relative_path):
+            self._file_deleted(relative_path)
+            return
+        path = self._directory / relative_path
+        try:
+            fingerprint = FileFingerprint.of(path.stat())
+        except OSError:
+            self._file_deleted(relative_path)
+            return
+        cached = self._fingerprints.get(relative_path)
+        if cached is not None and cached[0] == fingerprint:
+            return
+        known = hashed.get(relative_path)
+        if known is not None and known[0] == fingerprint:
+            content_hash = known[1]
+        else:
+            content_hash = hash_file(path, self._scan_settings.hash_chunk_size, self._hash_algorithm)
+        if cached is not None and cached[1] != content_hash:
+            # The old content is gone from this path, same as a full rescan would see it
+            self._detach_path(cached[1], relative_path)
+        self._fingerprints.store(relative_path, fingerprint, content_hash)
+        self._attach_path(content_hash, relative_path, fingerprint.size)
+
+    def _file_deleted(self, relative_path: Path):
+        cached = self._fingerprints.discard(relative_path)
+        if cached is not None:
+            self._detach_path(cached[1], relative_path)
+
+    def _file_moved(self, source: Path, destination: Path,
+                    hashed: Optional[Dict[Path, Tuple[FileFingerprint, str]]] = None):
+        if not self._scan_settings.path_rules().accepts_file(destination):
+            self._file_deleted(source)
+            return
+        cached = self._fingerprints.discard(source)
+        if cached is None:
+            self._file_changed(destination, hashed or {})
+            return
+        self._fingerprints.store(destination, *cached)
+        row = self._store.row_of(cached[1])
+        paths = self._store.paths(row) if row is not None else []
+        if row is not None and not self._store.is_corrupted(row) and source in paths:
+            paths[paths.index(source)] = destination
+            self._store.set_paths(row, paths)
+            self._touch(row)
+        else:
+            self._attach_path(cached[1], destination)
+
+    def _attach_path(self, content_hash: str, relative_path: Path, file_size: int = -1):
+        row = self._store.row_of(content_hash)
+        if row is None:
+            self._touch(self._store.append_entry(content_hash, [relative_path], file_size=file_size),
+                        MarkupChange.Kind.ADDED)
+        elif self._store.is_corrupted(row):
+            # Paths of a corrupted entry are only the last known ones
+            self._store.set_paths(row, [relative_path])
+            self._store.set_corrupted(row, False)
+            self._touch(row)
+        else:
+            paths = self._store.paths(row)
+            if relative_path not in paths:
+                self._store.set_paths(row, paths + [relative_path])
+                self._touch(row)
+
+    def _detach_path(self, content_hash: str, relative_path: Path):
+        row = self._store.row_of(content_hash)
+        if row is None:
+            return
+        paths = self._store.paths(row)
+        if relative_path not in paths:
+            return
+        if len(paths) > 1:
+            paths.remove(relative_path)
+            self._store.set_paths(row, paths)
+        else:
+            self._store.set_corrupted(row, True)
+        self._touch(row)
+
+    def find_by_path(self, relative_path: Path) -> Optional[MarkupView]:
+        content_hash = self._fingerprints.hash_of(relative_path)
+        return self.get(content_hash) if content_hash is not None else None
+
+    def _view(self, row: int) -> MarkupView:
+        return MarkupView(self._store.hash_at(row), MarkupEntry(self._store, row))
+
+    def _row(self, content_hash: str) -> int:
+        row = self._store.row_of(content_hash)
+        if row is None:
+            raise KeyError(content_hash)
+        return row
+
+    def get(self, content_hash: str) -> Optional[MarkupView]:
+        row = self._store.row_of(content_hash)
+        if row is not None:
+            return self._view(row)
         return None
 
-    def add(self, md5: str, markup: MarkupValue, index: int = 0):
-        self._data[md5].values.insert(index, markup)
+    def add(self, content_hash: str, markup: MarkupValue, index: int = 0):
+        row = self._row(content_hash)
+        self._store.insert_label(row, index, markup.start, markup.end, markup.description)
+        self._journal_label_edit('add', row, index, markup)
+        self._touch(row)
+        self._flush_changes(edited=True)
+
+    def append_labels(self, labels: Iterable[Tuple[str, MarkupValue]]):
+        # Appends each label after the labels of its entry, with one commit and notification for all of them
+        for content_hash, markup in labels:
+            row = self._row(content_hash)
+            index = self._store.label_count(row)
+            self._store.insert_label(row, index, markup.start, markup.end, markup.description)
+            self._journal_label_edit('add', row, index, markup)
+            self._touch(row)
+        self._flush_changes(edited=True)
+
+    def update(self, content_hash: str, idx: int, markup: MarkupValue):
+        row = self._row(content_hash)
+        self._store.replace_label(row, idx, markup.start, markup.end, markup.description)
+        self._journal_label_edit('update', row, idx, markup)
+        self._touch(row)
+        self._flush_changes(edited=True)
+
+    def delete(self, content_hash: str, idx: int):
+        row = self._row(content_hash)
+        self._store.remove_label(row, idx)
+        self._journal_label_edit('delete', row, idx)
+        self._touch(row)
+        self._flush_changes(edited=True)
 
-    def update(self, md5: str, idx: int, markup: MarkupValue):
-        self._data[md5].values[idx] = markup
+    def attach_journal(self, journal: Optional[MarkupJournal]):
+        self._journal = journal
 
-    def delete(self, md5: str, idx: int):
-        self._data[md5].values.pop(idx)
+    def _journal_label_edit(self, op: str, row: int, index: int, markup: Optional[MarkupValue] = None):
+        if self._journal is None:
+            return
+        record = {'op': op, 'hash': self._store.hash_at(row), 'path': self._store.primary_path(row).as_posix(),
+                  'index': index}
+        if markup is not None:
+            record.update(start=markup.start, end=markup.end, description=markup.description)
+        self._journal.append(record)
+
+    def replay_journal(self, records: Iterable[dict]) -> int:
+        # Label edits of entries the snapshot doesn't know yet recreate them, the next scan verifies them
+        replayed = 0
+        for record in records:
+            content_hash = record['hash']
+            if self._store.row_of(content_hash) is None:
+                self._touch(self._store.append_entry(content_hash, [Path(record['path'])]), MarkupChange.Kind.ADDED)
+            try:
+                if record['op'] == 'add':
+                    self.add(content_hash, MarkupValue(record['start'], record['end'], record['description']),
+                             record['index'])
+                elif record['op'] == 'update':
+                    self.update(content_hash, record['index'],
+                                MarkupValue(record['start'], record['end'], record['description']))
+                elif record['op'] == 'delete':
+                    self.delete(content_hash, record['index'])
+            except (KeyError, IndexError):
+                # Doesn't fit the snapshot, whatever follows can't be trusted either
+                break
+            replayed += 1
+        self._flush_changes()
+        return replayed
 
     def filter(self, predicate: Callable[[MarkupView], bool]) -> List[MarkupView]:
-        return [view for key, entry in self._data.items() if predicate(view := MarkupView(key, entry))]
+        return [view for row in range(len(self._store)) if predicate(view := self._view(row))]
+
+    def select(self, query: IndexQuery, refine: Optional[MarkupQuery] = None) -> List[MarkupView]:
+        # Answered from the store's indexes in O(result), unlike filter
+        rows = self._store.select_rows(query.skip_corrupted, query.label_count, query.order_by_label_count, refine)
+        return [self._view(row) for row in rows]
+
+    def refine(self, views: List[MarkupView], query: MarkupQuery) -> List[MarkupView]:
+        rows = np.array([view.entry.index for view in views], dtype=np.int64)
+        return [view for view, matched in zip(views, query.mask(self._store, rows)) if matched]
+
+    def matches(self, query: MarkupQuery, content_hash: str) -> bool:
+        return bool(query.mask(self._store, np.array([self._row(content_hash)], dtype=np.int64))[0])
+
+    def set_duration(self, content_hash: str, duration: int):
+        row = self._row(content_hash)
+        if self._store.duration(row) != duration:
+            self._store.set_duration(row, duration)
+            self._touch(row)
+            self._flush_changes()
+
+    def __len__(self):
+        return len(self._store)
+
+    def statistics(self) -> MarkupStatistics:
+        label_counts = self._store.label_count_column()
+        file_sizes = self._store.file_size_column()
+        durations = self._store.duration_column()
+        known = np.flatnonzero(durations > 0)
+        return MarkupStatistics(
+            entries=len(self._store),
+            corrupted_entries=int(self._store.corrupted_column().sum()),
+            labeled_entries=int(np.count_nonzero(label_counts)),
+            labels=int(label_counts.sum()),
+            dataset_bytes=int(file_sizes[file_sizes > 0].sum()),
+            known_durations=len(known),
+            total_duration=int(durations[known].sum()),
+            labeled_duration=int(self._store.labeled_duration(known).sum()) if len(known) else 0,
+            hash_algorithm=self._hash_algorithm
+        )
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
 
     def absolute_path(self, relative_path: Path):
         return self._directory / relative_path
 
-    def refresh_entry(self, md5):
-        entry = self._data.get(md5, None)
-        if entry:
-            path = self._directory / entry.entry_info.relative_path
-            entry.entry_info.is_corrupted = not path.exists()
-
-    def to_df(self) -> DataFrame:
-        unpacked_rows = [{
-            'md5': md5,
-            'relative_path': markup_entry.entry_info.relative_path,
-            'is_corrupted': markup_entry.entry_info.is_corrupted,
-            'start': value.start,
-            'end': value.end,
-            'description': value.description
-        } for md5, markup_entry in self._data.items()
-            for value in markup_entry.values
-        ]
-
-        return pd.DataFrame(unpacked_rows)
+    def refresh_entry(self, content_hash):
+        row = self._store.row_of(content_hash)
+        if row is not None:
+            paths = self._store.paths(row)
+            existing = [path for path in paths if self.absolute_path(path).exists()]
+            if self._store.is_corrupted(row) != (not existing):
+                self._store.set_corrupted(row, not existing)
+                self._touch(row)
+            if existing and existing != paths:
+                self._store.set_paths(row, existing)
+                self._touch(row)
+            self._flush_changes()
+
+    def add_listener(self, listener: Callable[[MarkupChange], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[MarkupChange], None]):
+        self._listeners.remove(listener)
+
+    def _touch(self, row: int, kind: str = MarkupChange.Kind.CHANGED):
+        # an entry added and then changed before the flush is still reported as added
+        self._changed_rows.setdefault(row, kind)
+
+    def _flush_changes(self, edited: bool = False):
+        # edited - the changes are label edits or re-keying, which make a save due
+        self._store.commit()
+        changed_rows, self._changed_rows = self._changed_rows, {}
+        reset, self._reset_pending = self._reset_pending, False
+        if reset:
+            changes = [MarkupChange(MarkupChange.Kind.RESET)]
+        else:
+            changes = [MarkupChange(kind, [self._store.hash_at(row) for row, row_kind in changed_rows.items()
+                                           if row_kind == kind])
+                       for kind in (MarkupChange.Kind.ADDED, MarkupChange.Kind.CHANGED)]
+        for change in changes:
+            if change.kind == MarkupChange.Kind.RESET or change.content_hashes:
+                if edited:
+                    self._generation += 1
+                for listener in list(self._listeners):
+                    listener(change)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def uses_database(self) -> bool:
+        return self._store.is_persistent
+
+    def attach_database(self, path: Path, copy: bool = False):
+        # A database store is pickled without its contents, it's reopened from path after loading,
+        # or from a temporary copy of it
+        if copy:
+            self._store.open_copy(path)
+        else:
+            self._store.open(path)
+
+    def save_database(self, path: Path):
+        self._store.save_to(path)
+
+    def close(self):
+        self._store.close()
+
+    # Columns of a markup export, one row per label
+    COLUMNS = ('content_hash', 'hash_algorithm', 'relative_path', 'is_corrupted', 'start', 'end', 'description')
+
+    def label_batches(self, batch_size: int = LABEL_BATCH_SIZE) -> Iterator[Dict[str, np.ndarray]]:
+        # Labels in entry order, a batch of at most batch_size at a time, as numpy columns named after COLUMNS
+        for batch in self._store.label_batches(batch_size):
+            batch = dict(batch)
+            content_hashes = batch.pop('content_hash')
+            hash_algorithms = np.empty(len(content_hashes), dtype=object)
+            hash_algorithms[:] = self._hash_algorithm
+            yield {'content_hash': content_hashes, 'hash_algorithm': hash_algorithms, **batch}
+
+    def labeled_entries(self) -> Iterator[Tuple[str, Path, bool, List[MarkupValue]]]:
+        # (content hash, path, is corrupted, labels) of every labeled entry in entry order, read in batches
+        current = None
+        for batch in self.label_batches():
+            for content_hash, relative_path, is_corrupted, start, end, description in zip(
+                    batch['content_hash'], batch['relative_path'], batch['is_corrupted'].tolist(),
+                    batch['start'].tolist(), batch['end'].tolist(), batch['description']):
+                if current is None or current[0] != content_hash:
+                    if current is not None:
+                        yield current
+                    current = (content_hash, relative_path, is_corrupted, [])
+                current[3].append(MarkupValue(start, end, description))
+        if current is not None:
+            yield current
+
+    def iter_df(self, batch_size: int = LABEL_BATCH_SIZE) -> Iterator['DataFrame']:
+        # pandas is slow to import, it's loaded on the first export
+        import pandas as pd
+        for batch in self.label_batches(batch_size):
+            yield pd.DataFrame(batch)
+
+    def to_df(self) -> 'DataFrame':
+        import pandas as pd
+        frames = list(self.iter_df())
+        if not frames:
+            return pd.DataFrame({column: [] for column in MarkupData.COLUMNS})
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
@@ -0,0 +1,144 @@
+import gzip
+import json
+import pickle
+from pathlib import Path
+from typing import Optional, Sequence, List, BinaryIO
+
+import numpy as np
+
+from src.app.file_system_utils import atomic_write
+from src.app.markup_data import MarkupData
+from src.config import MARKUP_FILE_SUFFIX, LABEL_BATCH_SIZE
+
+
+class ExportFormat:
+    PARQUET = 'parquet'
+    ARROW = 'arrow'
+    JSONL = 'jsonl'
+    # pickled pandas DataFrame, the only format before the streaming ones
+    DATAFRAME = 'dataframe'
+
+    SUFFIXES = {
+        '.parquet': PARQUET,
+        '.arrow': ARROW,
+        '.feather': ARROW,
+        '.jsonl': JSONL,
+        MARKUP_FILE_SUFFIX: DATAFRAME,
+    }
+    # accepted values of compression, the first one is the default
+    COMPRESSIONS = {
+        PARQUET: ('zstd', 'snappy', 'gzip', 'none'),
+        ARROW: ('zstd', 'lz4', 'none'),
+        JSONL: ('none', 'gzip'),
+        DATAFRAME: ('none',),
+    }
+
+    @staticmethod
+    def of(path: Path) -> str:
+        suffixes = path.suffixes
+        if suffixes and suffixes[-1] == '.gz':
+            suffixes = suffixes[:-1]
+        export_format = ExportFormat.SUFFIXES.get(suffixes[-1].lower() if suffixes else '')
+        if export_format is None:
+            raise ValueError(f"Unknown export format of {path.name}, expected one of: "
+                             f"{', '.join(ExportFormat.SUFFIXES)}.")
+        return export_format
+
+
+def export_markup(data: MarkupData, path: Path, export_format: Optional[str] = None,
+                  columns: Optional[Sequence[str]] = None, compression: Optional[str] = None,
+                  batch_size: int = LABEL_BATCH_SIZE) -> int:
+    # Streams the labels to path a batch (Parquet row group, Arrow record batch) at a time,
+    # returns the number of exported labels. The format follows the file suffix unless given,
+    # a .gz suffix compresses JSONL.
+    export_format = export_format or ExportFormat.of(path)
+    columns = list(columns) if columns else list(MarkupData.COLUMNS)
+    unknown = [column for column in columns if column not in MarkupData.COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}, expected some of: {', '.join(MarkupData.COLUMNS)}.")
+    if compression is None:
+        compression = 'gzip' if export_format == ExportFormat.JSONL and path.suffix == '.gz' \
+            else ExportFormat.COMPRESSIONS[export_format][0]
+    if compression not in ExportFormat.COMPRESSIONS[export_format]:
+        raise ValueError(f"{export_format} export can't be compressed with {compression}, expected one of: "
+                         f"{', '.join(ExportFormat.COMPRESSIONS[export_format])}.")
+
+    batches = ({column: batch[column] for column in columns} for batch in data.label_batches(batch_size))
+    with atomic_write(path) as file:
+        if export_format == ExportFormat.DATAFRAME:
+            return _write_dataframe(file, batches, columns)
+        if export_format == ExportFormat.JSONL:
+            return _write_jsonl(file, batches, compression)
+        return _write_arrow(file, batches, columns, export_format, compression)
+
+
+def _write_arrow(file: BinaryIO, batches, columns: List[str], export_format: str, compression: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet and Arrow export need pyarrow, install it with: pip install pyarrow")
+
+    types = {
+        'content_hash': pa.string(),
+        'hash_algorithm': pa.dictionary(pa.int8(), pa.string()),
+        'relative_path': pa.string(),
+        'is_corrupted': pa.bool_(),
+        'start': pa.int64(),
+        'end': pa.int64(),
+        'description': pa.string(),
+    }
+    schema = pa.schema([(column, types[column]) for column in columns])
+    compression = None if compression == 'none' else compression
+    if export_format == ExportFormat.PARQUET:
+        writer = pq.ParquetWriter(file, schema, compression=compression or 'none')
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_file(file, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+        write = writer.write_batch
+
+    count = 0
+    with writer:
+        for batch in batches:
+            arrays = [_arrow_column(pa, batch[column], types[column]) for column in columns]
+            record_batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            # one row group per batch
+            write(pa.Table.from_batches([record_batch]) if export_format == ExportFormat.PARQUET else record_batch)
+            count += record_batch.num_rows
+    return count
+
+
+def _arrow_column(pa, values: np.ndarray, arrow_type):
+    if values.dtype == object:
+        values = [value.as_posix() if isinstance(value, Path) else value for value in values]
+    if pa.types.is_dictionary(arrow_type):
+        return pa.array(values, type=arrow_type.value_type).dictionary_encode()
+    return pa.array(values, type=arrow_type)
+
+
+def _write_jsonl(file: BinaryIO, batches, compression: str) -> int:
+    stream = gzip.GzipFile(fileobj=file, mode='wb') if compression == 'gzip' else file
+    count = 0
+    for batch in batches:
+        columns = {column: _json_values(values) for column, values in batch.items()}
+        rows = [dict(zip(columns, row)) for row in zip(*columns.values())]
+        stream.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8'))
+        count += len(rows)
+    if stream is not file:
+        stream.close()
+    return count
+
+
+def _json_values(values: np.ndarray) -> list:
+    if values.dtype == object:
+        return [value.as_posix() if isinstance(value, Path) else value for value in values]
+    # numpy scalars aren't serializable
+    return values.tolist()
+
+
+def _write_dataframe(file: BinaryIO, batches, columns: List[str]) -> int:
+    import pandas as pd
+    frames = [pd.DataFrame(batch) for batch in batches]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({column: [] for column in columns})
+    pickle.dump(frame, file)
+    return len(frame)
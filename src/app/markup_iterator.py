@@ -1,42 +1,238 @@
-from typing import Optional, List
+import random
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Tuple, Any, Callable
 
-from src.app.markup_data import MarkupData, MarkupView
+from src.app.markup_data import MarkupData, MarkupView, MarkupChange
+from src.app.markup_query import MarkupQuery
 from src.app.markup_settings import IterationSettings
+from src.app.shuffle import KeyedPermutation
+
+
+@dataclass
+class IterationViewChange:
+    class Kind:
+        INSERTED = 'inserted'
+        REMOVED = 'removed'
+        # the entry at index changed in place
+        UPDATED = 'updated'
+        # the whole view was rebuilt
+        RESET = 'reset'
+
+    kind: str
+    index: int = -1
+    view: Optional[MarkupView] = None
 
 
 class MarkupIterator:
+    # Bulk changes (e.g. a scan batch) rebuild the view instead of patching it entry by entry
+    _MIN_REBUILD_CHANGES = 64
+
     def __init__(self, data: MarkupData, settings: IterationSettings):
         self._data = data
         self._settings = settings
         self._iteration_list: List[MarkupView] = []
+        # sort keys parallel to _iteration_list, and the key of every listed entry
+        self._keys: List[Tuple[Any, ...]] = []
+        self._key_by_hash: Dict[str, Tuple[Any, ...]] = {}
+        # the entry under last_idx stays in place until the iteration moves away from it
+        self._current_changed = False
+        self._listeners: List[Callable[[IterationViewChange], None]] = []
+        self._query: Optional[MarkupQuery] = None
+        self._query_text = ''
         self.refresh_view()
+        # set when positions in the view shifted, the shuffle starts a new pass over the view as it is now.
+        # The view is rebuilt the same on load, so a saved pass goes on.
+        self._shuffle_stale = False
+        self._data.add_listener(self._data_changed)
+
+    def close(self):
+        self._data.remove_listener(self._data_changed)
+        self._listeners.clear()
+
+    def add_listener(self, listener: Callable[[IterationViewChange], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[IterationViewChange], None]):
+        self._listeners.remove(listener)
+
+    def _notify(self, kind: str, index: int = -1, view: Optional[MarkupView] = None):
+        change = IterationViewChange(kind, index, view)
+        for listener in list(self._listeners):
+            listener(change)
 
     def refresh_view(self):
-        self._iteration_list = self._data.filter(self._settings.filter_predicate)
-        if self._settings.order_by is not None:
-            self._iteration_list.sort(key=self._settings.order_by)
+        # Raises QueryError for an invalid query, the view is left as it was
+        if self._settings.query != self._query_text:
+            self._query = MarkupQuery.parse(self._settings.query) or None
+            self._query_text = self._settings.query
+
+        query = self._settings.index_query()
+        if query is not None:
+            self._iteration_list = self._data.select(query, self._query)
+        else:
+            self._iteration_list = self._data.filter(self._settings.filter_predicate)
+            if self._query is not None:
+                self._iteration_list = self._data.refine(self._iteration_list, self._query)
+            if self._settings.order_by is not None:
+                self._iteration_list.sort(key=self._settings.order_by)
+        self._keys = [self._key(view) for view in self._iteration_list]
+        self._key_by_hash = {view.content_hash: key for view, key in zip(self._iteration_list, self._keys)}
+        self._current_changed = False
+        self._shuffle_stale = True
+        self._notify(IterationViewChange.Kind.RESET)
+
+    def _accepts(self, view: MarkupView) -> bool:
+        return self._settings.filter_predicate(view) and (
+                self._query is None or self._data.matches(self._query, view.content_hash))
+
+    def _key(self, view: MarkupView) -> Tuple[Any, ...]:
+        # Appearance order breaks ties, the same way the stable sort in refresh_view does
+        if self._settings.order_by is None:
+            return (view.entry.index,)
+        return self._settings.order_by(view), view.entry.index
+
+    def _data_changed(self, change: MarkupChange):
+        current = self.last_accessed_entry
+        if change.kind == MarkupChange.Kind.RESET \
+                or len(change.content_hashes) > max(self._MIN_REBUILD_CHANGES, len(self._keys) // 8):
+            self.refresh_view()
+            if current is not None:
+                self.last_accessed_entry = current.content_hash
+            return
+
+        for content_hash in change.content_hashes:
+            if current is not None and content_hash == current.content_hash:
+                self._current_changed = True
+                self._notify(IterationViewChange.Kind.UPDATED, self._settings.last_idx, current)
+            else:
+                removed = self._remove(content_hash)
+                inserted = self._insert(content_hash)
+                if removed != inserted:
+                    self._shuffle_stale = True
+
+    def _remove(self, content_hash: str) -> Optional[int]:
+        key = self._key_by_hash.pop(content_hash, None)
+        if key is None:
+            return None
+        idx = bisect_left(self._keys, key)
+        del self._keys[idx]
+        del self._iteration_list[idx]
+        if idx < self._settings.last_idx:
+            self._settings.last_idx -= 1
+        self._notify(IterationViewChange.Kind.REMOVED, idx)
+        return idx
+
+    def _insert(self, content_hash: str) -> Optional[int]:
+        view = self._data.get(content_hash)
+        if view is None or not self._accepts(view):
+            return None
+        key = self._key(view)
+        idx = bisect_left(self._keys, key)
+        if idx <= self._settings.last_idx < len(self._keys):
+            self._settings.last_idx += 1
+        self._keys.insert(idx, key)
+        self._iteration_list.insert(idx, view)
+        self._key_by_hash[content_hash] = key
+        self._notify(IterationViewChange.Kind.INSERTED, idx, view)
+        return idx
+
+    def _settle_current(self):
+        # Repositions the changed current entry, leaving last_idx right before the entry that followed it
+        self._current_changed = False
+        current = self.last_accessed_entry
+        if current is None:
+            return
+        previous = following = self._remove(current.content_hash)
+        if following == len(self._iteration_list):
+            # it was the last one, the iteration wraps around to the first
+            following = 0
+        self._settings.last_idx = following
+        if self._insert(current.content_hash) != previous:
+            self._shuffle_stale = True
+        self._settings.last_idx -= 1
 
     def list(self):
         return tuple(self._iteration_list)
 
+    def index_of(self, content_hash: str) -> Optional[int]:
+        # Positions shift with every insertion, so they are found by bisecting the sort keys
+        key = self._key_by_hash.get(content_hash)
+        return bisect_left(self._keys, key) if key is not None else None
+
     def next(self) -> Optional[MarkupView]:
+        if self._current_changed:
+            self._settle_current()
+
         entry = None
         while self._iteration_list:
-            size = len(self._iteration_list)
-            self._settings.last_idx = self._settings.index_callback(size, self._settings.last_idx) % size
-
-            if self._settings.last_idx < 0:
-                self._settings.last_idx += size
-
+            self._settings.last_idx = self._next_index()
             next_entry = self._iteration_list[self._settings.last_idx]
-            if self._settings.filter_predicate(next_entry):
+            if self._accepts(next_entry):
                 entry = next_entry
                 break
             else:
                 self._iteration_list.pop(self._settings.last_idx)
+                del self._keys[self._settings.last_idx]
+                del self._key_by_hash[next_entry.content_hash]
+                self._shuffle_stale = True
+                self._notify(IterationViewChange.Kind.REMOVED, self._settings.last_idx)
 
         return entry
 
+    def peek(self, count: int) -> List[MarkupView]:
+        # The entries the next calls to next() are going to return, without moving
+        settings = self._settings
+        if settings.index_callback is IterationSettings.Index.RANDOM:
+            # Set up here rather than inside the snapshot, so next() walks the same permutation
+            self._ensure_shuffle_pass()
+        state = settings.last_idx, settings.shuffle_pass, settings.shuffle_cursor, settings.shuffle_bits
+        upcoming = []
+        try:
+            for _ in range(min(count, len(self._iteration_list) - 1)):
+                settings.last_idx = self._next_index()
+                upcoming.append(self._iteration_list[settings.last_idx])
+        finally:
+            settings.last_idx, settings.shuffle_pass, settings.shuffle_cursor, settings.shuffle_bits = state
+        return upcoming
+
+    def _next_index(self) -> int:
+        size = len(self._iteration_list)
+        if self._settings.index_callback is IterationSettings.Index.RANDOM:
+            return self._shuffled_index()
+        idx = self._settings.index_callback(size, self._settings.last_idx) % size
+        return idx + size if idx < 0 else idx
+
+    def _shuffled_index(self) -> int:
+        # Walks a permutation of the view positions, padded to a power of two, so a step costs a few
+        # evaluations whatever the size of the dataset. Positions shifting restarts the pass, the
+        # permutation wouldn't describe the view anymore.
+        settings = self._settings
+        self._ensure_shuffle_pass()
+        size = len(self._iteration_list)
+        for _ in range(2):
+            permutation = KeyedPermutation(settings.shuffle_seed, settings.shuffle_bits, settings.shuffle_pass)
+            while settings.shuffle_cursor < permutation.size:
+                position = permutation[settings.shuffle_cursor]
+                settings.shuffle_cursor += 1
+                if position < size:
+                    return position
+            self._start_shuffle_pass(settings.shuffle_pass + 1)
+        return random.randrange(size)
+
+    def _ensure_shuffle_pass(self):
+        if self._settings.shuffle_seed is None:
+            self._settings.shuffle_seed = random.getrandbits(64)
+            self._start_shuffle_pass(0)
+        elif self._shuffle_stale:
+            self._start_shuffle_pass(self._settings.shuffle_pass + 1)
+
+    def _start_shuffle_pass(self, shuffle_pass: int):
+        self._shuffle_stale = False
+        self._settings.shuffle_pass = shuffle_pass
+        self._settings.shuffle_cursor = 0
+        self._settings.shuffle_bits = KeyedPermutation.bits_for(len(self._iteration_list))
+
     @property
     def last_accessed_entry(self) -> Optional[MarkupView]:
         if self._settings.last_idx not in range(0, len(self._iteration_list)):
@@ -44,7 +240,9 @@ class MarkupIterator:
         return self._iteration_list[self._settings.last_idx]
 
     @last_accessed_entry.setter
-    def last_accessed_entry(self, md5: str):
-        idx = next((idx for idx, entry in enumerate(self._iteration_list) if entry.md5 == md5), None)
+    def last_accessed_entry(self, content_hash: str):
+        if self._current_changed:
+            self._settle_current()
+        idx = self.index_of(content_hash)
         if idx is not None:
             self._settings.last_idx = idx
@@ -0,0 +1,145 @@
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Dict, Tuple
+
+from src.app.file_system_utils import atomic_write
+from src.config import JOURNAL_BATCH_SIZE, JOURNAL_FILE_SUFFIX
+
+
+class MarkupJournal:
+    # Append-only log of label edits made since the last snapshot (.mmp) of a project.
+    # Every record is framed as (length, crc32, json payload), so a write torn by a crash
+    # is detected and replay stops right before it. A snapshot being saved in the background leaves a
+    # mark, the records after it belong to the new snapshot as well as to the previous one.
+    _FRAME = struct.Struct('<II')
+    _VERSION = 1
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._file = None
+        self._pending: List[bytes] = []
+        self._record_count = 0
+        # journal id of a snapshot being saved -> (file offset, record count) right after its mark
+        self._marks: Dict[str, Tuple[int, int]] = {}
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def record_count(self) -> int:
+        return self._record_count + len(self._pending)
+
+    def read(self, journal_id: str) -> Iterator[dict]:
+        # Records written after the snapshot with journal_id, a journal of another snapshot is ignored
+        try:
+            with open(self._path, 'rb') as file:
+                records = self._read_records(file)
+                header = next(records, None)
+                if header is None:
+                    return
+                active = header.get('journal_id') == journal_id
+                for record in records:
+                    if 'journal_id' in record:
+                        active = active or record['journal_id'] == journal_id
+                    elif active:
+                        yield record
+        except FileNotFoundError:
+            return
+
+    def _read_records(self, file) -> Iterator[dict]:
+        while True:
+            frame = file.read(self._FRAME.size)
+            if len(frame) < self._FRAME.size:
+                return
+            length, checksum = self._FRAME.unpack(frame)
+            payload = file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            try:
+                yield json.loads(payload)
+            except ValueError:
+                return
+
+    def open(self, journal_id: str, record_count: int = 0):
+        # Continues a journal that was just replayed (record_count of its records) or, when it
+        # belongs to another snapshot, starts it over
+        self.close()
+        if record_count == 0 or not self._path.exists():
+            self._file = open(self._path, 'wb')
+            self._pending.append(self._frame({'journal_id': journal_id, 'version': self._VERSION}))
+            self.flush()
+            self._record_count = 0
+        else:
+            self._truncate_torn_tail()
+            self._file = open(self._path, 'ab')
+            self._record_count = record_count
+
+    def mark_snapshot(self, journal_id: str):
+        if self._file is None:
+            return
+        self._pending.append(self._frame({'journal_id': journal_id}))
+        self.flush()
+        self._marks[journal_id] = (self._file.tell(), self._record_count)
+
+    def drop_before_snapshot(self, journal_id: str):
+        # The snapshot journal_id is saved, only the records after its mark are still needed
+        mark = self._marks.get(journal_id)
+        if self._file is None or mark is None:
+            return
+        self.flush()
+        offset, record_count = mark
+        with open(self._path, 'rb') as file:
+            file.seek(offset)
+            tail = file.read()
+        self._file.close()
+        try:
+            with atomic_write(self._path) as file:
+                file.write(self._frame({'journal_id': journal_id, 'version': self._VERSION}))
+                file.write(tail)
+        finally:
+            self._file = open(self._path, 'ab')
+        self._record_count -= record_count
+        self._marks.clear()
+
+    def _truncate_torn_tail(self):
+        with open(self._path, 'r+b') as file:
+            valid_end = 0
+            for _ in self._read_records(file):
+                valid_end = file.tell()
+            file.truncate(valid_end)
+
+    def append(self, record: dict):
+        if self._file is None:
+            return
+        self._pending.append(self._frame(record))
+        if len(self._pending) >= JOURNAL_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._file is None or not self._pending:
+            return
+        self._record_count += len(self._pending)
+        self._file.write(b''.join(self._pending))
+        self._pending.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+        self._file = None
+        self._marks.clear()
+
+    @classmethod
+    def _frame(cls, record: dict) -> bytes:
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return cls._FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def journal_path(project_path: Path) -> Path:
+    return project_path.with_name(project_path.name + JOURNAL_FILE_SUFFIX)
@@ -0,0 +1,162 @@
+import fnmatch
+import operator
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Callable, Any, Dict
+
+import numpy as np
+
+from src.app.markup_store import MarkupStore
+
+
+class QueryError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class QueryCondition:
+    field: str
+    op: str
+    value: Any
+
+
+_COMPARISONS: Dict[str, Callable] = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+
+_SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+_DURATION_UNITS = {'ms': 1, '': 1000, 's': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000}
+_BOOLEANS = {'yes': True, 'true': True, '1': True, 'no': False, 'false': False, '0': False}
+
+# Below this many rows columns are gathered entry by entry instead of copied whole
+_SMALL_SELECTION = 64
+
+_CONDITION = re.compile(r'\s*(\w+)\s*(<=|>=|!=|!~|<|>|=|~)\s*("(?:[^"\\]|\\.)*"|[^\s"]+)\s*')
+_NUMBER_WITH_UNIT = re.compile(r'(\d+(?:\.\d+)?)\s*([a-z%]*)')
+
+
+def _gather(column: Callable[[], np.ndarray], value: Callable[[int], Any], rows: np.ndarray) -> np.ndarray:
+    if len(rows) <= _SMALL_SELECTION:
+        return np.array([value(row) for row in rows.tolist()])
+    return column()[rows]
+
+
+class MarkupQuery:
+    # Conjunction of conditions over entry columns, written like
+    #   path~"drums/.*" labels<2 coverage<50% size>=1mb duration>30s corrupted=no
+    # path takes a regex (~, !~) or a glob (=, !=), durations default to seconds.
+    FIELDS = ('path', 'labels', 'coverage', 'size', 'duration', 'corrupted')
+
+    def __init__(self, conditions: List[QueryCondition]):
+        self.conditions = conditions
+        # path matches are cached per path string, the table is append-only
+        self._path_cache_store: Optional[MarkupStore] = None
+        self._path_cache: List[Optional[np.ndarray]] = [None] * len(conditions)
+
+    @classmethod
+    def parse(cls, text: str) -> 'MarkupQuery':
+        conditions = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = _CONDITION.match(text, position)
+            if match is None:
+                raise QueryError(f"Can't parse the query at: {text[position:]}")
+            field, op, raw_value = match.groups()
+            if raw_value.startswith('"'):
+                raw_value = re.sub(r'\\(.)', r'\1', raw_value[1:-1])
+            conditions.append(cls._condition(field.lower(), op, raw_value))
+            position = match.end()
+        return cls(conditions)
+
+    @staticmethod
+    def _condition(field: str, op: str, raw_value: str) -> QueryCondition:
+        if field not in MarkupQuery.FIELDS:
+            raise QueryError(f"Unknown field '{field}', expected one of: {', '.join(MarkupQuery.FIELDS)}.")
+        if field == 'path':
+            if op in ('~', '!~'):
+                try:
+                    return QueryCondition(field, op, re.compile(raw_value))
+                except re.error as e:
+                    raise QueryError(f"Invalid path regex '{raw_value}': {e}.")
+            if op in ('=', '!='):
+                return QueryCondition(field, op, re.compile(r'\A' + fnmatch.translate(raw_value)))
+            raise QueryError("Paths are matched with ~ (regex) or = (glob).")
+        if op in ('~', '!~'):
+            raise QueryError(f"'{field}' can't be matched with {op}.")
+        if field == 'corrupted':
+            if op not in ('=', '!=') or raw_value.lower() not in _BOOLEANS:
+                raise QueryError("Use corrupted=yes or corrupted=no.")
+            return QueryCondition(field, op, _BOOLEANS[raw_value.lower()])
+
+        match = _NUMBER_WITH_UNIT.fullmatch(raw_value.lower())
+        units = {'size': _SIZE_UNITS, 'duration': _DURATION_UNITS, 'coverage': {'': 1, '%': 1}, 'labels': {'': 1}}
+        if match is None or match.group(2) not in units[field]:
+            raise QueryError(f"Invalid value '{raw_value}' for '{field}'.")
+        return QueryCondition(field, op, float(match.group(1)) * units[field][match.group(2)])
+
+    def __bool__(self):
+        return bool(self.conditions)
+
+    def mask(self, store: MarkupStore, rows: np.ndarray) -> np.ndarray:
+        # Evaluates every condition for the given rows at once
+        result = np.ones(len(rows), dtype=bool)
+        if not len(rows):
+            return result
+        columns: Dict[str, np.ndarray] = {}
+        for i, condition in enumerate(self.conditions):
+            if condition.field == 'path':
+                matched = self._path_mask(i, store, rows)
+                result &= matched if condition.op in ('~', '=') else ~matched
+                continue
+
+            compare = _COMPARISONS[condition.op]
+            if condition.field == 'corrupted':
+                result &= compare(_gather(store.corrupted_column, store.is_corrupted, rows), condition.value)
+            elif condition.field == 'labels':
+                result &= compare(_gather(store.label_count_column, store.label_count, rows), condition.value)
+            elif condition.field == 'size':
+                sizes = _gather(store.file_size_column, store.file_size, rows)
+                result &= (sizes >= 0) & compare(sizes, condition.value)
+            else:
+                if 'duration' not in columns:
+                    columns['duration'] = _gather(store.duration_column, store.duration, rows)
+                durations = columns['duration']
+                # Unknown until the file has been played once
+                known = durations > 0
+                if condition.field == 'duration':
+                    result &= known & compare(durations, condition.value)
+                else:
+                    coverage = 100 * store.labeled_duration(rows) / np.where(known, durations, 1)
+                    result &= known & compare(coverage, condition.value)
+        return result
+
+    def _path_mask(self, index: int, store: MarkupStore, rows: np.ndarray) -> np.ndarray:
+        pattern = self.conditions[index].value
+        if len(rows) <= _SMALL_SELECTION:
+            return np.array([any(pattern.search(path.as_posix()) is not None for path in store.paths(row))
+                             for row in rows.tolist()], dtype=bool)
+
+        if self._path_cache_store is not store:
+            self._path_cache_store = store
+            self._path_cache = [None] * len(self.conditions)
+        cached = self._path_cache[index]
+        known = len(cached) if cached is not None else 0
+        fresh = np.fromiter((pattern.search(path) is not None for path in store.path_strings(known)), dtype=bool)
+        if len(fresh):
+            cached = fresh if cached is None else np.concatenate((cached, fresh))
+            self._path_cache[index] = cached
+
+        matched = cached[store.path_id_column()[rows]]
+        # Duplicates match through any of their copies
+        extra_paths = store.extra_path_ids()
+        if extra_paths:
+            positions = {row: position for position, row in enumerate(rows.tolist()) if row in extra_paths}
+            for row, position in positions.items():
+                matched[position] |= any(cached[path_id] for path_id in extra_paths[row])
+        return matched
@@ -3,7 +3,9 @@ from abc import abstractmethod
 from dataclasses import dataclass, field
 from typing import Callable, Any, Optional, Iterator, Iterable
 
-from src.app.markup_data import MarkupView
+from src.app.markup_data import MarkupView, IndexQuery
+from src.app.scan_settings import ScanSettings
+from src.config import PREFETCH_DEPTH, PREFETCH_MEMORY_BUDGET_MB, PCM_CACHE_BUDGET_MB
 
 
 class SettingsEnum:
@@ -32,7 +34,7 @@ class IterationSettings:
 
         @staticmethod
         def NON_VISITED(view: MarkupView) -> bool:
-            return len(view.entry.values) == 0
+            return view.entry.label_count == 0
 
         @classmethod
         def getOptions(cls) -> Iterable[SettingsEnum.SettingsEnumEntry]:
@@ -47,7 +49,7 @@ class IterationSettings:
 
         @staticmethod
         def LABEL_COUNT(view: MarkupView) -> Any:
-            return len(view.entry.values)
+            return view.entry.label_count
 
         @classmethod
         def getOptions(cls) -> Iterable[SettingsEnum.SettingsEnumEntry]:
@@ -61,6 +63,7 @@ class IterationSettings:
         def SEQUENTIAL(size: int, last_index: int) -> int:
             return (last_index + 1) % size
 
+        # MarkupIterator walks a seeded permutation instead, this is only its fallback
         @staticmethod
         def RANDOM(size: int, last_index: int) -> int:
             return random.randint(0, size - 1)
@@ -80,12 +83,39 @@ class IterationSettings:
     order_by: Optional[Callable[[MarkupView], Any]] = OrderBy.APPEARANCE
     # last viewed entry
     last_idx: int = 0
+    # random order state: a permutation of view positions given by seed and pass, and a cursor into it
+    shuffle_seed: Optional[int] = None
+    shuffle_pass: int = 0
+    shuffle_cursor: int = 0
+    shuffle_bits: int = 0
+    # MarkupQuery text narrowing the filter down further (empty - no query)
+    query: str = ''
+
+    def index_query(self) -> Optional[IndexQuery]:
+        # The built-in filters and orderings can be answered by MarkupData indexes, custom ones can't
+        by_label_count = self.order_by is IterationSettings.OrderBy.LABEL_COUNT
+        if self.order_by is not IterationSettings.OrderBy.APPEARANCE and not by_label_count:
+            return None
+        if self.filter_predicate is IterationSettings.Filters.ALL:
+            return IndexQuery(order_by_label_count=by_label_count)
+        if self.filter_predicate is IterationSettings.Filters.NON_CORRUPTED:
+            return IndexQuery(skip_corrupted=True, order_by_label_count=by_label_count)
+        if self.filter_predicate is IterationSettings.Filters.NON_VISITED:
+            return IndexQuery(label_count=0, order_by_label_count=by_label_count)
+        return None
 
 
 @dataclass
 class MarkupSettings:
     iteration_settings: IterationSettings = field(default_factory=IterationSettings)
+    scan_settings: ScanSettings = field(default_factory=ScanSettings)
     min_duration_in_ms: int = 5000
-    # TODO: author regex, title regex
+    # entries ahead of the current one to read into the page cache and probe
+    prefetch_depth: int = PREFETCH_DEPTH
+    prefetch_memory_budget_mb: int = PREFETCH_MEMORY_BUDGET_MB
+    # decoded audio of visited entries kept for going back to them
+    pcm_cache_budget_mb: int = PCM_CACHE_BUDGET_MB
+    # entries over the budget go to memory-mapped temporary files instead of being dropped
+    pcm_cache_spill: bool = False
     # TODO: fragment size, overlap factor. Those can be changed at any time.
     # TODO: manual fragmentation with sliders and stuff.
@@ -0,0 +1,610 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Tuple, Set, Iterator, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+from src.app.snapshot import FrozenState
+
+if TYPE_CHECKING:
+    from src.app.markup_query import MarkupQuery
+
+
+def object_column(values: Sequence) -> np.ndarray:
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def int_column(buffer) -> Sequence[int]:
+    # Read-only int64 columns are pickled as bytes, so a project file can keep them mapped
+    return buffer if isinstance(buffer, array) else memoryview(buffer).cast('q')
+
+
+def union_lengths(label_rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    # Length of the union of each row's labels, overlapping labels are counted once
+    covered = np.zeros(len(rows), dtype=np.int64)
+    if not len(label_rows):
+        return covered
+    order = np.lexsort((starts, label_rows))
+    label_rows, starts, ends = label_rows[order], starts[order], ends[order]
+    # Offsetting by row keeps the running maximum of label ends from leaking into the next row
+    offset = label_rows * (int(ends.max()) + 1)
+    reach = np.maximum.accumulate(ends + offset) - offset
+    previous_reach = np.concatenate(([0], reach[:-1]))
+    previous_reach[np.concatenate(([True], label_rows[1:] != label_rows[:-1]))] = 0
+    lengths = np.maximum(0, ends - np.maximum(starts, previous_reach))
+    per_row = np.bincount(label_rows, weights=lengths, minlength=int(rows.max()) + 1)
+    return per_row[rows].astype(np.int64)
+
+
+class StringTable:
+    # UTF-8 strings packed into one blob, addressed by offsets. Equal strings are interned and
+    # reference counted, so released ones can be dropped by compact().
+    # A table loaded from a project file keeps its blob mapped as a read-only base, new strings go after it.
+    def __init__(self):
+        self._base: Optional[memoryview] = None
+        self._base_count = 0
+        self._blob = bytearray()
+        self._offsets = array('q', [0])
+        self._references = array('q')
+        self._garbage = 0
+        # built lazily, python's bytes hash isn't stable across runs
+        self._lookup: Optional[Dict[bytes, int]] = None
+
+    def __getstate__(self):
+        state = {'_blob': self._blob, '_offsets': self._offsets, '_references': self._references,
+                 '_garbage': self._garbage}
+        if self._base is not None:
+            state['_base'] = self._base
+        return state
+
+    def __setstate__(self, state):
+        base = state.pop('_base', None)
+        blob = state['_blob']
+        if not isinstance(blob, bytearray):
+            # a mapped section of the project file
+            if base is None:
+                base, blob = blob, bytearray()
+            else:
+                blob = bytearray(blob)
+        state['_blob'] = blob
+        self.__dict__.update(state)
+        self._base = base
+        self._base_count = bisect_left(self._offsets, self._base_size) if base is not None else 0
+        self._lookup = None
+
+    def __len__(self):
+        return len(self._references)
+
+    def snapshot(self) -> FrozenState:
+        state = {'_blob': bytearray(self._blob), '_offsets': self._offsets[:], '_references': self._references[:],
+                 '_garbage': self._garbage}
+        if self._base is not None:
+            # read-only, it can be shared
+            state['_base'] = self._base
+        return FrozenState(StringTable, state)
+
+    @property
+    def _base_size(self) -> int:
+        return len(self._base) if self._base is not None else 0
+
+    def get(self, string_id: int) -> str:
+        return self._raw(string_id).decode('utf-8')
+
+    def _raw(self, string_id: int) -> bytes:
+        start, end = self._offsets[string_id], self._offsets[string_id + 1]
+        base_size = self._base_size
+        if end <= base_size:
+            return bytes(self._base[start:end])
+        return bytes(self._blob[start - base_size:end - base_size])
+
+    def append(self, text: str) -> int:
+        # Without interning, for strings known to be unique
+        string_id = len(self._references)
+        self._blob += text.encode('utf-8')
+        self._offsets.append(self._base_size + len(self._blob))
+        self._references.append(1)
+        if self._lookup is not None:
+            self._lookup[self._raw(string_id)] = string_id
+        return string_id
+
+    def intern(self, text: str) -> int:
+        encoded = text.encode('utf-8')
+        lookup = self._ensure_lookup()
+        string_id = lookup.get(encoded)
+        if string_id is None:
+            string_id = len(self._references)
+            self._blob += encoded
+            self._offsets.append(self._base_size + len(self._blob))
+            self._references.append(0)
+            lookup[encoded] = string_id
+        elif self._references[string_id] == 0:
+            self._garbage -= len(encoded)
+        self._references[string_id] += 1
+        return string_id
+
+    def release(self, string_id: int):
+        self._references[string_id] -= 1
+        if self._references[string_id] == 0:
+            self._garbage += self._offsets[string_id + 1] - self._offsets[string_id]
+
+    def _ensure_lookup(self) -> Dict[bytes, int]:
+        # Strings of a mapped base aren't interned again, that would read the whole base
+        if self._lookup is None:
+            self._lookup = {self._raw(string_id): string_id
+                            for string_id in range(self._base_count, len(self._references))}
+        return self._lookup
+
+    @property
+    def garbage_ratio(self) -> float:
+        size = self._base_size + len(self._blob)
+        return self._garbage / size if size else 0.0
+
+    def compact(self) -> array:
+        # Returns old id -> new id (-1 for dropped strings)
+        remap = array('q', [-1]) * len(self._references)
+        blob = bytearray()
+        offsets = array('q', [0])
+        references = array('q')
+        for string_id in range(len(self._references)):
+            if self._references[string_id] > 0:
+                remap[string_id] = len(references)
+                blob += self._raw(string_id)
+                offsets.append(len(blob))
+                references.append(self._references[string_id])
+        self._base, self._base_count = None, 0
+        self._blob, self._offsets, self._references = blob, offsets, references
+        self._garbage = 0
+        self._lookup = None
+        return remap
+
+    @property
+    def nbytes(self) -> int:
+        # resident size, a mapped base is paged in by the OS as it's read
+        return len(self._blob) + self._offsets.itemsize * (len(self._offsets) + len(self._references))
+
+
+class MarkupStore:
+    # Column-oriented backing store of MarkupData. Entries are rows that are only ever appended,
+    # labels live in parallel arrays, and every entry with labels keeps an array of its label ids.
+    # Loaded from a project file, the per-entry label arrays stay flattened until an entry is edited,
+    # and hashes are looked up in a sorted order saved with them, so opening doesn't touch every entry.
+    _COMPACTION_THRESHOLD = 0.25
+
+    def __init__(self):
+        # Entry columns
+        self._hashes = StringTable()
+        # rows sorted by hash as of the last load, rows appended since are in _row_by_hash
+        self._hash_order = array('q')
+        self._row_by_hash: Dict[str, int] = {}
+        self._paths = StringTable()
+        self._path_ids = array('q')
+        # rows with more than one path (duplicate copies) -> the other path ids
+        self._extra_paths: Dict[int, array] = {}
+        self._corrupted = bytearray()
+        # -1 while unknown, sizes come from the scan and durations from playback
+        self._file_sizes = array('q')
+        self._durations = array('q')
+
+        # Label columns
+        self._descriptions = StringTable()
+        self._label_start = array('q')
+        self._label_end = array('q')
+        self._label_description = array('q')
+        self._free_labels = array('q')
+        # labels of the entries edited since the load, the others are read from the flattened columns below
+        self._entry_labels: Dict[int, array] = {}
+        self._base_label_rows = array('q')
+        self._base_label_offsets = array('q', [0])
+        self._base_label_ids = array('q')
+        self._label_counts = array('q')
+
+        # Secondary indexes, built on first use
+        self._corrupted_rows: Optional[Set[int]] = None
+        self._rows_by_label_count: Optional[Dict[int, Set[int]]] = None
+
+    def __getstate__(self):
+        if self._descriptions.garbage_ratio > self._COMPACTION_THRESHOLD:
+            self._compact_descriptions()
+        # Per-entry label arrays are flattened, a pickle of many tiny arrays is much larger
+        label_rows = array('q')
+        label_counts = array('q')
+        label_ids = array('q')
+        for row, ids in self._labeled_entries():
+            label_rows.append(row)
+            label_counts.append(len(ids))
+            label_ids.extend(ids)
+        state = self.__dict__.copy()
+        for name in ('_hash_order', '_row_by_hash', '_entry_labels', '_base_label_rows', '_base_label_offsets',
+                     '_base_label_ids', '_corrupted_rows', '_rows_by_label_count'):
+            del state[name]
+        state['_label_rows'] = (label_rows.tobytes(), label_counts.tobytes(), label_ids.tobytes())
+        return state
+
+    def __setstate__(self, state):
+        label_rows, label_counts, label_ids = (int_column(column) for column in state.pop('_label_rows'))
+        hash_order = state.pop('_hash_order', None)
+        self.__dict__.update(state)
+        if isinstance(self._hashes, list):
+            # Projects saved before hashes were packed into a string table
+            hashes, self._hashes = self._hashes, StringTable()
+            for content_hash in hashes:
+                self._hashes.append(content_hash)
+        if not isinstance(self._corrupted, bytearray):
+            self._corrupted = bytearray(self._corrupted)
+        if '_file_sizes' not in state:
+            self._file_sizes = array('q', [-1]) * len(self)
+            self._durations = array('q', [-1]) * len(self)
+        if '_label_counts' not in state:
+            # Older projects list the labeled entries in edit order
+            self._label_counts = array('q', [0]) * len(self)
+            offsets = np.cumsum(np.frombuffer(label_counts, dtype=np.int64)).tolist()
+            entries = sorted(zip(label_rows, offsets, label_counts))
+            label_rows, label_counts = array('q', [row for row, _, _ in entries]), array('q')
+            sorted_ids = array('q')
+            for row, end, count in entries:
+                self._label_counts[row] = count
+                label_counts.append(count)
+                sorted_ids.extend(label_ids[end - count:end])
+            label_ids = sorted_ids
+        self._entry_labels = {}
+        self._base_label_rows = label_rows
+        self._base_label_ids = label_ids
+        self._base_label_offsets = array('q', [0])
+        self._base_label_offsets.frombytes(np.cumsum(np.frombuffer(label_counts, dtype=np.int64)).tobytes())
+        self._hash_order = int_column(hash_order) if hash_order is not None else array('q')
+        self._row_by_hash = {}
+        if hash_order is None:
+            self._row_by_hash = {self._hashes.get(row): row for row in range(len(self))}
+        self._corrupted_rows = None
+        self._rows_by_label_count = None
+
+    def snapshot(self) -> FrozenState:
+        # Copies of the pickled buffers, cheap next to pickling and writing them
+        state = self.__getstate__()
+        for name, value in state.items():
+            if isinstance(value, (array, bytearray, list)):
+                state[name] = value[:]
+        state['_hashes'] = self._hashes.snapshot()
+        state['_paths'] = self._paths.snapshot()
+        state['_descriptions'] = self._descriptions.snapshot()
+        state['_extra_paths'] = {row: ids[:] for row, ids in self._extra_paths.items()}
+        size = len(self)
+        # The hash order is sorted while pickling, rows below size won't change meanwhile
+        return FrozenState(MarkupStore, state, lambda frozen_state: frozen_state.update(
+            _hash_order=self._sorted_hash_order(size).tobytes()))
+
+    def _sorted_hash_order(self, size: int) -> array:
+        raw = self._hashes._raw
+        known = self._hash_order[:min(len(self._hash_order), size)]
+        fresh = sorted(range(len(known), size), key=raw)
+        return array('q', heapq.merge(known, fresh, key=raw) if fresh else known)
+
+    def _ensure_indexes(self):
+        if self._corrupted_rows is not None:
+            return
+        self._corrupted_rows = set(np.flatnonzero(self.corrupted_column()).tolist())
+        label_counts = self.label_count_column()
+        order = np.argsort(label_counts, kind='stable')
+        counts, starts = np.unique(label_counts[order], return_index=True)
+        self._rows_by_label_count = {count: set(rows.tolist())
+                                     for count, rows in zip(counts.tolist(), np.split(order, starts[1:]))}
+
+    def __len__(self):
+        return len(self._hashes)
+
+    # Lives in the pickled project, so there is nothing to open, commit or close
+    is_persistent = False
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def create_empty(self) -> 'MarkupStore':
+        return MarkupStore()
+
+    # Entries
+
+    def row_of(self, content_hash: str) -> Optional[int]:
+        row = self._row_by_hash.get(content_hash)
+        if row is not None or not self._hash_order:
+            return row
+        encoded = content_hash.encode('utf-8')
+        order = self._hash_order
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._hashes._raw(order[middle]) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order) and self._hashes._raw(order[low]) == encoded:
+            return order[low]
+        return None
+
+    def hash_at(self, row: int) -> str:
+        if not 0 <= row < len(self._hashes):
+            raise IndexError(row)
+        return self._hashes.get(row)
+
+    def hashes(self) -> List[str]:
+        return [self._hashes.get(row) for row in range(len(self))]
+
+    def append_entry(self, content_hash: str, relative_paths: List[Path], is_corrupted: bool = False,
+                     file_size: int = -1) -> int:
+        row = self._hashes.append(content_hash)
+        self._row_by_hash[content_hash] = row
+        self._path_ids.append(-1)
+        self._file_sizes.append(file_size)
+        self._durations.append(-1)
+        self._label_counts.append(0)
+        if row // 8 >= len(self._corrupted):
+            self._corrupted.append(0)
+        if self._rows_by_label_count is not None:
+            self._rows_by_label_count.setdefault(0, set()).add(row)
+        self.set_paths(row, relative_paths)
+        self.set_corrupted(row, is_corrupted)
+        return row
+
+    def paths(self, row: int) -> List[Path]:
+        paths = [Path(self._paths.get(self._path_ids[row]))]
+        extra = self._extra_paths.get(row)
+        if extra is not None:
+            paths.extend(Path(self._paths.get(path_id)) for path_id in extra)
+        return paths
+
+    def primary_path_id(self, row: int) -> int:
+        return self._path_ids[row]
+
+    def primary_path(self, row: int) -> Path:
+        return Path(self._paths.get(self._path_ids[row]))
+
+    def set_paths(self, row: int, relative_paths: List[Path]):
+        if not relative_paths:
+            raise ValueError("An entry needs at least one path.")
+        old_ids = [self._path_ids[row]] + list(self._extra_paths.pop(row, ()))
+        new_ids = [self._paths.intern(path.as_posix()) for path in relative_paths]
+        self._path_ids[row] = new_ids[0]
+        if len(new_ids) > 1:
+            self._extra_paths[row] = array('q', new_ids[1:])
+        for path_id in old_ids:
+            if path_id >= 0:
+                self._paths.release(path_id)
+
+    def is_corrupted(self, row: int) -> bool:
+        return bool(self._corrupted[row >> 3] & (1 << (row & 7)))
+
+    def set_corrupted(self, row: int, is_corrupted: bool):
+        if is_corrupted:
+            self._corrupted[row >> 3] |= 1 << (row & 7)
+            if self._corrupted_rows is not None:
+                self._corrupted_rows.add(row)
+        else:
+            self._corrupted[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+            if self._corrupted_rows is not None:
+                self._corrupted_rows.discard(row)
+
+    def file_size(self, row: int) -> int:
+        return self._file_sizes[row]
+
+    def set_file_size(self, row: int, file_size: int):
+        self._file_sizes[row] = file_size
+
+    def duration(self, row: int) -> int:
+        return self._durations[row]
+
+    def set_duration(self, row: int, duration: int):
+        self._durations[row] = duration
+
+    # Labels
+
+    def label_count(self, row: int) -> int:
+        return self._label_counts[row]
+
+    def label_ids(self, row: int) -> Iterable[int]:
+        ids = self._entry_labels.get(row)
+        if ids is not None:
+            return ids
+        if not self._label_counts[row]:
+            return ()
+        i = bisect_left(self._base_label_rows, row)
+        return self._base_label_ids[self._base_label_offsets[i]:self._base_label_offsets[i + 1]]
+
+    def _own_label_ids(self, row: int) -> array:
+        # Copied out of the flattened columns on the first edit
+        ids = self._entry_labels.get(row)
+        if ids is None:
+            ids = self._entry_labels[row] = array('q', self.label_ids(row))
+        return ids
+
+    def label(self, label_id: int) -> Tuple[int, int, str]:
+        return (self._label_start[label_id], self._label_end[label_id],
+                self._descriptions.get(self._label_description[label_id]))
+
+    def insert_label(self, row: int, index: int, start: int, end: int, description: str):
+        label_id = self._allocate_label(start, end, description)
+        ids = self._own_label_ids(row)
+        ids.insert(index, label_id)
+        self._move_label_bucket(row, len(ids) - 1, len(ids))
+
+    def replace_label(self, row: int, index: int, start: int, end: int, description: str):
+        ids = self._own_label_ids(row)
+        old_id = ids[index]
+        ids[index] = self._allocate_label(start, end, description)
+        self._free_label(old_id)
+
+    def remove_label(self, row: int, index: int):
+        ids = self._own_label_ids(row)
+        label_id = ids.pop(index)
+        self._move_label_bucket(row, len(ids) + 1, len(ids))
+        if not ids:
+            del self._entry_labels[row]
+        self._free_label(label_id)
+
+    def _move_label_bucket(self, row: int, old_count: int, new_count: int):
+        self._label_counts[row] = new_count
+        if self._rows_by_label_count is None:
+            return
+        bucket = self._rows_by_label_count[old_count]
+        bucket.discard(row)
+        if not bucket:
+            del self._rows_by_label_count[old_count]
+        self._rows_by_label_count.setdefault(new_count, set()).add(row)
+
+    def labeled_rows(self) -> List[int]:
+        return np.flatnonzero(np.frombuffer(self._label_counts, dtype=np.int64)).tolist()
+
+    def _labeled_entries(self) -> Iterator[Tuple[int, Iterable[int]]]:
+        for row in self.labeled_rows():
+            yield row, self.label_ids(row)
+
+    def _allocate_label(self, start: int, end: int, description: str) -> int:
+        description_id = self._descriptions.intern(description)
+        if self._free_labels:
+            label_id = self._free_labels.pop()
+            self._label_start[label_id] = start
+            self._label_end[label_id] = end
+            self._label_description[label_id] = description_id
+        else:
+            label_id = len(self._label_start)
+            self._label_start.append(start)
+            self._label_end.append(end)
+            self._label_description.append(description_id)
+        return label_id
+
+    def _free_label(self, label_id: int):
+        self._descriptions.release(self._label_description[label_id])
+        self._label_description[label_id] = -1
+        self._free_labels.append(label_id)
+
+    def _compact_descriptions(self):
+        remap = self._descriptions.compact()
+        for label_id, description_id in enumerate(self._label_description):
+            if description_id >= 0:
+                self._label_description[label_id] = remap[description_id]
+
+    # Indexes
+
+    def corrupted_rows(self) -> List[int]:
+        self._ensure_indexes()
+        return sorted(self._corrupted_rows)
+
+    def select_rows(self, skip_corrupted: bool = False, label_count: Optional[int] = None,
+                    order_by_label_count: bool = False, query: Optional['MarkupQuery'] = None) -> List[int]:
+        rows = self._indexed_rows(skip_corrupted, label_count, order_by_label_count)
+        if query:
+            rows = np.array(rows, dtype=np.int64)
+            rows = rows[query.mask(self, rows)].tolist()
+        return rows
+
+    def _indexed_rows(self, skip_corrupted: bool, label_count: Optional[int], order_by_label_count: bool) -> List[int]:
+        # Rows in appearance order, or stably ordered by label count one bucket at a time
+        if label_count is None and not order_by_label_count:
+            if not skip_corrupted:
+                return list(range(len(self._hashes)))
+            bits = np.unpackbits(np.frombuffer(self._corrupted, dtype=np.uint8), bitorder='little')
+            return np.flatnonzero(bits[:len(self._hashes)] == 0).tolist()
+
+        self._ensure_indexes()
+        label_counts = sorted(self._rows_by_label_count) if label_count is None else [label_count]
+        rows = []
+        for count in label_counts:
+            bucket = self._rows_by_label_count.get(count, set())
+            rows.extend(sorted(bucket - self._corrupted_rows if skip_corrupted else bucket))
+        return rows
+
+    # Columns
+
+    def label_columns(self) -> Tuple[array, array]:
+        # Flattened (row, label id) pairs in row order, then label order
+        rows = array('q')
+        label_ids = array('q')
+        for row, ids in self._labeled_entries():
+            rows.extend([row] * len(ids))
+            label_ids.extend(ids)
+        return rows, label_ids
+
+    # Copies, numpy views would pin the arrays' buffers and block appends
+
+    def label_count_column(self) -> np.ndarray:
+        return np.frombuffer(self._label_counts, dtype=np.int64).copy()
+
+    def corrupted_column(self) -> np.ndarray:
+        bits = np.unpackbits(np.frombuffer(self._corrupted, dtype=np.uint8), bitorder='little')
+        return bits[:len(self._hashes)].astype(bool)
+
+    def file_size_column(self) -> np.ndarray:
+        return np.frombuffer(self._file_sizes, dtype=np.int64).copy()
+
+    def duration_column(self) -> np.ndarray:
+        return np.frombuffer(self._durations, dtype=np.int64).copy()
+
+    def path_id_column(self) -> np.ndarray:
+        return np.frombuffer(self._path_ids, dtype=np.int64).copy()
+
+    def extra_path_ids(self) -> Dict[int, array]:
+        return self._extra_paths
+
+    def path_strings(self, start: int) -> List[str]:
+        # Every path string from id start on, released ones included
+        return [self._paths.get(path_id) for path_id in range(start, len(self._paths))]
+
+    def labeled_duration(self, rows: np.ndarray) -> np.ndarray:
+        label_rows = array('q')
+        label_ids = array('q')
+        for row in rows.tolist():
+            ids = self.label_ids(row)
+            if ids:
+                label_rows.extend([row] * len(ids))
+                label_ids.extend(ids)
+        label_ids = np.frombuffer(label_ids, dtype=np.int64)
+        return union_lengths(np.frombuffer(label_rows, dtype=np.int64),
+                             np.frombuffer(self._label_start, dtype=np.int64)[label_ids],
+                             np.frombuffer(self._label_end, dtype=np.int64)[label_ids], rows)
+
+    def label_batches(self, batch_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        # Labels in row order, then label order. Per-entry columns are decoded once per labeled entry,
+        # then repeated over its labels.
+        rows, label_ids = self.label_columns()
+        rows = np.frombuffer(rows, dtype=np.int64)
+        label_ids = np.frombuffer(label_ids, dtype=np.int64)
+        starts = np.frombuffer(self._label_start, dtype=np.int64)
+        ends = np.frombuffer(self._label_end, dtype=np.int64)
+        for offset in range(0, len(rows), batch_size):
+            batch_rows = rows[offset:offset + batch_size]
+            batch_ids = label_ids[offset:offset + batch_size]
+            labeled_rows, counts = np.unique(batch_rows, return_counts=True)
+            yield {
+                'content_hash': np.repeat(object_column([self.hash_at(row) for row in labeled_rows]), counts),
+                'relative_path': np.repeat(object_column([self.primary_path(row) for row in labeled_rows]), counts),
+                'is_corrupted': np.repeat(np.array([self.is_corrupted(row) for row in labeled_rows], dtype=bool),
+                                          counts),
+                'start': starts[batch_ids],
+                'end': ends[batch_ids],
+                'description': object_column([self.description(label_id) for label_id in batch_ids]),
+            }
+
+    @property
+    def label_start(self) -> array:
+        return self._label_start
+
+    @property
+    def label_end(self) -> array:
+        return self._label_end
+
+    def description(self, label_id: int) -> str:
+        return self._descriptions.get(self._label_description[label_id])
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self._path_ids, self._file_sizes, self._durations, self._label_counts, self._label_start,
+                  self._label_end, self._label_description, self._free_labels, self._hash_order,
+                  self._base_label_rows, self._base_label_offsets, self._base_label_ids)
+        # mapped columns aren't resident
+        return (sum(a.itemsize * len(a) for a in arrays if isinstance(a, array)) + len(self._corrupted) + self._hashes.nbytes
+                + self._paths.nbytes + self._descriptions.nbytes)
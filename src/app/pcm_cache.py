@@ -0,0 +1,164 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Dict
+
+import numpy as np
+
+from src.app.audio_decoding import DecodedAudio, WAV_HEADER_SIZE, wav_header
+from src.config import PCM_CACHE_SPILL_BUDGET_MB
+
+
+@dataclass
+class CachedAudio:
+    # Kept as a WAV file so that it's played from memory without encoding it again
+    # uint8, in memory or memory-mapped
+    wav: np.ndarray
+    channels: int
+    sample_rate: int
+
+    @classmethod
+    def encode(cls, audio: DecodedAudio) -> 'CachedAudio':
+        wav = np.empty(WAV_HEADER_SIZE + audio.nbytes, dtype=np.uint8)
+        wav[:WAV_HEADER_SIZE] = np.frombuffer(wav_header(audio.frames, audio.channels, audio.sample_rate), np.uint8)
+        wav[WAV_HEADER_SIZE:].view('<i2').reshape(audio.samples.shape)[:] = audio.samples
+        return cls(wav, audio.channels, audio.sample_rate)
+
+    @property
+    def audio(self) -> DecodedAudio:
+        # The samples are a view of the file
+        return DecodedAudio(self.wav[WAV_HEADER_SIZE:].view('<i2').reshape(-1, self.channels), self.sample_rate)
+
+    @property
+    def nbytes(self) -> int:
+        return self.wav.nbytes
+
+
+@dataclass
+class PcmCacheStatistics:
+    hits: int = 0
+    # hits served from the spill file
+    spill_hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    resident_bytes: int = 0
+    spilled_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class PcmCache:
+    # Decoded audio by content hash, least recently used first out, encoded as WAV once it's put in. Entries
+    # evicted from the memory budget go to memory-mapped temporary files when a spill directory is given,
+    # up to their own budget.
+    # Shared by the GUI thread and workers.
+    def __init__(self, budget: int, spill_directory: Optional[Path] = None,
+                 spill_budget: int = PCM_CACHE_SPILL_BUDGET_MB * 1024 * 1024):
+        self._budget = budget
+        self._spill_directory = spill_directory
+        self._spill_budget = spill_budget
+        self._resident: OrderedDict[str, CachedAudio] = OrderedDict()
+        self._spilled: OrderedDict[str, CachedAudio] = OrderedDict()
+        # spill files that couldn't be removed while mapped, on Windows
+        self._spill_files: Dict[str, Path] = {}
+        self._statistics = PcmCacheStatistics()
+        self._lock = threading.Lock()
+
+    def configure(self, budget: int, spill_directory: Optional[Path]):
+        with self._lock:
+            self._budget = budget
+            if spill_directory != self._spill_directory:
+                for content_hash in list(self._spilled):
+                    self._drop_spilled(content_hash)
+                self._spill_directory = spill_directory
+            self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self._budget > 0 or self._spill_directory is not None
+
+    def get(self, content_hash: str) -> Optional[CachedAudio]:
+        with self._lock:
+            audio = self._resident.get(content_hash)
+            if audio is not None:
+                self._resident.move_to_end(content_hash)
+                self._statistics.hits += 1
+                return audio
+            audio = self._spilled.get(content_hash)
+            if audio is not None:
+                self._spilled.move_to_end(content_hash)
+                self._statistics.hits += 1
+                self._statistics.spill_hits += 1
+                return audio
+            self._statistics.misses += 1
+            return None
+
+    def put(self, content_hash: str, audio: DecodedAudio) -> CachedAudio:
+        # Encoding copies the samples, the caller can drop audio and go on with the cached one
+        cached = CachedAudio.encode(audio)
+        with self._lock:
+            known = self._resident.get(content_hash) or self._spilled.get(content_hash)
+            if known is not None:
+                return known
+            self._resident[content_hash] = cached
+            self._evict()
+        return cached
+
+    def statistics(self) -> PcmCacheStatistics:
+        with self._lock:
+            self._statistics.entries = len(self._resident) + len(self._spilled)
+            self._statistics.resident_bytes = sum(audio.nbytes for audio in self._resident.values())
+            self._statistics.spilled_bytes = sum(audio.nbytes for audio in self._spilled.values())
+            return PcmCacheStatistics(**self._statistics.__dict__)
+
+    def clear(self):
+        with self._lock:
+            self._resident.clear()
+            for content_hash in list(self._spilled):
+                self._drop_spilled(content_hash)
+
+    def _evict(self):
+        resident_bytes = sum(audio.nbytes for audio in self._resident.values())
+        while self._resident and resident_bytes > self._budget:
+            content_hash, audio = self._resident.popitem(last=False)
+            resident_bytes -= audio.nbytes
+            if self._spill_directory is not None and audio.nbytes <= self._spill_budget:
+                self._spill(content_hash, audio)
+        spilled_bytes = sum(audio.nbytes for audio in self._spilled.values())
+        while self._spilled and spilled_bytes > self._spill_budget:
+            content_hash = next(iter(self._spilled))
+            spilled_bytes -= self._spilled[content_hash].nbytes
+            self._drop_spilled(content_hash)
+
+    def _spill(self, content_hash: str, audio: CachedAudio):
+        try:
+            self._spill_directory.mkdir(parents=True, exist_ok=True)
+            descriptor, name = tempfile.mkstemp(suffix='.wav', dir=self._spill_directory)
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(audio.wav.data)
+            wav = np.memmap(name, dtype=np.uint8, mode='r', shape=audio.wav.shape)
+        except OSError:
+            # spilling is only an optimization
+            return
+        try:
+            # the mapping keeps the data around
+            os.unlink(name)
+        except OSError:
+            self._spill_files[content_hash] = Path(name)
+        self._spilled[content_hash] = CachedAudio(wav, audio.channels, audio.sample_rate)
+
+    def _drop_spilled(self, content_hash: str):
+        del self._spilled[content_hash]
+        path = self._spill_files.pop(content_hash, None)
+        if path is not None:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                # still mapped by someone holding the samples, left to the temporary directory cleanup
+                pass
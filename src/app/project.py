@@ -1,52 +1,215 @@
+import copy
 import pickle
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Self
+from typing import Self, Optional, Tuple, Sequence, List
 
-from src.app.markup_data import MarkupData
+from src.app.file_system_utils import atomic_write
+from src.app.markup_data import MarkupData, RehashedEntry
 from src.app.markup_iterator import MarkupIterator
+from src.app.markup_export import export_markup
+from src.app.markup_journal import MarkupJournal, journal_path
 from src.app.markup_settings import MarkupSettings
-from src.config import PROJECT_FILE_SUFFIX
+from src.app.project_file import write_project_file, read_project_file
+from src.app.snapshot import FrozenState
+from src.app.sqlite_store import SqliteMarkupStore, database_path
+from src.config import PROJECT_FILE_SUFFIX, JOURNAL_COMPACTION_RECORDS
+
+
+@dataclass
+class ProjectSnapshot:
+    # Taken by Project.snapshot on the owning thread, written from any thread
+    path: Path
+    journal_id: str
+    generation: Tuple[int, int]
+    state: FrozenState
+
+    def write(self):
+        try:
+            with atomic_write(self.path) as file:
+                write_project_file(file, self.state)
+        except Exception as e:
+            raise pickle.PickleError(f"Failed to save project to {self.path}: {e}.")
 
 
 class Project:
-    def __init__(self, name: str, description: str, dataset_dir: Path):
+    class Storage:
+        # entries and labels are pickled into the project file
+        FILE = 'file'
+        # or kept in a SQLite database beside it, for datasets too large to unpickle on every start
+        DATABASE = 'database'
+
+    def __init__(self, name: str, description: str, dataset_dir: Path, scan: bool = True,
+                 storage: str = Storage.FILE):
         self.name = name
         self.description = description
         self._markup_settings = MarkupSettings()
-        self._markup_data = MarkupData(dataset_dir)
+        store = SqliteMarkupStore.temporary() if storage == Project.Storage.DATABASE else None
+        self._markup_data = MarkupData(dataset_dir, self._markup_settings.scan_settings, scan, store)
+        # Label edits since the last save go to a journal beside the project file, tagged with this id
+        self._journal_id = uuid.uuid4().hex
+        self._journal: Optional[MarkupJournal] = None
+        self._path: Optional[Path] = None
+        # bumped by mark_changed, together with MarkupData.generation it tells whether a save is due
+        self._generation = 0
+        self._saved_generation: Optional[Tuple[int, int]] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_journal']
+        del state['_path']
+        del state['_generation']
+        del state['_saved_generation']
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('_journal_id', uuid.uuid4().hex)
+        state['_journal'] = None
+        state['_path'] = None
+        state['_generation'] = 0
+        state['_saved_generation'] = None
+        self.__dict__.update(state)
 
     def get_dataset_iterator(self) -> MarkupIterator:
         return MarkupIterator(self._markup_data, self._markup_settings.iteration_settings)
 
     @classmethod
-    def load(cls, path: Path) -> Self:
+    def load(cls, path: Path, rescan: bool = True, read_only: bool = False) -> Self:
+        # Without rescan the saved state is returned as is, the caller is expected to scan the dataset.
+        # A read only project has the journaled edits replayed but never writes to the journal or the
+        # database beside path, it can only be saved elsewhere.
         if not path.exists() or not path.is_file() or path.suffix != PROJECT_FILE_SUFFIX:
             raise FileNotFoundError(f"Invalid project file: {path}")
         try:
-            with open(path, 'rb') as file:
-                loaded_project = pickle.load(file)
-                if not isinstance(loaded_project, Project):
-                    raise TypeError("File does not contain MM project.")
+            loaded_project = read_project_file(path)
+            if not isinstance(loaded_project, Project):
+                raise TypeError("File does not contain MM project.")
+            # replayed edits aren't in the file yet
+            loaded_project._saved_generation = loaded_project.generation
+            if loaded_project._markup_data.uses_database:
+                loaded_project._markup_data.attach_database(database_path(path), copy=read_only)
+                if not read_only:
+                    loaded_project._path = path
+            elif read_only:
+                records = MarkupJournal(journal_path(path)).read(loaded_project._journal_id)
+                loaded_project._markup_data.replay_journal(records)
+            else:
+                loaded_project._open_journal(path)
+            if rescan:
                 loaded_project._markup_data.update_state()
-                return loaded_project
+            return loaded_project
         except Exception as e:
             raise pickle.PickleError(f"Failed to load project from {path}: {e}")
 
+    def _open_journal(self, path: Path):
+        # Replays the edits made after the snapshot, then keeps appending to the same journal
+        journal = MarkupJournal(journal_path(path))
+        records = list(journal.read(self._journal_id))
+        replayed = self._markup_data.replay_journal(records)
+        if replayed < len(records):
+            # The rest doesn't apply, the replayed part is folded into a fresh snapshot
+            self.save(path)
+            return
+        self._path = path
+        self._journal = journal
+        journal.open(self._journal_id, len(records))
+        self._markup_data.attach_journal(journal)
+
     def save(self, path: Path):
-        try:
-            with open(path, 'wb') as file:
-                pickle.dump(self, file)
-        except Exception as e:
-            raise pickle.PickleError(f"Failed to save project to {path}: {e}.")
+        snapshot = self.snapshot(path)
+        snapshot.write()
+        self.snapshot_saved(snapshot)
+
+    def snapshot(self, path: Path) -> ProjectSnapshot:
+        # A copy of the project to be written to path by ProjectSnapshot.write, on any thread.
+        # Editing can go on meanwhile, edits from now on are journaled for the new snapshot.
+        journal_id = uuid.uuid4().hex
+        if self._markup_data.uses_database:
+            # Label edits are committed to the database as they are made, it only moves on Save As
+            try:
+                self._markup_data.save_database(database_path(path))
+            except Exception as e:
+                raise pickle.PickleError(f"Failed to save project to {path}: {e}.")
+        else:
+            self._start_journal(path, journal_id)
+        state = self.__getstate__()
+        memo = {}
+        state['_markup_settings'] = copy.deepcopy(self._markup_settings, memo)
+        state['_markup_data'] = self._markup_data.snapshot(memo)
+        state['_journal_id'] = journal_id
+        return ProjectSnapshot(path, journal_id, self.generation, FrozenState(Project, state))
+
+    def _start_journal(self, path: Path, journal_id: str):
+        if self._journal is not None and path == self._path:
+            # Until the snapshot is written the journal also has to serve the previous one
+            self._journal.mark_snapshot(journal_id)
+            return
+        if self._journal is not None:
+            self._journal.close()
+        self._path = path
+        self._journal = MarkupJournal(journal_path(path))
+        self._journal.open(journal_id)
+        self._markup_data.attach_journal(self._journal)
 
-    def export_markup(self, path: Path):
+    def snapshot_saved(self, snapshot: ProjectSnapshot):
+        self._journal_id = snapshot.journal_id
+        self._path = snapshot.path
+        self._saved_generation = snapshot.generation
+        if self._journal is not None:
+            self._journal.drop_before_snapshot(snapshot.journal_id)
+
+    @property
+    def generation(self) -> Tuple[int, int]:
+        return self._generation, self._markup_data.generation
+
+    def mark_changed(self):
+        # For settings edits, MarkupData only counts label edits. Moving through the dataset doesn't make a save due.
+        self._generation += 1
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.generation != self._saved_generation
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._journal is not None and self._journal.record_count >= JOURNAL_COMPACTION_RECORDS
+
+    def autosave(self):
+        # O(changes): the journal is fsynced, a full snapshot is only written once it grows long
+        if self._journal is None:
+            return
+        if self.needs_compaction:
+            self.save(self._path)
+        else:
+            self._journal.flush()
+
+    @property
+    def autosaves_labels(self) -> bool:
+        # Label edits outlive the session without a save, through the journal or the database
+        return self._journal is not None or (self._path is not None and self._markup_data.uses_database)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+        self._markup_data.attach_journal(None)
+        self._markup_data.close()
+        self._journal = None
+
+    def export_markup(self, path: Path, export_format: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+                      compression: Optional[str] = None) -> int:
+        # Exports the labels as they are, without a rescan, see markup_export.export_markup
         try:
-            with open(path, 'wb') as file:
-                self._markup_data.update_state()
-                pickle.dump(self._markup_data.to_df(), file)
+            return export_markup(self._markup_data, path, export_format, columns, compression)
         except Exception as e:
             raise RuntimeError(f"Failed to export markup to {path}: {e}.")
 
+    def migrate_hash_algorithm(self, algorithm: str, rehashed: Optional[List[RehashedEntry]] = None):
+        # rehashed - see MarkupData.migrate_hash_algorithm
+        # Journaled edits refer to the old keys and a database store is rebuilt in a temporary file,
+        # a project that autosaves labels has to be saved right after
+        self._markup_data.migrate_hash_algorithm(algorithm, rehashed)
+
     @property
     def markup_settings(self):
         return self._markup_settings
@@ -0,0 +1,104 @@
+import io
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, BinaryIO, List, Union
+
+from src.config import PROJECT_SECTION_MIN_BYTES
+
+# Layout of a project file:
+#   header   magic, header pickle length, section count
+#   table    (offset, length) of every section
+#   pickle   the project, with its large buffers (string blobs, columns) replaced by section references
+#   sections the buffers, 8-byte aligned
+# Byte sections are mapped on load, so strings are paged in only as they are read. Files saved before this
+# layout are plain pickles.
+_MAGIC = b'MMPROJ02'
+_HEADER = struct.Struct('<8sQQ')
+_SECTION = struct.Struct('<QQ')
+_ALIGNMENT = 8
+
+# Windows can't replace a file while it's mapped, saving over the open project would fail
+_MAP_SECTIONS = os.name != 'nt'
+
+
+class _SectionPickler(pickle.Pickler):
+    def __init__(self, file: BinaryIO):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.sections: List[memoryview] = []
+
+    def persistent_id(self, obj: Any):
+        # mapped buffers of a loaded project can't be pickled, they always go to sections
+        if isinstance(obj, memoryview) or (
+                isinstance(obj, (bytes, bytearray)) and len(obj) >= PROJECT_SECTION_MIN_BYTES):
+            return 'bytes', self._add(memoryview(obj).cast('B'))
+        if type(obj) is array and obj.itemsize * len(obj) >= PROJECT_SECTION_MIN_BYTES:
+            return 'array', obj.typecode, self._add(memoryview(obj).cast('B'))
+        return None
+
+    def _add(self, section: memoryview) -> int:
+        self.sections.append(section)
+        return len(self.sections) - 1
+
+
+class _SectionUnpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO, sections: List[Union[memoryview, bytes]]):
+        super().__init__(file)
+        self._sections = sections
+
+    def persistent_load(self, pid: Any):
+        if pid[0] == 'bytes':
+            return self._sections[pid[1]]
+        if pid[0] == 'array':
+            # Columns are appended to, so they are copied out of the mapping
+            column = array(pid[1])
+            column.frombytes(self._sections[pid[2]])
+            return column
+        raise pickle.UnpicklingError(f"Unknown section reference {pid!r}.")
+
+
+def write_project_file(file: BinaryIO, obj: Any):
+    # The header pickle is buffered, its length is needed before the sections are laid out
+    buffer = io.BytesIO()
+    pickler = _SectionPickler(buffer)
+    pickler.dump(obj)
+    header = buffer.getvalue()
+
+    end = _HEADER.size + _SECTION.size * len(pickler.sections) + len(header)
+    offsets = []
+    for section in pickler.sections:
+        end += -end % _ALIGNMENT
+        offsets.append(end)
+        end += section.nbytes
+
+    file.write(_HEADER.pack(_MAGIC, len(header), len(pickler.sections)))
+    file.writelines(_SECTION.pack(offset, section.nbytes) for offset, section in zip(offsets, pickler.sections))
+    file.write(header)
+    position = file.tell()
+    for offset, section in zip(offsets, pickler.sections):
+        file.write(b'\0' * (offset - position))
+        file.write(section)
+        position = offset + section.nbytes
+
+
+def read_project_file(path: Path) -> Any:
+    with open(path, 'rb') as file:
+        magic, header_size, section_count = _HEADER.unpack(file.read(_HEADER.size).ljust(_HEADER.size, b'\0'))
+        if magic != _MAGIC:
+            file.seek(0)
+            return pickle.load(file)
+        table = [_SECTION.unpack(file.read(_SECTION.size)) for _ in range(section_count)]
+        header = file.read(header_size)
+        if _MAP_SECTIONS and section_count:
+            mapped = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            sections = [mapped[offset:offset + length] for offset, length in table]
+        else:
+            sections = []
+            for offset, length in table:
+                file.seek(offset)
+                sections.append(memoryview(file.read(length)))
+    return _SectionUnpickler(io.BytesIO(header), sections).load()
+
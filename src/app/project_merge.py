@@ -0,0 +1,94 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Iterable, Optional, Callable, Tuple, Set
+
+from src.app.markup_data import MarkupData, MarkupValue
+from src.app.project import Project
+from src.config import LABEL_BATCH_SIZE
+
+
+@dataclass
+class LabelConflict:
+    content_hash: str
+    relative_path: Path
+    # a merged label overlapping labels of the entry with other descriptions, all of them are kept
+    label: MarkupValue
+    overlapping: List[MarkupValue]
+    source: Optional[Path] = None
+
+
+@dataclass
+class MergeReport:
+    merged_labels: int = 0
+    # labels the target already had
+    duplicate_labels: int = 0
+    # entries of the source missing from the target, their labels are left out
+    unknown_entries: int = 0
+    unknown_labels: int = 0
+    conflicts: List[LabelConflict] = field(default_factory=list)
+
+    def add(self, other: 'MergeReport'):
+        self.merged_labels += other.merged_labels
+        self.duplicate_labels += other.duplicate_labels
+        self.unknown_entries += other.unknown_entries
+        self.unknown_labels += other.unknown_labels
+        self.conflicts.extend(other.conflicts)
+
+
+def merge_labels(target: MarkupData, source: MarkupData, source_path: Optional[Path] = None,
+                 batch_size: int = LABEL_BATCH_SIZE) -> MergeReport:
+    # Adds the labels of source entries to the target entries with the same content hash. Labels the target
+    # already has with the same range and description are skipped, labels overlapping target labels with another
+    # description are merged and reported as conflicts. The source is read in label batches and the target is
+    # written a batch at a time.
+    if target.hash_algorithm != source.hash_algorithm:
+        raise ValueError(f"The projects hash files with different algorithms ({target.hash_algorithm} and "
+                         f"{source.hash_algorithm}), migrate one of them first.")
+    report = MergeReport()
+    pending: List[Tuple[str, MarkupValue]] = []
+    for content_hash, relative_path, _, labels in source.labeled_entries():
+        view = target.get(content_hash)
+        if view is None:
+            report.unknown_entries += 1
+            report.unknown_labels += len(labels)
+            continue
+        # only labels from before this source can conflict, an annotator's own labels may overlap
+        existing = view.entry.values
+        known: Set[Tuple[int, int, str]] = {(value.start, value.end, value.description) for value in existing}
+        for label in labels:
+            key = (label.start, label.end, label.description)
+            if key in known:
+                report.duplicate_labels += 1
+                continue
+            overlapping = [value for value in existing
+                           if value.start < label.end and label.start < value.end
+                           and value.description != label.description]
+            if overlapping:
+                report.conflicts.append(LabelConflict(content_hash, relative_path, label, overlapping,
+                                                      source_path))
+            pending.append((content_hash, label))
+            known.add(key)
+            report.merged_labels += 1
+        if len(pending) >= batch_size:
+            target.append_labels(pending)
+            pending = []
+    if pending:
+        target.append_labels(pending)
+    return report
+
+
+def merge_projects(target: Project, source_paths: Iterable[Path],
+                   on_merged: Optional[Callable[[Path, MergeReport], None]] = None) -> MergeReport:
+    # Merges the labels of each source project into target in turn, only one source is loaded at a time.
+    # The target isn't saved.
+    report = MergeReport()
+    for source_path in source_paths:
+        source = Project.load(source_path, rescan=False, read_only=True)
+        try:
+            source_report = merge_labels(target.markup_data, source.markup_data, source_path)
+        finally:
+            source.close()
+        if on_merged is not None:
+            on_merged(source_path, source_report)
+        report.add(source_report)
+    return report
@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+from typing import Tuple, Optional
+
+from src.app.file_system_utils import PathRules
+from src.config import HASH_CHUNK_SIZE, HASH_WORKERS, DEFAULT_HASH_ALGORITHM, AUDIO_FILES_PATTERN, WALK_WORKERS
+
+
+@dataclass
+class ScanSettings:
+    # content hash used as the entry key, a change re-keys the project (MarkupData.migrate_hash_algorithm)
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM
+    # files hashed concurrently, peak memory is roughly hash_chunk_size * hash_workers
+    hash_workers: int = HASH_WORKERS
+    hash_chunk_size: int = HASH_CHUNK_SIZE
+    # processes sidestep the GIL for tiny files, threads are cheaper for large ones
+    use_processes: bool = False
+    # keep MarkupData in sync with the dataset directory while the project is open
+    watch_dataset: bool = False
+    # used only when inotify isn't available
+    watch_poll_interval: float = 5.0
+    # glob patterns over dataset-relative paths, an empty include accepts everything
+    include_patterns: Tuple[str, ...] = ()
+    exclude_patterns: Tuple[str, ...] = ()
+    # directories nested deeper than this are skipped (None - unlimited)
+    max_depth: Optional[int] = None
+    # directory subtrees listed concurrently
+    walk_workers: int = WALK_WORKERS
+
+    def path_rules(self) -> PathRules:
+        return PathRules(AUDIO_FILES_PATTERN, self.include_patterns, self.exclude_patterns, self.max_depth)
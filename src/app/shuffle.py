@@ -0,0 +1,37 @@
+from typing import List
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finalizer
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class KeyedPermutation:
+    # Bijection of [0, size), size >= 2 ** bits, computed on demand by a small Feistel network,
+    # so a shuffled order of any size is described by its seed alone
+    _ROUNDS = 4
+
+    # every pass over the same seed is a different permutation
+    def __init__(self, seed: int, bits: int, shuffle_pass: int = 0):
+        self._half = max(1, (bits + 1) // 2)
+        self._mask = (1 << self._half) - 1
+        self._keys: List[int] = [_mix(_mix(seed) ^ (shuffle_pass * self._ROUNDS + i)) for i in range(self._ROUNDS)]
+
+    @staticmethod
+    def bits_for(size: int) -> int:
+        return max(2, (size - 1).bit_length())
+
+    @property
+    def size(self) -> int:
+        return 1 << (2 * self._half)
+
+    def __getitem__(self, position: int) -> int:
+        left, right = position >> self._half, position & self._mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(right ^ key) & self._mask)
+        return (left << self._half) | right
@@ -0,0 +1,19 @@
+import copyreg
+from typing import Any, Callable, Optional
+
+
+class FrozenState:
+    # Unpickles as an instance of cls with this state. The state is copied on the owning thread,
+    # then pickled on another one while the original object keeps changing. complete(state) runs right
+    # before pickling, on the pickling thread, for the parts that are slow to build but safe to read there.
+    def __init__(self, cls: type, state: Any, complete: Optional[Callable[[Any], None]] = None):
+        self._cls = cls
+        self._state = state
+        self._complete = complete
+
+    def __reduce__(self):
+        if self._complete is not None:
+            self._complete(self._state)
+            self._complete = None
+        # copyreg.__newobj__ would be checked against the class of this object
+        return copyreg._reconstructor, (self._cls, object, None), self._state
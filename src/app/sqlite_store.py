@@ -0,0 +1,418 @@
+import os
+import re
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Tuple, Iterator, Any
+
+import numpy as np
+
+from src.app.markup_query import MarkupQuery, QueryCondition
+from src.app.markup_store import union_lengths, object_column
+from src.app.snapshot import FrozenState
+from src.config import DATABASE_FILE_SUFFIX
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS entries (
+    row INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    path_id INTEGER NOT NULL,
+    corrupted INTEGER NOT NULL DEFAULT 0,
+    file_size INTEGER NOT NULL DEFAULT -1,
+    duration INTEGER NOT NULL DEFAULT -1,
+    label_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS extra_paths (
+    row INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    path_id INTEGER NOT NULL,
+    PRIMARY KEY (row, position)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    row INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_path ON entries (path_id);
+CREATE INDEX IF NOT EXISTS entries_label_count ON entries (label_count, row);
+CREATE INDEX IF NOT EXISTS entries_corrupted ON entries (corrupted, row);
+CREATE INDEX IF NOT EXISTS labels_row ON labels (row, position);
+'''
+
+_PATH_MATCH = ('(EXISTS (SELECT 1 FROM paths p WHERE p.id = entries.path_id AND p.path REGEXP ?) '
+               'OR EXISTS (SELECT 1 FROM extra_paths x JOIN paths p ON p.id = x.path_id '
+               'WHERE x.row = entries.row AND p.path REGEXP ?))')
+
+# Above this many rows labeled_duration scans the labels table instead of looking rows up one by one
+_ROW_LOOKUP_LIMIT = 512
+
+
+def _regexp(pattern: str, text: str) -> bool:
+    # re caches compiled patterns, so this is compiled once per query
+    return re.search(pattern, text) is not None
+
+
+def _condition_sql(condition: QueryCondition) -> Optional[Tuple[str, List[Any]]]:
+    # None for conditions SQL can't answer on its own
+    op = condition.op
+    if condition.field == 'path':
+        pattern = condition.value.pattern
+        return (_PATH_MATCH if op in ('~', '=') else 'NOT ' + _PATH_MATCH), [pattern, pattern]
+    if condition.field == 'corrupted':
+        return f'corrupted {op} ?', [int(condition.value)]
+    if condition.field == 'labels':
+        return f'label_count {op} ?', [condition.value]
+    if condition.field == 'size':
+        return f'(file_size >= 0 AND file_size {op} ?)', [condition.value]
+    if condition.field == 'duration':
+        return f'(duration > 0 AND duration {op} ?)', [condition.value]
+    return None
+
+
+class SqliteMarkupStore:
+    # MarkupStore kept in a SQLite database, for datasets too large to unpickle on every start.
+    # Same row-based interface, changes become durable on commit(), MarkupData commits after every mutation.
+    is_persistent = True
+
+    def __init__(self, path: Path, temporary: bool = False):
+        self._path = path
+        # a temporary database belongs to a project that hasn't been saved yet
+        self._temporary = temporary
+        self._connection: Optional[sqlite3.Connection] = None
+        self._size = 0
+        self._path_count = 0
+        self._connect()
+
+    @classmethod
+    def temporary(cls) -> 'SqliteMarkupStore':
+        descriptor, path = tempfile.mkstemp(suffix=DATABASE_FILE_SUFFIX)
+        os.close(descriptor)
+        return cls(Path(path), temporary=True)
+
+    def __getstate__(self):
+        # Only the project file is pickled, the database is reopened beside it on load.
+        # The state can't be empty, __setstate__ wouldn't be called for it.
+        return {'version': 1}
+
+    def __setstate__(self, state):
+        self._path = None
+        self._temporary = False
+        self._connection = None
+        self._size = 0
+        self._path_count = 0
+
+    def snapshot(self) -> FrozenState:
+        return FrozenState(SqliteMarkupStore, self.__getstate__())
+
+    def _connect(self):
+        self._connection = sqlite3.connect(self._path)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.create_function('regexp', 2, _regexp, deterministic=True)
+        self._connection.executescript(_SCHEMA)
+        self._size = self._scalar('SELECT count(*) FROM entries')
+        self._path_count = self._scalar('SELECT count(*) FROM paths')
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self._path
+
+    def open(self, path: Path):
+        self.close()
+        self._path = path
+        self._temporary = False
+        self._connect()
+
+    def open_copy(self, path: Path):
+        # A temporary copy of the database at path, edits don't reach it
+        self.close()
+        descriptor, copy_path = tempfile.mkstemp(suffix=DATABASE_FILE_SUFFIX)
+        os.close(descriptor)
+        self._path = Path(copy_path)
+        self._temporary = True
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(self._path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self._connect()
+
+    def save_to(self, path: Path):
+        # Moves the database to path, a temporary one is deleted afterwards
+        self.commit()
+        if path == self._path:
+            return
+        target = sqlite3.connect(path)
+        try:
+            self._connection.backup(target)
+        finally:
+            target.close()
+        self.close()
+        self.open(path)
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        if self._connection is None:
+            return
+        self._connection.commit()
+        self._connection.close()
+        self._connection = None
+        if self._temporary:
+            for suffix in ('', '-wal', '-shm'):
+                Path(str(self._path) + suffix).unlink(missing_ok=True)
+
+    def create_empty(self) -> 'SqliteMarkupStore':
+        return SqliteMarkupStore.temporary()
+
+    def _scalar(self, sql: str, parameters: Iterable[Any] = ()) -> Any:
+        row = self._connection.execute(sql, tuple(parameters)).fetchone()
+        return row[0] if row is not None else None
+
+    def _entry_value(self, column: str, row: int) -> int:
+        value = self._scalar(f'SELECT {column} FROM entries WHERE row = ?', (row,))
+        if value is None:
+            raise IndexError(row)
+        return value
+
+    def _set_entry_value(self, column: str, row: int, value: int):
+        self._connection.execute(f'UPDATE entries SET {column} = ? WHERE row = ?', (value, row))
+
+    def __len__(self):
+        return self._size
+
+    # Entries
+
+    def row_of(self, content_hash: str) -> Optional[int]:
+        return self._scalar('SELECT row FROM entries WHERE hash = ?', (content_hash,))
+
+    def hash_at(self, row: int) -> str:
+        content_hash = self._scalar('SELECT hash FROM entries WHERE row = ?', (row,))
+        if content_hash is None:
+            raise IndexError(row)
+        return content_hash
+
+    def hashes(self) -> List[str]:
+        return [content_hash for content_hash, in self._connection.execute('SELECT hash FROM entries ORDER BY row')]
+
+    def append_entry(self, content_hash: str, relative_paths: List[Path], is_corrupted: bool = False,
+                     file_size: int = -1) -> int:
+        if not relative_paths:
+            raise ValueError("An entry needs at least one path.")
+        row = self._size
+        path_ids = [self._intern_path(path) for path in relative_paths]
+        self._connection.execute(
+            'INSERT INTO entries (row, hash, path_id, corrupted, file_size) VALUES (?, ?, ?, ?, ?)',
+            (row, content_hash, path_ids[0], int(is_corrupted), file_size))
+        self._insert_extra_paths(row, path_ids[1:])
+        self._size += 1
+        return row
+
+    def _intern_path(self, relative_path: Path) -> int:
+        text = relative_path.as_posix()
+        path_id = self._scalar('SELECT id FROM paths WHERE path = ?', (text,))
+        if path_id is None:
+            # ids stay dense from 0, MarkupQuery caches path matches by id
+            path_id = self._path_count
+            self._connection.execute('INSERT INTO paths (id, path) VALUES (?, ?)', (path_id, text))
+            self._path_count += 1
+        return path_id
+
+    def _insert_extra_paths(self, row: int, path_ids: List[int]):
+        self._connection.executemany('INSERT INTO extra_paths (row, position, path_id) VALUES (?, ?, ?)',
+                                     [(row, position, path_id) for position, path_id in enumerate(path_ids)])
+
+    def paths(self, row: int) -> List[Path]:
+        paths = [self.primary_path(row)]
+        paths.extend(Path(path) for path, in self._connection.execute(
+            'SELECT p.path FROM extra_paths x JOIN paths p ON p.id = x.path_id WHERE x.row = ? ORDER BY x.position',
+            (row,)))
+        return paths
+
+    def primary_path_id(self, row: int) -> int:
+        return self._entry_value('path_id', row)
+
+    def primary_path(self, row: int) -> Path:
+        path = self._scalar('SELECT p.path FROM entries e JOIN paths p ON p.id = e.path_id WHERE e.row = ?', (row,))
+        if path is None:
+            raise IndexError(row)
+        return Path(path)
+
+    def set_paths(self, row: int, relative_paths: List[Path]):
+        if not relative_paths:
+            raise ValueError("An entry needs at least one path.")
+        path_ids = [self._intern_path(path) for path in relative_paths]
+        self._set_entry_value('path_id', row, path_ids[0])
+        self._connection.execute('DELETE FROM extra_paths WHERE row = ?', (row,))
+        self._insert_extra_paths(row, path_ids[1:])
+
+    def is_corrupted(self, row: int) -> bool:
+        return bool(self._entry_value('corrupted', row))
+
+    def set_corrupted(self, row: int, is_corrupted: bool):
+        self._set_entry_value('corrupted', row, int(is_corrupted))
+
+    def file_size(self, row: int) -> int:
+        return self._entry_value('file_size', row)
+
+    def set_file_size(self, row: int, file_size: int):
+        self._set_entry_value('file_size', row, file_size)
+
+    def duration(self, row: int) -> int:
+        return self._entry_value('duration', row)
+
+    def set_duration(self, row: int, duration: int):
+        self._set_entry_value('duration', row, duration)
+
+    # Labels
+
+    def label_count(self, row: int) -> int:
+        return self._entry_value('label_count', row)
+
+    def label_ids(self, row: int) -> Iterable[int]:
+        return [label_id for label_id, in self._connection.execute(
+            'SELECT id FROM labels WHERE row = ? ORDER BY position', (row,))]
+
+    def label(self, label_id: int) -> Tuple[int, int, str]:
+        return self._connection.execute('SELECT start, end, description FROM labels WHERE id = ?',
+                                        (label_id,)).fetchone()
+
+    def insert_label(self, row: int, index: int, start: int, end: int, description: str):
+        count = self.label_count(row)
+        index = min(index, count)
+        self._connection.execute('UPDATE labels SET position = position + 1 WHERE row = ? AND position >= ?',
+                                 (row, index))
+        self._connection.execute('INSERT INTO labels (row, position, start, end, description) VALUES (?, ?, ?, ?, ?)',
+                                 (row, index, start, end, description))
+        self._set_entry_value('label_count', row, count + 1)
+
+    def replace_label(self, row: int, index: int, start: int, end: int, description: str):
+        cursor = self._connection.execute(
+            'UPDATE labels SET start = ?, end = ?, description = ? WHERE row = ? AND position = ?',
+            (start, end, description, row, index))
+        if cursor.rowcount == 0:
+            raise IndexError(index)
+
+    def remove_label(self, row: int, index: int):
+        cursor = self._connection.execute('DELETE FROM labels WHERE row = ? AND position = ?', (row, index))
+        if cursor.rowcount == 0:
+            raise IndexError(index)
+        self._connection.execute('UPDATE labels SET position = position - 1 WHERE row = ? AND position > ?',
+                                 (row, index))
+        self._connection.execute('UPDATE entries SET label_count = label_count - 1 WHERE row = ?', (row,))
+
+    def labeled_rows(self) -> List[int]:
+        return self._rows('SELECT row FROM entries WHERE label_count > 0 ORDER BY row')
+
+    # Indexes
+
+    def _rows(self, sql: str, parameters: Iterable[Any] = ()) -> List[int]:
+        return [row for row, in self._connection.execute(sql, tuple(parameters))]
+
+    def corrupted_rows(self) -> List[int]:
+        return self._rows('SELECT row FROM entries WHERE corrupted = 1 ORDER BY row')
+
+    def select_rows(self, skip_corrupted: bool = False, label_count: Optional[int] = None,
+                    order_by_label_count: bool = False, query: Optional[MarkupQuery] = None) -> List[int]:
+        # Filters and the query are pushed down to SQL, only coverage is left to the query's mask
+        where = []
+        parameters = []
+        if skip_corrupted:
+            where.append('corrupted = 0')
+        if label_count is not None:
+            where.append('label_count = ?')
+            parameters.append(label_count)
+        remaining = []
+        for condition in query.conditions if query else ():
+            condition_sql = _condition_sql(condition)
+            if condition_sql is None:
+                remaining.append(condition)
+                where.append('duration > 0')
+            else:
+                where.append(condition_sql[0])
+                parameters.extend(condition_sql[1])
+        sql = 'SELECT row FROM entries'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY label_count, row' if order_by_label_count else ' ORDER BY row'
+        rows = self._rows(sql, parameters)
+        if remaining:
+            rows = np.array(rows, dtype=np.int64)
+            rows = rows[MarkupQuery(remaining).mask(self, rows)].tolist()
+        return rows
+
+    # Columns
+
+    def _column(self, column: str) -> np.ndarray:
+        return np.fromiter((value for value, in self._connection.execute(f'SELECT {column} FROM entries ORDER BY row')),
+                           dtype=np.int64, count=self._size)
+
+    def label_count_column(self) -> np.ndarray:
+        return self._column('label_count')
+
+    def corrupted_column(self) -> np.ndarray:
+        return self._column('corrupted').astype(bool)
+
+    def file_size_column(self) -> np.ndarray:
+        return self._column('file_size')
+
+    def duration_column(self) -> np.ndarray:
+        return self._column('duration')
+
+    def path_id_column(self) -> np.ndarray:
+        return self._column('path_id')
+
+    def extra_path_ids(self) -> Dict[int, List[int]]:
+        extra_paths: Dict[int, List[int]] = {}
+        for row, path_id in self._connection.execute('SELECT row, path_id FROM extra_paths ORDER BY row, position'):
+            extra_paths.setdefault(row, []).append(path_id)
+        return extra_paths
+
+    def path_strings(self, start: int) -> List[str]:
+        return [path for path, in self._connection.execute('SELECT path FROM paths WHERE id >= ? ORDER BY id',
+                                                           (start,))]
+
+    def labeled_duration(self, rows: np.ndarray) -> np.ndarray:
+        if len(rows) <= _ROW_LOOKUP_LIMIT:
+            labels = [label for row in set(rows.tolist()) for label in self._connection.execute(
+                'SELECT row, start, end FROM labels WHERE row = ?', (row,))]
+        else:
+            selected = set(rows.tolist())
+            labels = [label for label in self._connection.execute('SELECT row, start, end FROM labels')
+                      if label[0] in selected]
+        labels = np.array(labels, dtype=np.int64).reshape(-1, 3)
+        return union_lengths(labels[:, 0], labels[:, 1], labels[:, 2], rows)
+
+    def label_batches(self, batch_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        # Streams the labels from a cursor in row order, then label order
+        cursor = self._connection.execute(
+            'SELECT e.hash, p.path, e.corrupted, l.start, l.end, l.description FROM labels l '
+            'JOIN entries e ON e.row = l.row JOIN paths p ON p.id = e.path_id ORDER BY l.row, l.position')
+        while batch := cursor.fetchmany(batch_size):
+            hashes, paths, corrupted, starts, ends, descriptions = zip(*batch)
+            yield {
+                'content_hash': object_column(hashes),
+                'relative_path': object_column([Path(path) for path in paths]),
+                'is_corrupted': np.array(corrupted, dtype=bool),
+                'start': np.array(starts, dtype=np.int64),
+                'end': np.array(ends, dtype=np.int64),
+                'description': object_column(descriptions),
+            }
+
+    @property
+    def nbytes(self) -> int:
+        return self._scalar('PRAGMA page_count') * self._scalar('PRAGMA page_size')
+
+
+def database_path(project_path: Path) -> Path:
+    return project_path.with_name(project_path.name + DATABASE_FILE_SUFFIX)
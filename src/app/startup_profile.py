@@ -0,0 +1,112 @@
+import builtins
+import importlib.util
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional
+
+# Standard library only, the profile is started before anything else is imported
+
+
+@dataclass
+class ImportTiming:
+    name: str
+    # including the modules it imported
+    cumulative_ms: float
+    self_ms: float
+
+
+class StartupProfile:
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._imports: Dict[str, ImportTiming] = {}
+        self._phases: List[Tuple[str, float]] = []
+        # time spent in nested imports, per import in progress
+        self._nested: List[float] = []
+        self._original_import = None
+
+    def install(self):
+        # Times every module the first time it's imported. importlib.import_module calls bypass __import__
+        # and are only counted as part of the importing module.
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import is not None and builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level:
+            try:
+                module = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                pass
+        if module in sys.modules or module in self._imports:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self._imports[module] = ImportTiming(module, elapsed * 1000, (elapsed - nested) * 1000)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases.append((name, (time.perf_counter() - start) * 1000))
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def report(self, budget_ms: Optional[float] = None, top: int = 15) -> str:
+        total = self.elapsed_ms
+        lines = [f"Startup took {total:.0f} ms"]
+        if budget_ms is not None:
+            lines[0] += f", {total - budget_ms:.0f} ms over the {budget_ms:.0f} ms budget" if total > budget_ms \
+                else f", within the {budget_ms:.0f} ms budget"
+        for name, elapsed in self._phases:
+            lines.append(f"  {elapsed:8.1f} ms  {name}")
+        lines.append(f"Slowest of {len(self._imports)} imports (self, cumulative):")
+        for timing in sorted(self._imports.values(), key=lambda timing: timing.self_ms, reverse=True)[:top]:
+            lines.append(f"  {timing.self_ms:8.1f} ms {timing.cumulative_ms:8.1f} ms  {timing.name}")
+        return '\n'.join(lines)
+
+
+_profile: Optional[StartupProfile] = None
+
+
+def start_profile() -> StartupProfile:
+    global _profile
+    _profile = StartupProfile()
+    _profile.install()
+    return _profile
+
+
+def stop_profile() -> Optional[StartupProfile]:
+    global _profile
+    profile, _profile = _profile, None
+    if profile is not None:
+        profile.uninstall()
+    return profile
+
+
+@contextmanager
+def startup_phase(name: str):
+    # no-op unless the profile was started
+    if _profile is None:
+        yield
+        return
+    with _profile.phase(name):
+        yield
@@ -1,11 +1,11 @@
-import openai
-
 from src.config import OPENAI_EXPANDER_MODEL, OPENAI_SYSTEM_EXPANDER_PROMPT
 
 
 def expand_musical_description(input_text: str, max_tokens: int = 500):
     if not input_text:
         return []
+    # openai takes long to import, it's only needed once a description is expanded
+    import openai
     return (chunk.choices[0].delta.content or "" for chunk in openai.chat.completions.create(
         model=OPENAI_EXPANDER_MODEL,
         messages=[
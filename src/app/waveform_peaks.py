@@ -0,0 +1,156 @@
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from src.app.audio_decoding import DecodedAudio, decode_audio
+from src.app.file_system_utils import atomic_write
+from src.config import WAVEFORM_BLOCK_FRAMES, WAVEFORM_MEMORY_ENTRIES
+
+# bumped when the cached files change
+_CACHE_VERSION = 1
+# coarsest level kept, in peaks
+_MIN_LEVEL_PEAKS = 64
+
+
+@dataclass
+class PeakPyramid:
+    sample_rate: int
+    frames: int
+    # frames per peak of the finest level, each next level doubles it
+    block_frames: int
+    # (peaks, 2) int16 arrays of min and max over all channels, finest first
+    levels: List[np.ndarray]
+
+    @property
+    def duration(self) -> int:
+        return self.frames * 1000 // self.sample_rate
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def level_for(self, frames_per_column: float) -> int:
+        # The coarsest level that still has a peak for every column
+        if frames_per_column <= self.block_frames:
+            return 0
+        return min(len(self.levels) - 1, int(math.log2(frames_per_column / self.block_frames)))
+
+    def columns(self, start: int, end: int, width: int) -> np.ndarray:
+        # (width, 2) min and max of the audio between start and end ms, a column each
+        result = np.zeros((width, 2), dtype=np.int16)
+        if width <= 0 or end <= start:
+            return result
+        level = self.level_for((end - start) * self.sample_rate / 1000 / width)
+        peaks = self.levels[level]
+        peaks_per_ms = self.sample_rate / 1000 / (self.block_frames << level)
+        bounds = (start + np.arange(width + 1) * ((end - start) / width)) * peaks_per_ms
+        # zoomed in past the finest level neighbouring columns share a peak, past the end they stay empty
+        firsts = bounds[:-1].astype(np.int64)
+        covered = int(np.searchsorted(firsts, len(peaks)))
+        if not covered:
+            return result
+        firsts = firsts[:covered]
+        stop = max(int(firsts[-1]) + 1, min(len(peaks), math.ceil(bounds[covered])))
+        result[:covered, 0] = np.minimum.reduceat(peaks[:stop, 0], firsts)
+        result[:covered, 1] = np.maximum.reduceat(peaks[:stop, 1], firsts)
+        return result
+
+
+def compute_peaks(audio: DecodedAudio, block_frames: int = WAVEFORM_BLOCK_FRAMES) -> PeakPyramid:
+    samples = audio.samples
+    blocks = -(-audio.frames // block_frames)
+    finest = np.zeros((blocks, 2), dtype=np.int16)
+    whole = audio.frames // block_frames
+    if whole:
+        body = samples[:whole * block_frames].reshape(whole, block_frames * audio.channels)
+        finest[:whole, 0] = body.min(axis=1)
+        finest[:whole, 1] = body.max(axis=1)
+    if blocks > whole:
+        tail = samples[whole * block_frames:]
+        finest[whole] = tail.min(), tail.max()
+
+    levels = [finest]
+    while len(levels[-1]) > _MIN_LEVEL_PEAKS:
+        level = levels[-1]
+        if len(level) % 2:
+            level = np.concatenate((level, level[-1:]))
+        levels.append(np.stack((np.minimum(level[0::2, 0], level[1::2, 0]),
+                                np.maximum(level[0::2, 1], level[1::2, 1])), axis=1))
+    return PeakPyramid(audio.sample_rate, audio.frames, block_frames, levels)
+
+
+class PeakCache:
+    # Peak pyramids by content hash, files under directory and the most recent ones in memory as well.
+    # Shared by the GUI thread and workers.
+    def __init__(self, directory: Path, memory_entries: int = WAVEFORM_MEMORY_ENTRIES):
+        self._directory = directory / f'v{_CACHE_VERSION}'
+        self._memory_entries = memory_entries
+        self._recent: OrderedDict[str, PeakPyramid] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, content_hash: str) -> Optional[PeakPyramid]:
+        # Only from memory, cheap enough for the GUI thread
+        with self._lock:
+            pyramid = self._recent.get(content_hash)
+            if pyramid is not None:
+                self._recent.move_to_end(content_hash)
+            return pyramid
+
+    def find(self, content_hash: str) -> Optional[PeakPyramid]:
+        # From memory or the cache file
+        pyramid = self.cached(content_hash)
+        if pyramid is None:
+            pyramid = self._read(content_hash)
+            if pyramid is not None:
+                self._remember(content_hash, pyramid)
+        return pyramid
+
+    def add(self, content_hash: str, audio: DecodedAudio) -> PeakPyramid:
+        pyramid = compute_peaks(audio)
+        self._write(content_hash, pyramid)
+        self._remember(content_hash, pyramid)
+        return pyramid
+
+    def load(self, content_hash: str, path: Path) -> PeakPyramid:
+        # Decodes path when not cached, raises IOError when it can't be decoded
+        pyramid = self.find(content_hash)
+        if pyramid is None:
+            pyramid = self.add(content_hash, decode_audio(path))
+        return pyramid
+
+    def _remember(self, content_hash: str, pyramid: PeakPyramid):
+        with self._lock:
+            self._recent[content_hash] = pyramid
+            self._recent.move_to_end(content_hash)
+            while len(self._recent) > self._memory_entries:
+                self._recent.popitem(last=False)
+
+    def _file(self, content_hash: str) -> Path:
+        return self._directory / content_hash[:2] / f'{content_hash}.npz'
+
+    def _read(self, content_hash: str) -> Optional[PeakPyramid]:
+        try:
+            with np.load(self._file(content_hash)) as file:
+                sample_rate, frames, block_frames, level_count = file['meta'].tolist()
+                return PeakPyramid(sample_rate, frames, block_frames,
+                                   [file[f'level_{level}'] for level in range(level_count)])
+        except (OSError, ValueError, KeyError):
+            # missing, or left broken by an older version
+            return None
+
+    def _write(self, content_hash: str, pyramid: PeakPyramid):
+        path = self._file(content_hash)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            meta = np.array([pyramid.sample_rate, pyramid.frames, pyramid.block_frames, len(pyramid.levels)],
+                            dtype=np.int64)
+            with atomic_write(path) as file:
+                np.savez(file, meta=meta, **{f'level_{level}': peaks for level, peaks in enumerate(pyramid.levels)})
+        except OSError:
+            # the cache is only an optimization
+            pass
@@ -0,0 +1,190 @@
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, Optional
+
+# Headless entry point, nothing here may import Qt:
+#   python -m src.cli stats project.mmp
+from src.app.clip_export import ClipExportSettings, ClipExportProgress, export_clips, clip_sources
+from src.app.dataset_scan import ScanProgress
+from src.app.file_system_utils import atomic_write
+from src.app.markup_export import ExportFormat
+from src.app.project import Project
+from src.app.project_merge import merge_projects, MergeReport
+from src.config import SCAN_BATCH_INTERVAL_S, CLIP_EXPORT_WORKERS
+
+
+def _report(text: str):
+    print(text, file=sys.stderr, flush=True)
+
+
+def _scan(project: Project, full_verify: bool, quiet: bool):
+    data = project.markup_data
+    data.begin_scan()
+    progress = ScanProgress(data.known_file_count)
+    last_reported = time.monotonic()
+    try:
+        for scanned in data.scan(full_verify):
+            progress.record(scanned)
+            data.apply_scanned((scanned,))
+            if not quiet and time.monotonic() - last_reported >= SCAN_BATCH_INTERVAL_S:
+                _report(f"{progress.files_seen} files seen, {progress.files_hashed} hashed, "
+                        f"{progress.bytes_per_second / 1024 / 1024:.1f} MB/s")
+                last_reported = time.monotonic()
+    except BaseException:
+        data.abort_scan()
+        raise
+    data.finish_scan()
+    progress.finished = True
+    _report(f"Scanned {progress.files_seen} files, hashed {progress.files_hashed} in {progress.elapsed:.1f}s.")
+
+
+def _rescan(args) -> int:
+    project = Project.load(args.project, rescan=False, read_only=args.dry_run)
+    try:
+        _scan(project, args.command == 'verify', args.quiet)
+        statistics = project.markup_data.statistics()
+        _report(f"{statistics.entries} entries, {statistics.corrupted_entries} corrupted.")
+        if not args.dry_run and project.is_dirty:
+            project.save(args.project)
+    finally:
+        project.close()
+    return 0
+
+
+def _stats(args) -> int:
+    project = Project.load(args.project, rescan=False, read_only=True)
+    try:
+        statistics = asdict(project.markup_data.statistics())
+    finally:
+        project.close()
+    statistics = {'name': project.name, **statistics}
+    if args.json:
+        print(json.dumps(statistics, ensure_ascii=False, indent=2))
+    else:
+        for key, value in statistics.items():
+            print(f"{key.replace('_', ' ')}: {value}")
+    return 0
+
+
+def _export(args) -> int:
+    project = Project.load(args.project, rescan=False, read_only=True)
+    try:
+        columns = args.columns.split(',') if args.columns else None
+        count = project.export_markup(args.output, args.format, columns, args.compression)
+    finally:
+        project.close()
+    _report(f"Exported {count} labels to {args.output}.")
+    return 0
+
+
+def _clips(args) -> int:
+    project = Project.load(args.project, rescan=False, read_only=True)
+    settings = ClipExportSettings(
+        sample_rate=args.sample_rate,
+        channels=args.channels,
+        shard_size=args.shard_size * 1024 * 1024 if args.shard_size else None,
+        workers=args.workers
+    )
+
+    def report_progress(progress: ClipExportProgress):
+        if not args.quiet:
+            _report(f"{progress.written} labels cut, {progress.up_to_date} up to date, {progress.failed} failed")
+
+    try:
+        progress = export_clips(clip_sources(project.markup_data), project.markup_data.directory, args.output,
+                                settings, report_progress)
+    finally:
+        project.close()
+    for error in progress.errors:
+        _report(error)
+    _report(f"{progress.written} labels cut into clips, {progress.up_to_date} up to date, {progress.failed} failed.")
+    return 1 if progress.failed else 0
+
+
+def _merge(args) -> int:
+    # merged into a copy when saved elsewhere, the target's journal or database mustn't see the merge
+    output = args.output or args.target
+    target = Project.load(args.target, rescan=False, read_only=output.resolve() != args.target.resolve())
+
+    def report_merged(source_path: Path, report: MergeReport):
+        _report(f"{source_path}: {report.merged_labels} labels merged, {report.duplicate_labels} duplicates, "
+                f"{len(report.conflicts)} conflicts, {report.unknown_labels} labels of {report.unknown_entries} "
+                f"unknown entries left out.")
+
+    try:
+        report = merge_projects(target, args.sources, report_merged)
+        target.save(output)
+    finally:
+        target.close()
+    if args.conflicts is not None:
+        with atomic_write(args.conflicts) as file:
+            for conflict in report.conflicts:
+                record = {'content_hash': conflict.content_hash, 'relative_path': conflict.relative_path.as_posix(),
+                          'source': str(conflict.source), 'label': asdict(conflict.label),
+                          'overlapping': [asdict(value) for value in conflict.overlapping]}
+                file.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+    _report(f"Merged {report.merged_labels} labels, {len(report.conflicts)} of them conflicting.")
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m src.cli', description="Work with MM projects without the GUI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('rescan', "pick up added, moved and removed dataset files"),
+                            ('verify', "rehash every dataset file, ignoring cached fingerprints")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('project', type=Path)
+        command.add_argument('--dry-run', action='store_true', help="don't save the project")
+        command.add_argument('--quiet', action='store_true', help="no progress output")
+        command.set_defaults(handler=_rescan)
+
+    command = commands.add_parser('stats', help="print project statistics")
+    command.add_argument('project', type=Path)
+    command.add_argument('--json', action='store_true')
+    command.set_defaults(handler=_stats)
+
+    command = commands.add_parser('export', help="export the labels as Parquet, Arrow IPC, JSONL or a DataFrame")
+    command.add_argument('project', type=Path)
+    command.add_argument('output', type=Path, help=f"format by suffix: {', '.join(ExportFormat.SUFFIXES)}")
+    command.add_argument('--format', choices=sorted(ExportFormat.COMPRESSIONS))
+    command.add_argument('--columns', help="comma separated columns to export")
+    command.add_argument('--compression')
+    command.set_defaults(handler=_export)
+
+    command = commands.add_parser('clips', help="cut every label into its own audio clip")
+    command.add_argument('project', type=Path)
+    command.add_argument('output', type=Path, help="output directory")
+    command.add_argument('--sample-rate', type=int)
+    command.add_argument('--channels', type=int)
+    command.add_argument('--shard-size', type=int, metavar='MB', help="write tar shards of about this size")
+    command.add_argument('--workers', type=int, default=CLIP_EXPORT_WORKERS)
+    command.add_argument('--quiet', action='store_true', help="no progress output")
+    command.set_defaults(handler=_clips)
+
+    command = commands.add_parser('merge', help="merge the labels of other projects of the same dataset")
+    command.add_argument('target', type=Path)
+    command.add_argument('sources', type=Path, nargs='+')
+    command.add_argument('--output', type=Path, help="save the merged project here instead of over the target")
+    command.add_argument('--conflicts', type=Path, help="write the conflicting labels here as JSONL")
+    command.set_defaults(handler=_merge)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        _report(f"error: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,42 @@
+import os
+
 AUDIO_FILES_PATTERN = ['.mp3', '.wav', '.flac', '.ogg', '.midi', '.mid']
 MIDI_SF_PATH = 'resources/SGM-V2.01.sf2'
 PROJECT_FILE_SUFFIX = '.mmp'
 MARKUP_FILE_SUFFIX = '.mmd'
 SAVE_PROJECT_AS_FILE_FILTER = f"MM Project (*{PROJECT_FILE_SUFFIX});;All Files (*)"
-SAVE_DATAFRAME_AS_FILE_FILTER = f"DataFrame (*{MARKUP_FILE_SUFFIX});;All Files (*)"
+EXPORT_MARKUP_FILE_FILTERS = {
+    "Parquet (*.parquet)": '.parquet',
+    "Arrow IPC (*.arrow)": '.arrow',
+    "JSON Lines (*.jsonl)": '.jsonl',
+    "Compressed JSON Lines (*.jsonl.gz)": '.jsonl.gz',
+    f"DataFrame (*{MARKUP_FILE_SUFFIX})": MARKUP_FILE_SUFFIX,
+}
 OPENAI_EXPANDER_MODEL = 'openchat/openchat-7b'
 OPENAI_SYSTEM_EXPANDER_PROMPT = 'Вы музыкальный продюсер, помогающий разметить музыкальный датасет, вам будут предоставлены маленькие текстовые описания музыкальных фрагментов, вам нужно их расширить (придерживаясь стиля общения и терминологии продюсера).'
 DESCRIPTION_INPUT_PLACEHOLDER = "Спокойная, медленная, начинается с повторяющейся мелодии пианино, затем подключаются струнные, к середине пианино перестаёт быть повторяющимся, начинает играть более широкий спектр нот, поднимаясь то вверх, то вниз, в целом очень спокойная классическая композиция, напоминает Чайковского."
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_HASH_ALGORITHM = 'md5'
+WATCHER_EVENTS_INTERVAL_MS = 1000
+WALK_WORKERS = 4
+SCAN_BATCH_INTERVAL_S = 0.5
+PREFETCH_DEPTH = 3
+PREFETCH_MEMORY_BUDGET_MB = 256
+JOURNAL_FILE_SUFFIX = '.journal'
+JOURNAL_BATCH_SIZE = 16
+JOURNAL_FLUSH_INTERVAL_MS = 2000
+JOURNAL_COMPACTION_RECORDS = 5000
+DATABASE_FILE_SUFFIX = '.db'
+LABEL_BATCH_SIZE = 65536
+PROJECT_SECTION_MIN_BYTES = 64 * 1024
+CLIP_EXPORT_WORKERS = min(8, os.cpu_count() or 1)
+CLIP_SHARD_SIZE_MB = 1024
+STARTUP_PROFILE_ENV = 'MM_STARTUP_PROFILE'
+STARTUP_BUDGET_MS = 1000
+APP_THEME = 'dark_purple.xml'
+WAVEFORM_BLOCK_FRAMES = 256
+WAVEFORM_MEMORY_ENTRIES = 32
+WAVEFORM_HEIGHT = 48
+PCM_CACHE_BUDGET_MB = 512
+PCM_CACHE_SPILL_BUDGET_MB = 4096
@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import Callable, Optional
 
-from PySide6.QtCore import Signal, QUrl, Qt, Slot
+from PySide6.QtCore import Signal, QUrl, Qt, Slot, QBuffer, QByteArray, QIODevice
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton, QStyle, QLabel, QSlider, QVBoxLayout
 
@@ -20,6 +20,11 @@ class AudioPlayer(QWidget):
         self._time_label_mapper = time_label_mapper
         self._player: Optional[QMediaPlayer] = None
         self._audio_output: Optional[QAudioOutput] = None
+        # opened ahead of time for the entry that is most likely to come next
+        self._preloaded_player: Optional[QMediaPlayer] = None
+        self._preloaded_path: Optional[Path] = None
+        # in-memory source of the current player
+        self._source_buffer: Optional[QBuffer] = None
 
         # Layout
         layout = QHBoxLayout(self)
@@ -81,13 +86,53 @@ class AudioPlayer(QWidget):
             self._player.stop()
         self._player = None
         self._audio_output = None
+        self._source_buffer = None
+
+    def discard_preloaded(self):
+        self.preload(None)
         # Can't find an appropriate way to clean up, so I won't
 
     def open_from_file(self, path: Path):
         self.discard()
+        if self._preloaded_player is not None and self._preloaded_path == path:
+            player, self._preloaded_player, self._preloaded_path = self._preloaded_player, None, None
+            self._reinit_player(player)
+            # Its loading signals went off before anything was connected to them
+            self._update_slider_duration(player.duration())
+            self._hide_show_timestamps(player.hasAudio())
+            self._enable_controls(player.hasAudio())
+            self.durationChanged.emit(player.duration())
+            self.mediaStatusChanged.emit(player.mediaStatus())
+            return
         self._reinit_player()
         self._player.setSource(QUrl.fromLocalFile(path))
 
+    def open_from_wav(self, wav):
+        # Plays a WAV file held in memory, any bytes-like buffer. It's copied straight into the QByteArray,
+        # which doesn't take a buffer object itself.
+        self.discard()
+        self._reinit_player()
+        view = memoryview(wav).cast('B')
+        data = QByteArray()
+        data.resize(len(view))
+        memoryview(data)[:] = view
+        self._source_buffer = QBuffer(self._player)
+        self._source_buffer.setData(data)
+        self._source_buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        self._player.setSourceDevice(self._source_buffer, QUrl('memory.wav'))
+
+    def preload(self, path: Optional[Path]):
+        if path == self._preloaded_path:
+            return
+        if self._preloaded_player is not None:
+            self._preloaded_player.setSource(QUrl())
+            self._preloaded_player.deleteLater()
+        self._preloaded_player = None
+        self._preloaded_path = path
+        if path is not None:
+            self._preloaded_player = QMediaPlayer(self)
+            self._preloaded_player.setSource(QUrl.fromLocalFile(path))
+
     @Slot(float)
     def set_volume(self, volume: float):
         self._audio_output.setVolume(volume)
@@ -161,14 +206,14 @@ class AudioPlayer(QWidget):
         self._forward_button.setEnabled(enable)
         self._playback_slider.setEnabled(enable)
 
-    def _reinit_player(self):
+    def _reinit_player(self, player: Optional[QMediaPlayer] = None):
         # Maybe this is how It's supposed to work?
         self._playback_slider.setValue(0)
         self._hide_show_timestamps(False)
         self._enable_controls(False)
         self._update_play_pause_to_play()
 
-        self._player = QMediaPlayer(self)
+        self._player = player or QMediaPlayer(self)
         volume = self._audio_output.volume() if self._audio_output else self._DEFAULT_VOLUME
         self._audio_output = QAudioOutput(self._player)
         self._player.setAudioOutput(self._audio_output)
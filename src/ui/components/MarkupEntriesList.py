@@ -1,10 +1,11 @@
-from typing import Iterable
+from typing import Optional
 
 from PySide6.QtCore import Signal
-from PySide6.QtGui import Qt
+from PySide6.QtGui import Qt, QIcon
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QListWidget, QListWidgetItem, QStyle
 
 from src.app.markup_data import MarkupView
+from src.app.markup_iterator import MarkupIterator, IterationViewChange
 
 
 class MarkupEntriesWidget(QWidget):
@@ -12,6 +13,8 @@ class MarkupEntriesWidget(QWidget):
 
     def __init__(self, parent: QWidget = None):
         super().__init__(parent)
+        # rows mirror the iterator's view, so its positions index this list as well
+        self._iterator: Optional[MarkupIterator] = None
 
         _layout = QVBoxLayout(self)
         self._list_widget = QListWidget(self)
@@ -19,24 +22,56 @@ class MarkupEntriesWidget(QWidget):
         _layout.addWidget(self._list_widget)
 
     def _handle_item_click(self, item: QListWidgetItem):
-        md5 = item.data(Qt.ItemDataRole.UserRole)
-        self.itemSelected.emit(md5)
+        content_hash = item.data(Qt.ItemDataRole.UserRole)
+        self.itemSelected.emit(content_hash)
 
-    def set_entries(self, entries: Iterable[MarkupView]):
+    def bind(self, iterator: MarkupIterator):
+        self.unbind()
+        self._iterator = iterator
+        self._iterator.add_listener(self._view_changed)
+        self._reset()
+
+    def unbind(self):
+        if self._iterator is not None:
+            self._iterator.remove_listener(self._view_changed)
+        self._iterator = None
+        self._list_widget.clear()
+
+    def _view_changed(self, change: IterationViewChange):
+        if change.kind == IterationViewChange.Kind.RESET:
+            self._reset()
+        elif change.kind == IterationViewChange.Kind.INSERTED:
+            self._list_widget.insertItem(change.index, self._create_item(change.view))
+        elif change.kind == IterationViewChange.Kind.REMOVED:
+            self._list_widget.takeItem(change.index)
+        elif change.kind == IterationViewChange.Kind.UPDATED:
+            self._update_item(self._list_widget.item(change.index), change.view)
+
+    def _reset(self):
         self._list_widget.clear()
-        for view in entries:
-            item = QListWidgetItem(self._entry_to_label(view), self._list_widget)
-            item.setData(Qt.ItemDataRole.UserRole, view.md5)
-            if view.entry.entry_info.is_corrupted:
-                item.setIcon(self.style().standardPixmap(QStyle.StandardPixmap.SP_MessageBoxCritical))
+        for view in self._iterator.list():
+            self._list_widget.addItem(self._create_item(view))
+
+    def _create_item(self, view: MarkupView) -> QListWidgetItem:
+        item = QListWidgetItem()
+        item.setData(Qt.ItemDataRole.UserRole, view.content_hash)
+        self._update_item(item, view)
+        return item
+
+    def _update_item(self, item: QListWidgetItem, view: MarkupView):
+        item.setText(self._entry_to_label(view))
+        if view.entry.entry_info.is_corrupted:
+            item.setIcon(self.style().standardPixmap(QStyle.StandardPixmap.SP_MessageBoxCritical))
+        else:
+            item.setIcon(QIcon())
 
     def scroll_to(self, entry: MarkupView):
-        items = self._list_widget.findItems(self._entry_to_label(entry), Qt.MatchFlag.MatchExactly)
-        if len(items) == 1:
-            item = items[0]
+        row = self._iterator.index_of(entry.content_hash) if self._iterator is not None else None
+        if row is not None:
+            item = self._list_widget.item(row)
             self._list_widget.setCurrentItem(item)
             self._list_widget.scrollToItem(item)
 
     @staticmethod
     def _entry_to_label(view: MarkupView):
-        return f'{str(view.entry.entry_info.relative_path)} --- Labels: {len(view.entry.values)}'
+        return f'{str(view.entry.entry_info.relative_path)} --- Labels: {view.entry.label_count}'
@@ -1,10 +1,13 @@
-from typing import Callable
+from typing import Callable, Optional, List
 
-from PySide6.QtCore import QRect, QSize, Signal
-from PySide6.QtGui import Qt, QPaintEvent, QPainter, QBrush, QPalette, QMouseEvent, QFontMetrics
+from PySide6.QtCore import QRect, QSize, Signal, QLineF
+from PySide6.QtGui import Qt, QPaintEvent, QPainter, QBrush, QPalette, QMouseEvent, QFontMetrics, QPen
 from PySide6.QtWidgets import QWidget, QStyleOptionSlider, QSizePolicy, QStyle, QVBoxLayout, QLabel, \
     QHBoxLayout, QToolTip
 
+from src.app.waveform_peaks import PeakPyramid
+from src.config import WAVEFORM_HEIGHT
+
 
 class RangeSlider(QWidget):
     first_value_changed = Signal(int)
@@ -23,6 +26,10 @@ class RangeSlider(QWidget):
         self._first_position = 0
         self._second_position = 0
         self._min_range = 0
+        self._waveform: Optional[PeakPyramid] = None
+        # lines of the last drawn waveform, and what they were drawn for
+        self._waveform_lines: List[QLineF] = []
+        self._waveform_key = None
 
         self.opt = QStyleOptionSlider()
         self.opt.minimum = 0
@@ -70,6 +77,15 @@ class RangeSlider(QWidget):
     def set_readonly(self, readonly: bool):
         self._readonly = readonly
 
+    def set_waveform(self, waveform: Optional[PeakPyramid]):
+        # Drawn behind the groove between the range limits
+        if waveform is self._waveform:
+            return
+        self._waveform = waveform
+        self._waveform_key = None
+        self.updateGeometry()
+        self.update()
+
     def paintEvent(self, event: QPaintEvent):
         painter = QPainter(self)
         # TODO: idk why is the style is just not here
@@ -80,6 +96,13 @@ class RangeSlider(QWidget):
         self.opt.sliderPosition = 0
         self.opt.subControls = QStyle.SubControl.SC_SliderGroove | QStyle.SubControl.SC_SliderTickmarks
 
+        # Draw WAVEFORM
+        if self._waveform is not None and self.opt.maximum > self.opt.minimum:
+            color = self.palette().color(QPalette.WindowText)
+            color.setAlpha(110)
+            painter.setPen(QPen(color, 1))
+            painter.drawLines(self._get_waveform_lines())
+
         # Draw GROOVE
         self.style().drawComplexControl(QStyle.ComplexControl.CC_Slider, self.opt, painter)
 
@@ -134,6 +157,8 @@ class RangeSlider(QWidget):
 
         w = slider_length
         h = self.style().pixelMetric(QStyle.PixelMetric.PM_SliderThickness, self.opt, self)
+        if self._waveform is not None:
+            h = max(h, WAVEFORM_HEIGHT)
 
         return self.style().sizeFromContents(QStyle.ContentsType.CT_Slider, self.opt, QSize(w, h), self)
 
@@ -163,6 +188,32 @@ class RangeSlider(QWidget):
             groove_rect.height(),
         ).adjusted(-1, 1, 1, -1)
 
+    def _get_waveform_lines(self) -> List[QLineF]:
+        # A vertical line per pixel between the handle centers at the range limits,
+        # the pyramid level follows the zoom
+        position = self.opt.sliderPosition
+        self.opt.sliderPosition = self.opt.minimum
+        left = self.style().subControlRect(
+            QStyle.ComplexControl.CC_Slider, self.opt, QStyle.SubControl.SC_SliderHandle
+        ).center().x()
+        self.opt.sliderPosition = self.opt.maximum
+        right = self.style().subControlRect(
+            QStyle.ComplexControl.CC_Slider, self.opt, QStyle.SubControl.SC_SliderHandle
+        ).center().x()
+        self.opt.sliderPosition = position
+
+        key = (left, right, self.height(), self.opt.minimum, self.opt.maximum)
+        if key != self._waveform_key:
+            self._waveform_key = key
+            columns = self._waveform.columns(self.opt.minimum, self.opt.maximum, max(0, right - left))
+            middle = self.height() / 2
+            scale = (self.height() / 2 - 1) / 32768
+            self._waveform_lines = [
+                QLineF(left + x + 0.5, middle - int(high) * scale, left + x + 0.5, middle - int(low) * scale)
+                for x, (low, high) in enumerate(columns.tolist()) if low or high
+            ]
+        return self._waveform_lines
+
     def _show_tooltip(self):
         pos = self._get_selection().center()
 
@@ -221,6 +272,9 @@ class LabeledRangeSlider(QWidget):
     def set_readonly(self, readonly: bool):
         self._slider.set_readonly(readonly)
 
+    def set_waveform(self, waveform: Optional[PeakPyramid]):
+        self._slider.set_waveform(waveform)
+
     def set_min_border_visible(self, visible: bool):
         self._min_label.setVisible(visible)
 
@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PySide6.QtWidgets import QWidget, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout, \
+    QFileDialog, QComboBox, QSpinBox
+
+from src.app.clip_export import ClipExportSettings
+from src.app.form_validation import show_error_message, validate_required_field
+from src.config import CLIP_SHARD_SIZE_MB
+
+
+class ClipExportDialog(QDialog):
+    def __init__(self, parent: Optional[QWidget]):
+        super().__init__(parent)
+        self.setWindowTitle("Export Clips")
+
+        # Window size
+        self.setMinimumWidth(500)
+
+        # Layout
+        layout = QVBoxLayout(self)
+
+        # Output directory
+        layout.addWidget(QLabel("Output Directory:", self))
+        self._output_directory_line_edit = QLineEdit(self)
+        browse_button = QPushButton("Browse", self)
+        browse_button.clicked.connect(self._browse_output_directory)
+
+        output_directory_input_layout = QHBoxLayout()
+        output_directory_input_layout.addWidget(self._output_directory_line_edit)
+        output_directory_input_layout.addWidget(browse_button)
+        layout.addLayout(output_directory_input_layout)
+
+        # Sample rate
+        layout.addWidget(QLabel("Sample Rate:", self))
+        self._sample_rate_combobox = QComboBox(self)
+        self._sample_rate_combobox.addItem("Original", None)
+        for sample_rate in (16000, 22050, 24000, 32000, 44100, 48000):
+            self._sample_rate_combobox.addItem(f"{sample_rate} Hz", sample_rate)
+        layout.addWidget(self._sample_rate_combobox)
+
+        # Channels
+        layout.addWidget(QLabel("Channels:", self))
+        self._channels_combobox = QComboBox(self)
+        self._channels_combobox.addItem("Original", None)
+        self._channels_combobox.addItem("Mono", 1)
+        self._channels_combobox.addItem("Stereo", 2)
+        layout.addWidget(self._channels_combobox)
+
+        # Output layout
+        layout.addWidget(QLabel("Layout:", self))
+        self._layout_combobox = QComboBox(self)
+        self._layout_combobox.addItem("Directory tree", False)
+        self._layout_combobox.addItem("Tar shards", True)
+        self._layout_combobox.currentIndexChanged.connect(self._layout_changed)
+        layout.addWidget(self._layout_combobox)
+
+        self._shard_size_spinbox = QSpinBox(self)
+        self._shard_size_spinbox.setRange(16, 64 * 1024)
+        self._shard_size_spinbox.setSuffix(" MB per shard")
+        self._shard_size_spinbox.setValue(CLIP_SHARD_SIZE_MB)
+        self._shard_size_spinbox.setEnabled(False)
+        layout.addWidget(self._shard_size_spinbox)
+
+        # Buttons
+        button_layout = QHBoxLayout()
+
+        export_button = QPushButton("Export", self)
+        export_button.clicked.connect(self._export)
+        button_layout.addWidget(export_button)
+
+        cancel_button = QPushButton("Cancel", self)
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_button)
+
+        layout.addLayout(button_layout)
+
+    def show_dialog(self) -> Optional[Tuple[Path, ClipExportSettings]]:
+        if self.exec() != QDialog.DialogCode.Accepted:
+            return None
+        shard_size = self._shard_size_spinbox.value() * 1024 * 1024 if self._layout_combobox.currentData() else None
+        settings = ClipExportSettings(
+            sample_rate=self._sample_rate_combobox.currentData(),
+            channels=self._channels_combobox.currentData(),
+            shard_size=shard_size
+        )
+        return Path(self._output_directory_line_edit.text()), settings
+
+    def _layout_changed(self):
+        self._shard_size_spinbox.setEnabled(bool(self._layout_combobox.currentData()))
+
+    def _browse_output_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Select Output Directory")
+        if directory:
+            self._output_directory_line_edit.setText(directory)
+
+    def _export(self):
+        errors = dict(filter(None, [
+            validate_required_field(self._output_directory_line_edit.text(), "Output directory")
+        ]))
+        if errors:
+            show_error_message(errors, self)
+            return
+        self.accept()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 from PySide6.QtWidgets import QDialog, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout, QFileDialog, \
     QMessageBox
@@ -7,7 +7,9 @@ from PySide6.QtWidgets import QDialog, QWidget, QVBoxLayout, QLabel, QLineEdit,
 from src.app.form_validation import show_error_message, validate_required_file
 from src.app.project import Project
 from src.config import PROJECT_FILE_SUFFIX
-from src.ui.pages.ProjectPage import ProjectPage
+
+if TYPE_CHECKING:
+    from src.ui.pages.ProjectPage import ProjectPage
 
 
 class OpenExistingProjectDialog(QDialog):
@@ -51,9 +53,10 @@ class OpenExistingProjectDialog(QDialog):
 
         layout.addLayout(button_layout)
 
-    def show_dialog(self) -> Optional[ProjectPage.OnEntryData]:
+    def show_dialog(self) -> Optional['ProjectPage.OnEntryData']:
         dialog_result = self.exec()
         if dialog_result == QDialog.DialogCode.Accepted:
+            from src.ui.pages.ProjectPage import ProjectPage
             return ProjectPage.OnEntryData(self._project, self._path)
         return None
 
@@ -75,7 +78,7 @@ class OpenExistingProjectDialog(QDialog):
 
         try:
             self._path = Path(self._project_file_line_edit.text())
-            self._project = Project.load(self._path)
+            self._project = Project.load(self._path, rescan=False)
             self.accept()
         except Exception as e:
             QMessageBox.critical(
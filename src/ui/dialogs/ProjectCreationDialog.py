@@ -1,12 +1,14 @@
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 from PySide6.QtWidgets import QWidget, QDialog, QMessageBox, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout, \
-    QFileDialog, QTextEdit
+    QFileDialog, QTextEdit, QComboBox
 
 from src.app.form_validation import validate_required_field, show_error_message, validate_required_directory
 from src.app.project import Project
-from src.ui.pages.ProjectPage import ProjectPage
+
+if TYPE_CHECKING:
+    from src.ui.pages.ProjectPage import ProjectPage
 
 
 class ProjectCreationDialog(QDialog):
@@ -44,6 +46,13 @@ class ProjectCreationDialog(QDialog):
         dataset_directory_input_layout.addWidget(browse_button)
         layout.addLayout(dataset_directory_input_layout)
 
+        # Storage
+        layout.addWidget(QLabel("Storage:", self))
+        self._storage_combobox = QComboBox(self)
+        self._storage_combobox.addItem("Project file", Project.Storage.FILE)
+        self._storage_combobox.addItem("SQLite database (large datasets)", Project.Storage.DATABASE)
+        layout.addWidget(self._storage_combobox)
+
         # Buttons
         button_layout = QHBoxLayout()
 
@@ -60,6 +69,7 @@ class ProjectCreationDialog(QDialog):
     def show_dialog(self):
         dialog_result = self.exec()
         if dialog_result == QDialog.DialogCode.Accepted:
+            from src.ui.pages.ProjectPage import ProjectPage
             return ProjectPage.OnEntryData(self._project)
         return None
 
@@ -79,6 +89,8 @@ class ProjectCreationDialog(QDialog):
                 self._name_line_edit.text(),
                 self._description_text_edit.toPlainText(),
                 Path(self._dataset_directory_line_edit.text()),
+                scan=False,
+                storage=self._storage_combobox.currentData()
             )
             self.accept()
         except Exception as e:
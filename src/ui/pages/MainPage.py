@@ -4,7 +4,7 @@ from PySide6.QtWidgets import QVBoxLayout, QPushButton, QApplication
 
 from src.ui.dialogs.OpenExistingProjectDialog import OpenExistingProjectDialog
 from src.ui.dialogs.ProjectCreationDialog import ProjectCreationDialog
-from src.ui.pages.ProjectPage import WindowPage
+from src.ui.pages.WindowPage import WindowPage
 
 
 class MainPage(WindowPage):
@@ -1,24 +1,40 @@
+import tempfile
+import time
+from copy import copy
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Type
+from typing import Optional, Type, List, Tuple, Callable
 
-from PySide6.QtCore import Signal, QThreadPool, QRunnable, Slot, QObject, Qt
+from PySide6.QtCore import Signal, QThreadPool, QRunnable, Slot, QObject, Qt, QTimer, QStandardPaths
 from PySide6.QtMultimedia import QMediaPlayer
 from PySide6.QtWidgets import QMessageBox, QWidget, QVBoxLayout, QPushButton, QTabWidget, QScrollArea, \
-    QLabel, QLineEdit, QTextEdit, QHBoxLayout, QFormLayout, QComboBox, QFileDialog, QGroupBox, QPlainTextEdit
-
+    QLabel, QLineEdit, QTextEdit, QHBoxLayout, QFormLayout, QComboBox, QFileDialog, QGroupBox, QPlainTextEdit, \
+    QCheckBox, QSpinBox
+
+from src.app.audio_decoding import probe_duration, decode_audio, DecodedAudio
+from src.app.clip_export import ClipExportProgress, ClipExportSettings, ClipSource, ClipExportCancelled, \
+    export_clips, clip_sources
+from src.app.content_hashing import available_algorithms
+from src.app.dataset_scan import ScanProgress
+from src.app.dataset_watcher import DatasetWatcher, DatasetEvent, create_watcher
+from src.app.file_system_utils import warm_page_cache
 from src.app.form_validation import show_error_message, validate_required_field
-from src.app.markup_data import MarkupValue
+from src.app.markup_data import MarkupValue, MarkupData
 from src.app.markup_iterator import MarkupIterator
+from src.app.markup_query import QueryError
 from src.app.markup_settings import IterationSettings, SettingsEnum
-from src.app.project import Project
+from src.app.pcm_cache import PcmCache
+from src.app.project import Project, ProjectSnapshot
 from src.app.text_expansion import expand_musical_description
-from src.config import SAVE_PROJECT_AS_FILE_FILTER, SAVE_DATAFRAME_AS_FILE_FILTER, DESCRIPTION_INPUT_PLACEHOLDER
+from src.app.waveform_peaks import PeakCache, PeakPyramid
+from src.config import SAVE_PROJECT_AS_FILE_FILTER, EXPORT_MARKUP_FILE_FILTERS, DESCRIPTION_INPUT_PLACEHOLDER, \
+    WATCHER_EVENTS_INTERVAL_MS, SCAN_BATCH_INTERVAL_S, JOURNAL_FLUSH_INTERVAL_MS
 from src.ui.components.AudioPlayer import AudioPlayer
 from src.ui.components.MarkupContainer import MarkupContainerWidget
 from src.ui.components.MarkupEntriesList import MarkupEntriesWidget
 from src.ui.components.MediaIndicator import MediaIndicator
 from src.ui.components.RangeSlider import LabeledRangeSlider
+from src.ui.dialogs.ClipExportDialog import ClipExportDialog
 from src.ui.pages.WindowPage import WindowPage
 
 
@@ -67,6 +83,233 @@ class ProjectPage(WindowPage):
                 print(e)
                 self.signals.status_signal.emit(self.GenerationStage.FAIL)
 
+    class DatasetScanTask(QRunnable):
+        class Signals(QObject):
+            # (List[ScannedEntry], ScanProgress)
+            batch_signal = Signal(object)
+            finished_signal = Signal(object)
+            failed_signal = Signal(str)
+
+        def __init__(self, markup_data: MarkupData, full_verify: bool = False):
+            super().__init__()
+            self._markup_data = markup_data
+            self._full_verify = full_verify
+            self._proceed = True
+            self.signals = self.Signals()
+
+        def cancel(self):
+            self._proceed = False
+
+        @Slot()
+        def run(self):
+            progress = ScanProgress(self._markup_data.known_file_count)
+            batch = []
+            last_emitted = time.monotonic()
+            try:
+                for scanned in self._markup_data.scan(self._full_verify):
+                    if not self._proceed:
+                        return
+                    progress.record(scanned)
+                    batch.append(scanned)
+                    if time.monotonic() - last_emitted >= SCAN_BATCH_INTERVAL_S:
+                        self.signals.batch_signal.emit((batch, copy(progress)))
+                        batch = []
+                        last_emitted = time.monotonic()
+                progress.finished = True
+                self.signals.batch_signal.emit((batch, copy(progress)))
+                self.signals.finished_signal.emit(progress)
+            except Exception as e:
+                self.signals.failed_signal.emit(str(e))
+
+    class DatasetEventsTask(QRunnable):
+        # Hashes the files behind a batch of watcher events, the batch is applied on the GUI thread
+        class Signals(QObject):
+            # (List[DatasetEvent], Dict[Path, Tuple[FileFingerprint, str]])
+            hashed_signal = Signal(object)
+            failed_signal = Signal(str)
+
+        def __init__(self, markup_data: MarkupData, events: List[DatasetEvent]):
+            super().__init__()
+            self._markup_data = markup_data
+            self._events = events
+            self._proceed = True
+            self.signals = self.Signals()
+
+        def cancel(self):
+            self._proceed = False
+
+        @Slot()
+        def run(self):
+            try:
+                hashed = self._markup_data.hash_event_files(self._events)
+                if self._proceed:
+                    self.signals.hashed_signal.emit((self._events, hashed))
+            except Exception as e:
+                self.signals.failed_signal.emit(str(e))
+
+    class HashMigrationTask(QRunnable):
+        class Signals(QObject):
+            # (entries rehashed, entry count)
+            progress_signal = Signal(int, int)
+            # (algorithm, List[RehashedEntry])
+            finished_signal = Signal(object)
+            failed_signal = Signal(str)
+
+        def __init__(self, markup_data: MarkupData, algorithm: str):
+            super().__init__()
+            self._markup_data = markup_data
+            self._algorithm = algorithm
+            # the store stays on the GUI thread, only its paths go to the worker
+            self._sources = markup_data.migration_sources()
+            self._proceed = True
+            self.signals = self.Signals()
+
+        def cancel(self):
+            self._proceed = False
+
+        @Slot()
+        def run(self):
+            rehashed = []
+            last_emitted = time.monotonic()
+            try:
+                for entry in self._markup_data.rehash(self._sources, self._algorithm):
+                    if not self._proceed:
+                        return
+                    rehashed.append(entry)
+                    if time.monotonic() - last_emitted >= SCAN_BATCH_INTERVAL_S:
+                        self.signals.progress_signal.emit(len(rehashed), len(self._sources))
+                        last_emitted = time.monotonic()
+                self.signals.finished_signal.emit((self._algorithm, rehashed))
+            except Exception as e:
+                self.signals.failed_signal.emit(str(e))
+
+    class PrefetchTask(QRunnable):
+        class Signals(QObject):
+            # (content hash, duration in ms)
+            probed_signal = Signal(str, int)
+
+        def __init__(self, entries: List[Tuple[str, Path, bool]], memory_budget: int):
+            # entries are (content hash, absolute path, whether the duration is still unknown)
+            super().__init__()
+            self._entries = entries
+            self._memory_budget = memory_budget
+            self._proceed = True
+            self.signals = self.Signals()
+
+        def cancel(self):
+            self._proceed = False
+
+        @Slot()
+        def run(self):
+            remaining = self._memory_budget
+            for content_hash, path, needs_probe in self._entries:
+                if not self._proceed:
+                    return
+                if remaining > 0:
+                    remaining -= warm_page_cache(path, remaining)
+                if needs_probe:
+                    duration = probe_duration(path)
+                    if duration is not None and self._proceed:
+                        self.signals.probed_signal.emit(content_hash, duration)
+
+    class EntryAudioTask(QRunnable):
+        # Decodes an entry once for both the waveform overview and going back to it later
+        class Signals(QObject):
+            # (content hash, PeakPyramid)
+            peaks_signal = Signal(str, object)
+            # content hash
+            decoded_signal = Signal(str)
+
+        def __init__(self, peak_cache: PeakCache, pcm_cache: PcmCache, content_hash: str, path: Path,
+                     needs_peaks: bool, audio: Optional[DecodedAudio]):
+            # audio is given when the PCM cache already had it
+            super().__init__()
+            self._peak_cache = peak_cache
+            self._pcm_cache = pcm_cache
+            self._content_hash = content_hash
+            self._path = path
+            self._needs_peaks = needs_peaks
+            self._audio = audio
+            self._proceed = True
+            self.signals = self.Signals()
+
+        def cancel(self):
+            self._proceed = False
+
+        @Slot()
+        def run(self):
+            pyramid = None
+            if self._needs_peaks:
+                pyramid = self._peak_cache.find(self._content_hash)
+                if pyramid is not None and self._proceed:
+                    self.signals.peaks_signal.emit(self._content_hash, pyramid)
+            audio = self._audio
+            if audio is None:
+                if not self._proceed or (pyramid is not None and not self._pcm_cache.enabled):
+                    return
+                try:
+                    audio = decode_audio(self._path)
+                except Exception:
+                    # no waveform for files that can't be decoded, they're played from the file
+                    return
+                if self._pcm_cache.enabled:
+                    # the decoded copy is dropped for the cached one
+                    audio = self._pcm_cache.put(self._content_hash, audio).audio
+                self.signals.decoded_signal.emit(self._content_hash)
+            if self._needs_peaks and pyramid is None and self._proceed:
+                self.signals.peaks_signal.emit(self._content_hash, self._peak_cache.add(self._content_hash, audio))
+
+    class SaveTask(QRunnable):
+        class Signals(QObject):
+            # ProjectSnapshot
+            saved_signal = Signal(object)
+            failed_signal = Signal(str)
+
+        def __init__(self, snapshot: ProjectSnapshot):
+            super().__init__()
+            self._snapshot = snapshot
+            self.signals = self.Signals()
+
+        @Slot()
+        def run(self):
+            try:
+                self._snapshot.write()
+                self.signals.saved_signal.emit(self._snapshot)
+            except Exception as e:
+                self.signals.failed_signal.emit(str(e))
+
+    class ClipExportTask(QRunnable):
+        class Signals(QObject):
+            # ClipExportProgress
+            progress_signal = Signal(object)
+            finished_signal = Signal(object)
+            failed_signal = Signal(str)
+
+        def __init__(self, sources: List[ClipSource], dataset_dir: Path, output_dir: Path,
+                     settings: ClipExportSettings):
+            super().__init__()
+            self._sources = sources
+            self._dataset_dir = dataset_dir
+            self._output_dir = output_dir
+            self._settings = settings
+            self._proceed = True
+            self.signals = self.Signals()
+
+        def cancel(self):
+            self._proceed = False
+
+        @Slot()
+        def run(self):
+            try:
+                progress = export_clips(self._sources, self._dataset_dir, self._output_dir, self._settings,
+                                        lambda progress: self.signals.progress_signal.emit(copy(progress)),
+                                        lambda: not self._proceed)
+                self.signals.finished_signal.emit(progress)
+            except ClipExportCancelled:
+                pass
+            except Exception as e:
+                self.signals.failed_signal.emit(str(e))
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Project")
@@ -76,6 +319,28 @@ class ProjectPage(WindowPage):
         self._project_path: Optional[Path] = None
         self._iterator: Optional[MarkupIterator] = None
         self._generation_task: Optional[ProjectPage.DescriptionGenerationTask] = None
+        self._watcher: Optional[DatasetWatcher] = None
+        self._scan_task: Optional[ProjectPage.DatasetScanTask] = None
+        self._events_task: Optional[ProjectPage.DatasetEventsTask] = None
+        self._migration_task: Optional[ProjectPage.HashMigrationTask] = None
+        self._prefetch_task: Optional[ProjectPage.PrefetchTask] = None
+        self._entry_audio_task: Optional[ProjectPage.EntryAudioTask] = None
+        # peak pyramids of the waveform overview, shared by all projects
+        self._peak_cache = PeakCache(
+            Path(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)) / 'waveforms')
+        # decoded audio of visited entries, configured per project
+        self._pcm_cache = PcmCache(0)
+        self._prepared_hash: Optional[str] = None
+        self._save_task: Optional[ProjectPage.SaveTask] = None
+        self._clip_export_task: Optional[ProjectPage.ClipExportTask] = None
+        # called once the running save succeeds
+        self._after_save: Optional[Callable[[], None]] = None
+        self._watcher_timer = QTimer(self)
+        self._watcher_timer.setInterval(WATCHER_EVENTS_INTERVAL_MS)
+        self._watcher_timer.timeout.connect(self._apply_dataset_events)
+        self._autosave_timer = QTimer(self)
+        self._autosave_timer.setInterval(JOURNAL_FLUSH_INTERVAL_MS)
+        self._autosave_timer.timeout.connect(self._autosave)
 
         # Layout
         layout = QVBoxLayout(self)
@@ -111,11 +376,22 @@ class ProjectPage(WindowPage):
         entry_label_layout.addWidget(self._entry_info)
         entry_info_layout.addLayout(entry_label_layout)
 
+        self._scan_status_label = QLabel(markup_tab)
+        self._scan_status_label.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+        self._scan_status_label.setVisible(False)
+        entry_info_layout.addWidget(self._scan_status_label)
+
+        self._clip_export_status_label = QLabel(markup_tab)
+        self._clip_export_status_label.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+        self._clip_export_status_label.setVisible(False)
+        entry_info_layout.addWidget(self._clip_export_status_label)
+
         # Audio Player
         self._player = AudioPlayer(_time_label_mapper, self)
         self._player.mediaStatusChanged.connect(self._media_load_ui_sync)
         self._player.durationChanged.connect(self._update_range_slider)
         self._player.durationChanged.connect(self._update_history_container_with_duration)
+        self._player.durationChanged.connect(self._record_duration)
         entry_info_layout.addWidget(self._player)
 
         entry_info_group_box.setLayout(entry_info_layout)
@@ -204,6 +480,75 @@ class ProjectPage(WindowPage):
         self._index_mode_combobox = self._create_settings_combobox(IterationSettings.Index)
         markup_settings_layout.addRow("Iteration Index Mode:", self._index_mode_combobox)
 
+        # Iteration Query
+        self._query_line_edit = QLineEdit(self)
+        self._query_line_edit.setPlaceholderText('Everything, e.g. path~"^drums/" labels<2 coverage<50% duration>10s')
+        self._query_line_edit.setToolTip(
+            "Conditions On path (~ regex, = glob), labels, coverage (%), size (kb, mb, gb), "
+            "duration (ms, s, m) and corrupted (yes, no), All Of Them Must Hold"
+        )
+        self._query_line_edit.editingFinished.connect(self._query_changed)
+        markup_settings_layout.addRow("Iteration Query:", self._query_line_edit)
+
+        # Content Hash Algorithm
+        self._hash_algorithm_combobox = QComboBox(self)
+        self._hash_algorithm_combobox.addItems(available_algorithms())
+        self._hash_algorithm_combobox.currentTextChanged.connect(self._hash_algorithm_changed)
+        markup_settings_layout.addRow("Content Hash Algorithm:", self._hash_algorithm_combobox)
+
+        # Dataset Watching
+        self._watch_dataset_checkbox = QCheckBox(self)
+        self._watch_dataset_checkbox.setToolTip("Pick Up Dataset File Changes While The Project Is Open")
+        self._watch_dataset_checkbox.toggled.connect(self._watch_dataset_toggled)
+        markup_settings_layout.addRow("Watch Dataset:", self._watch_dataset_checkbox)
+
+        # Dataset Scan Rules
+        self._include_patterns_line_edit = QLineEdit(self)
+        self._include_patterns_line_edit.setPlaceholderText("Everything, e.g. masters/*; *.flac")
+        self._include_patterns_line_edit.editingFinished.connect(self._scan_rules_changed)
+        markup_settings_layout.addRow("Include Patterns:", self._include_patterns_line_edit)
+
+        self._exclude_patterns_line_edit = QLineEdit(self)
+        self._exclude_patterns_line_edit.setPlaceholderText("Nothing, e.g. stems; */artwork/*")
+        self._exclude_patterns_line_edit.editingFinished.connect(self._scan_rules_changed)
+        markup_settings_layout.addRow("Exclude Patterns:", self._exclude_patterns_line_edit)
+
+        self._max_depth_spinbox = QSpinBox(self)
+        self._max_depth_spinbox.setRange(-1, 1000)
+        self._max_depth_spinbox.setSpecialValueText("Unlimited")
+        self._max_depth_spinbox.editingFinished.connect(self._scan_rules_changed)
+        markup_settings_layout.addRow("Max Directory Depth:", self._max_depth_spinbox)
+
+        # Prefetching
+        self._prefetch_depth_spinbox = QSpinBox(self)
+        self._prefetch_depth_spinbox.setRange(0, 64)
+        self._prefetch_depth_spinbox.setToolTip("Upcoming Entries To Read Ahead, 0 Turns Prefetching Off")
+        self._prefetch_depth_spinbox.editingFinished.connect(self._prefetch_settings_changed)
+        markup_settings_layout.addRow("Prefetch Depth:", self._prefetch_depth_spinbox)
+
+        self._prefetch_budget_spinbox = QSpinBox(self)
+        self._prefetch_budget_spinbox.setRange(0, 64 * 1024)
+        self._prefetch_budget_spinbox.setSuffix(" MB")
+        self._prefetch_budget_spinbox.setToolTip("How Much Of The Upcoming Files To Read Ahead")
+        self._prefetch_budget_spinbox.editingFinished.connect(self._prefetch_settings_changed)
+        markup_settings_layout.addRow("Prefetch Memory Budget:", self._prefetch_budget_spinbox)
+
+        # Decoded audio cache
+        self._pcm_cache_budget_spinbox = QSpinBox(self)
+        self._pcm_cache_budget_spinbox.setRange(0, 64 * 1024)
+        self._pcm_cache_budget_spinbox.setSuffix(" MB")
+        self._pcm_cache_budget_spinbox.setToolTip("Decoded Audio Of Visited Entries Kept In Memory, 0 Turns It Off")
+        self._pcm_cache_budget_spinbox.editingFinished.connect(self._pcm_cache_settings_changed)
+        markup_settings_layout.addRow("Decoded Audio Cache:", self._pcm_cache_budget_spinbox)
+
+        self._pcm_cache_spill_checkbox = QCheckBox(self)
+        self._pcm_cache_spill_checkbox.setToolTip("Move Decoded Audio Over The Budget To Temporary Files")
+        self._pcm_cache_spill_checkbox.toggled.connect(self._pcm_cache_settings_changed)
+        markup_settings_layout.addRow("Spill Decoded Audio:", self._pcm_cache_spill_checkbox)
+
+        self._pcm_cache_status_label = QLabel(self)
+        markup_settings_layout.addRow("Decoded Audio Cache Use:", self._pcm_cache_status_label)
+
         # Entry List
         markup_entries_group_box = QGroupBox('Visible Entries', self)
         markup_entries_layout = QVBoxLayout(markup_entries_group_box)
@@ -253,6 +598,16 @@ class ProjectPage(WindowPage):
         export_markup_button.clicked.connect(self._export_markup)
         detail_tab_button_layout.addWidget(export_markup_button)
 
+        export_clips_button = QPushButton("Export Clips", project_details_tab)
+        export_clips_button.setToolTip("Cut Every Label Into Its Own Audio Clip")
+        export_clips_button.clicked.connect(self._export_clips)
+        detail_tab_button_layout.addWidget(export_clips_button)
+
+        verify_dataset_button = QPushButton("Verify Dataset", project_details_tab)
+        verify_dataset_button.setToolTip("Rehash Every Dataset File, Ignoring Cached Fingerprints")
+        verify_dataset_button.clicked.connect(self._verify_dataset)
+        detail_tab_button_layout.addWidget(verify_dataset_button)
+
         project_details_layout.addLayout(detail_tab_button_layout)
 
     def on_enter(self, data: OnEntryData):
@@ -274,9 +629,34 @@ class ProjectPage(WindowPage):
         self._filter_mode_combobox.setCurrentIndex(
             next(i for i, v in enumerate(IterationSettings.Filters.getOptions()) if v.value == current_filter_mode))
 
+        self._query_line_edit.setText(self._project.markup_settings.iteration_settings.query)
+
+        self._hash_algorithm_combobox.blockSignals(True)
+        self._hash_algorithm_combobox.setCurrentText(self._project.markup_data.hash_algorithm)
+        self._hash_algorithm_combobox.blockSignals(False)
+
+        self._watch_dataset_checkbox.blockSignals(True)
+        self._watch_dataset_checkbox.setChecked(self._project.markup_settings.scan_settings.watch_dataset)
+        self._watch_dataset_checkbox.blockSignals(False)
+
+        scan_settings = self._project.markup_settings.scan_settings
+        self._include_patterns_line_edit.setText('; '.join(scan_settings.include_patterns))
+        self._exclude_patterns_line_edit.setText('; '.join(scan_settings.exclude_patterns))
+        self._max_depth_spinbox.setValue(-1 if scan_settings.max_depth is None else scan_settings.max_depth)
+        self._prefetch_depth_spinbox.setValue(self._project.markup_settings.prefetch_depth)
+        self._prefetch_budget_spinbox.setValue(self._project.markup_settings.prefetch_memory_budget_mb)
+        self._pcm_cache_budget_spinbox.setValue(self._project.markup_settings.pcm_cache_budget_mb)
+        self._pcm_cache_spill_checkbox.blockSignals(True)
+        self._pcm_cache_spill_checkbox.setChecked(self._project.markup_settings.pcm_cache_spill)
+        self._pcm_cache_spill_checkbox.blockSignals(False)
+        self._configure_pcm_cache()
+
         # UI Synchronization
-        self._markup_entries.set_entries(self._iterator.list())
+        self._markup_entries.bind(self._iterator)
         self._range_slider.set_min_range(self._project.markup_settings.min_duration_in_ms)
+        self._prepared_hash = None
+        self._autosave_timer.start()
+        self._start_dataset_scan()
         self._prepare_entry()
         self._project_name_line_edit.setText(self._project.name)
         self._project_description_line_edit.setPlainText(self._project.description)
@@ -294,13 +674,335 @@ class ProjectPage(WindowPage):
         filter_mode = self._filter_mode_combobox.currentData()
         index_mode = self._index_mode_combobox.currentData()
 
-        self._project.markup_settings.iteration_settings.order_by = order_mode
-        self._project.markup_settings.iteration_settings.filter_predicate = filter_mode
-        self._project.markup_settings.iteration_settings.index_callback = index_mode
+        iteration_settings = self._project.markup_settings.iteration_settings
+        if (order_mode, filter_mode, index_mode) == (
+                iteration_settings.order_by, iteration_settings.filter_predicate, iteration_settings.index_callback):
+            return
+        iteration_settings.order_by = order_mode
+        iteration_settings.filter_predicate = filter_mode
+        iteration_settings.index_callback = index_mode
+        self._project.mark_changed()
 
         self._iterator.refresh_view()
 
-        self._markup_entries.set_entries(self._iterator.list())
+    def _query_changed(self):
+        iteration_settings = self._project.markup_settings.iteration_settings
+        previous_query = iteration_settings.query
+        iteration_settings.query = self._query_line_edit.text().strip()
+        if iteration_settings.query == previous_query:
+            return
+        try:
+            self._iterator.refresh_view()
+            self._project.mark_changed()
+        except QueryError as e:
+            iteration_settings.query = previous_query
+            QMessageBox.critical(
+                self,
+                "Invalid Query",
+                str(e),
+                QMessageBox.StandardButton.Ok
+            )
+
+    def _hash_algorithm_changed(self, algorithm: str):
+        if algorithm == self._project.markup_data.hash_algorithm:
+            return
+        if not self._ensure_no_scan():
+            self._hash_algorithm_combobox.blockSignals(True)
+            self._hash_algorithm_combobox.setCurrentText(self._project.markup_data.hash_algorithm)
+            self._hash_algorithm_combobox.blockSignals(False)
+            return
+        if self._save_task is not None:
+            QMessageBox.information(
+                self,
+                "Saving In Progress",
+                "The project is being saved, please wait a moment.",
+                QMessageBox.StandardButton.Ok
+            )
+            self._hash_algorithm_combobox.blockSignals(True)
+            self._hash_algorithm_combobox.setCurrentText(self._project.markup_data.hash_algorithm)
+            self._hash_algorithm_combobox.blockSignals(False)
+            return
+
+        answer = QMessageBox.question(
+            self,
+            "Changing Hash Algorithm",
+            "Every dataset file will be rehashed and the project re-keyed. Do you want to continue?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            self._start_hash_migration(algorithm)
+            return
+
+        self._hash_algorithm_combobox.blockSignals(True)
+        self._hash_algorithm_combobox.setCurrentText(self._project.markup_data.hash_algorithm)
+        self._hash_algorithm_combobox.blockSignals(False)
+
+    def _start_hash_migration(self, algorithm: str):
+        # The watcher would add entries the rehash doesn't know about
+        self._stop_watcher()
+        self._migration_task = ProjectPage.HashMigrationTask(self._project.markup_data, algorithm)
+        self._migration_task.signals.progress_signal.connect(self._hash_migration_progress)
+        self._migration_task.signals.finished_signal.connect(self._hash_migration_finished)
+        self._migration_task.signals.failed_signal.connect(self._hash_migration_failed)
+        self._hash_algorithm_combobox.setDisabled(True)
+        self._scan_status_label.setText("Rehashing dataset...")
+        self._scan_status_label.setVisible(True)
+        QThreadPool.globalInstance().start(self._migration_task)
+
+    def _cancel_hash_migration(self):
+        if self._migration_task is not None:
+            self._migration_task.cancel()
+            self._disconnect_migration_task()
+            self._hash_migration_ended()
+
+    def _disconnect_migration_task(self):
+        self._migration_task.signals.progress_signal.disconnect(self._hash_migration_progress)
+        self._migration_task.signals.finished_signal.disconnect(self._hash_migration_finished)
+        self._migration_task.signals.failed_signal.disconnect(self._hash_migration_failed)
+        self._migration_task = None
+
+    @Slot(int, int)
+    def _hash_migration_progress(self, rehashed: int, total: int):
+        self._scan_status_label.setText(f"Rehashing dataset: {rehashed} of {total} entries")
+
+    @Slot(object)
+    def _hash_migration_finished(self, payload):
+        algorithm, rehashed = payload
+        self._disconnect_migration_task()
+        try:
+            self._project.migrate_hash_algorithm(algorithm, rehashed)
+        except Exception as e:
+            QMessageBox.critical(
+                self,
+                "Hash Migration Error",
+                str(e),
+                QMessageBox.StandardButton.Ok
+            )
+        else:
+            self._save_migrated_project()
+        self._hash_migration_ended()
+        self._update_watcher()
+
+    def _save_migrated_project(self):
+        # Journaled edits refer to the old keys and a database store was rebuilt in a temporary file,
+        # so the project is saved right away, after the save in progress if there is one
+        if not self._project.autosaves_labels or self._project_path is None:
+            return
+        if self._save_task is not None:
+            after_save = self._after_save
+
+            def save_after():
+                self._save_project(in_existing=True, after_save=after_save)
+            self._after_save = save_after
+            return
+        self._save_project(in_existing=True)
+
+    @Slot(str)
+    def _hash_migration_failed(self, message: str):
+        self._disconnect_migration_task()
+        self._hash_migration_ended()
+        self._update_watcher()
+        QMessageBox.critical(
+            self,
+            "Hash Migration Error",
+            message,
+            QMessageBox.StandardButton.Ok
+        )
+
+    def _hash_migration_ended(self):
+        self._scan_status_label.setVisible(False)
+        self._hash_algorithm_combobox.blockSignals(True)
+        self._hash_algorithm_combobox.setCurrentText(self._project.markup_data.hash_algorithm)
+        self._hash_algorithm_combobox.blockSignals(False)
+        self._hash_algorithm_combobox.setDisabled(False)
+
+    def _watch_dataset_toggled(self, checked: bool):
+        if self._project.markup_settings.scan_settings.watch_dataset == checked:
+            return
+        self._project.markup_settings.scan_settings.watch_dataset = checked
+        self._project.mark_changed()
+        self._update_watcher()
+
+    def _scan_rules_changed(self):
+        # Takes effect on the next dataset scan
+        scan_settings = self._project.markup_settings.scan_settings
+        include_patterns = self._split_patterns(self._include_patterns_line_edit.text())
+        exclude_patterns = self._split_patterns(self._exclude_patterns_line_edit.text())
+        max_depth = self._max_depth_spinbox.value()
+        max_depth = None if max_depth < 0 else max_depth
+        if (include_patterns, exclude_patterns, max_depth) == (
+                scan_settings.include_patterns, scan_settings.exclude_patterns, scan_settings.max_depth):
+            return
+        scan_settings.include_patterns = include_patterns
+        scan_settings.exclude_patterns = exclude_patterns
+        scan_settings.max_depth = max_depth
+        self._project.mark_changed()
+        if self._watcher is not None:
+            self._update_watcher()
+
+    def _prefetch_settings_changed(self):
+        markup_settings = self._project.markup_settings
+        depth, budget = self._prefetch_depth_spinbox.value(), self._prefetch_budget_spinbox.value()
+        if (depth, budget) == (markup_settings.prefetch_depth, markup_settings.prefetch_memory_budget_mb):
+            return
+        markup_settings.prefetch_depth = depth
+        markup_settings.prefetch_memory_budget_mb = budget
+        self._project.mark_changed()
+        self._schedule_prefetch()
+
+    def _schedule_prefetch(self):
+        self._cancel_prefetch()
+        depth = self._project.markup_settings.prefetch_depth
+        upcoming = self._iterator.peek(depth) if depth > 0 else []
+        markup_data = self._project.markup_data
+        # The entry right after this one gets a player that has already opened it
+        self._player.preload(
+            markup_data.absolute_path(upcoming[0].entry.entry_info.relative_path) if upcoming else None)
+        if not upcoming:
+            return
+        self._prefetch_task = self.PrefetchTask(
+            [(view.content_hash, markup_data.absolute_path(view.entry.entry_info.relative_path),
+              view.entry.entry_info.duration is None) for view in upcoming],
+            self._project.markup_settings.prefetch_memory_budget_mb * 1024 * 1024
+        )
+        self._prefetch_task.signals.probed_signal.connect(self._apply_probed_duration)
+        QThreadPool.globalInstance().start(self._prefetch_task)
+
+    def _cancel_prefetch(self):
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task.signals.probed_signal.disconnect(self._apply_probed_duration)
+        self._prefetch_task = None
+
+    def _open_entry_audio(self, content_hash: str, path: Path):
+        # Entries decoded before are played from memory, and their waveform is drawn right away when recent.
+        # Whatever is missing is decoded or read from the cache on a worker.
+        self._cancel_entry_audio()
+        cached = self._pcm_cache.get(content_hash)
+        audio = cached.audio if cached is not None else None
+        if cached is not None:
+            self._player.open_from_wav(cached.wav)
+        else:
+            self._player.open_from_file(path)
+        pyramid = self._peak_cache.cached(content_hash)
+        self._range_slider.set_waveform(pyramid)
+        self._update_pcm_cache_status()
+        if pyramid is not None and audio is not None:
+            return
+        self._entry_audio_task = self.EntryAudioTask(self._peak_cache, self._pcm_cache, content_hash, path,
+                                                     pyramid is None, audio)
+        self._entry_audio_task.signals.peaks_signal.connect(self._apply_waveform)
+        self._entry_audio_task.signals.decoded_signal.connect(self._update_pcm_cache_status)
+        QThreadPool.globalInstance().start(self._entry_audio_task)
+
+    def _cancel_entry_audio(self):
+        if self._entry_audio_task is not None:
+            self._entry_audio_task.cancel()
+            self._entry_audio_task.signals.peaks_signal.disconnect(self._apply_waveform)
+            self._entry_audio_task.signals.decoded_signal.disconnect(self._update_pcm_cache_status)
+        self._entry_audio_task = None
+
+    @Slot(str, object)
+    def _apply_waveform(self, content_hash: str, pyramid: PeakPyramid):
+        if content_hash == self._prepared_hash:
+            self._range_slider.set_waveform(pyramid)
+
+    def _pcm_cache_settings_changed(self):
+        markup_settings = self._project.markup_settings
+        budget, spill = self._pcm_cache_budget_spinbox.value(), self._pcm_cache_spill_checkbox.isChecked()
+        if (budget, spill) == (markup_settings.pcm_cache_budget_mb, markup_settings.pcm_cache_spill):
+            return
+        markup_settings.pcm_cache_budget_mb = budget
+        markup_settings.pcm_cache_spill = spill
+        self._project.mark_changed()
+        self._configure_pcm_cache()
+
+    def _configure_pcm_cache(self):
+        markup_settings = self._project.markup_settings
+        self._pcm_cache.configure(markup_settings.pcm_cache_budget_mb * 1024 * 1024,
+                                  Path(tempfile.gettempdir()) if markup_settings.pcm_cache_spill else None)
+        self._update_pcm_cache_status()
+
+    def _update_pcm_cache_status(self):
+        statistics = self._pcm_cache.statistics()
+        text = f"{statistics.entries} entries, {statistics.resident_bytes / 1024 / 1024:.0f} MB in memory"
+        if statistics.spilled_bytes:
+            text += f", {statistics.spilled_bytes / 1024 / 1024:.0f} MB spilled"
+        text += f", {statistics.hit_rate:.0%} hits"
+        self._pcm_cache_status_label.setText(text)
+
+    @Slot(str, int)
+    def _apply_probed_duration(self, content_hash: str, duration: int):
+        if self._project.markup_data.get(content_hash) is not None:
+            self._project.markup_data.set_duration(content_hash, duration)
+
+    @staticmethod
+    def _split_patterns(text: str):
+        return tuple(pattern.strip() for pattern in text.split(';') if pattern.strip())
+
+    def _update_watcher(self):
+        self._stop_watcher()
+        if self._scan_task is not None or self._migration_task is not None:
+            # Started once the running scan or migration is over
+            return
+        scan_settings = self._project.markup_settings.scan_settings
+        if scan_settings.watch_dataset:
+            self._watcher = create_watcher(
+                self._project.markup_data.directory,
+                scan_settings.path_rules(),
+                scan_settings.watch_poll_interval
+            )
+            self._watcher.start()
+            self._watcher_timer.start()
+
+    def _stop_watcher(self):
+        self._watcher_timer.stop()
+        self._cancel_dataset_events()
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._watcher = None
+
+    def _apply_dataset_events(self):
+        if self._events_task is not None:
+            # The next batch waits in the watcher until this one is applied
+            return
+        events = self._watcher.poll()
+        if not events:
+            return
+        if any(event.kind == DatasetEvent.Kind.RESCAN for event in events):
+            # The watcher lost track of changes, a full scan covers the whole batch
+            self._start_dataset_scan()
+            return
+        self._events_task = ProjectPage.DatasetEventsTask(self._project.markup_data, events)
+        self._events_task.signals.hashed_signal.connect(self._apply_hashed_events)
+        self._events_task.signals.failed_signal.connect(self._dataset_events_failed)
+        QThreadPool.globalInstance().start(self._events_task)
+
+    def _cancel_dataset_events(self):
+        if self._events_task is not None:
+            self._events_task.cancel()
+            self._disconnect_events_task()
+
+    def _disconnect_events_task(self):
+        self._events_task.signals.hashed_signal.disconnect(self._apply_hashed_events)
+        self._events_task.signals.failed_signal.disconnect(self._dataset_events_failed)
+        self._events_task = None
+
+    @Slot(object)
+    def _apply_hashed_events(self, payload):
+        events, hashed = payload
+        self._disconnect_events_task()
+        self._project.markup_data.apply_events(events, hashed)
+
+    @Slot(str)
+    def _dataset_events_failed(self, message: str):
+        self._disconnect_events_task()
+        QMessageBox.critical(
+            self,
+            "Dataset Watcher Error",
+            message,
+            QMessageBox.StandardButton.Ok
+        )
 
     def _move_next(self):
         self._iterator.next()
@@ -308,6 +1010,12 @@ class ProjectPage(WindowPage):
 
     def _prepare_entry(self):
         if self._iterator.last_accessed_entry is None:
+            self._prepared_hash = None
+            self._cancel_entry_audio()
+            self._range_slider.set_waveform(None)
+            if self._scan_task is not None:
+                # Entries are still coming in
+                return
             QMessageBox.question(
                 self,
                 "Dataset is exhausted",
@@ -316,12 +1024,24 @@ class ProjectPage(WindowPage):
             )
         else:
             relative_path = self._iterator.last_accessed_entry.entry.entry_info.relative_path
+            self._prepared_hash = self._iterator.last_accessed_entry.content_hash
             self._description_input_text_edit.setPlainText("")
             self._history.set_markups(self._iterator.last_accessed_entry.entry.values)
             self._markup_entries.scroll_to(self._iterator.last_accessed_entry)
-            self._player.open_from_file(self._project.markup_data.absolute_path(relative_path))
+            self._open_entry_audio(self._prepared_hash, self._project.markup_data.absolute_path(relative_path))
+            self._schedule_prefetch()
+
+    def _save_project(self, in_existing: bool, after_save: Optional[Callable[[], None]] = None):
+        # after_save runs once the project is saved, or right away when there is nothing to save
+        if self._save_task is not None:
+            QMessageBox.information(
+                self,
+                "Saving In Progress",
+                "The project is being saved, please wait a moment.",
+                QMessageBox.StandardButton.Ok
+            )
+            return
 
-    def _save_project(self, in_existing: bool):
         validation_errors = dict(filter(None, [
             validate_required_field(self._project_name_line_edit.text(), "Name"),
             validate_required_field(self._project_description_line_edit.toPlainText(), "Description"),
@@ -339,19 +1059,56 @@ class ProjectPage(WindowPage):
             )
 
         if in_existing and self._project_path:
+            if not self._has_unsaved_changes():
+                if after_save is not None:
+                    after_save()
+                return
             path = self._project_path
         else:
-            path = Path(QFileDialog.getSaveFileName(
+            selected_path = QFileDialog.getSaveFileName(
                 self,
                 "Save Project As",
                 filter=SAVE_PROJECT_AS_FILE_FILTER
-            )[0])
+            )[0]
+            if not selected_path:
+                return
+            path = Path(selected_path)
 
         self._project.name = self._project_name_line_edit.text()
         self._project.description = self._project_description_line_edit.toPlainText()
         try:
-            self._project.save(path)
-            self._project_path = path
+            snapshot = self._project.snapshot(path)
+        except Exception as e:
+            QMessageBox.critical(
+                self,
+                "Project Saving Error",
+                str(e),
+                QMessageBox.StandardButton.Ok
+            )
+            return
+        # Serialized and written on a worker, labeling goes on meanwhile
+        self._after_save = after_save
+        self._save_task = ProjectPage.SaveTask(snapshot)
+        self._save_task.signals.saved_signal.connect(self._project_saved)
+        self._save_task.signals.failed_signal.connect(self._project_saving_failed)
+        QThreadPool.globalInstance().start(self._save_task)
+
+    def _has_unsaved_changes(self) -> bool:
+        return (self._project.is_dirty
+                or self._project_name_line_edit.text() != self._project.name
+                or self._project_description_line_edit.toPlainText() != self._project.description)
+
+    def _disconnect_save_task(self):
+        self._save_task.signals.saved_signal.disconnect(self._project_saved)
+        self._save_task.signals.failed_signal.disconnect(self._project_saving_failed)
+        self._save_task = None
+
+    @Slot(object)
+    def _project_saved(self, snapshot: ProjectSnapshot):
+        self._disconnect_save_task()
+        after_save, self._after_save = self._after_save, None
+        try:
+            self._project.snapshot_saved(snapshot)
         except Exception as e:
             QMessageBox.critical(
                 self,
@@ -359,13 +1116,35 @@ class ProjectPage(WindowPage):
                 str(e),
                 QMessageBox.StandardButton.Ok
             )
+            return
+        self._project_path = snapshot.path
+        self._autosave_timer.start()
+        if after_save is not None:
+            after_save()
+
+    @Slot(str)
+    def _project_saving_failed(self, message: str):
+        self._disconnect_save_task()
+        self._after_save = None
+        QMessageBox.critical(
+            self,
+            "Project Saving Error",
+            message,
+            QMessageBox.StandardButton.Ok
+        )
 
     def _export_markup(self):
-        path = Path(QFileDialog.getSaveFileName(
+        path, selected_filter = QFileDialog.getSaveFileName(
             self,
-            "Save Markup As",
-            filter=SAVE_DATAFRAME_AS_FILE_FILTER
-        )[0])
+            "Export Markup As",
+            filter=';;'.join(EXPORT_MARKUP_FILE_FILTERS)
+        )
+        if not path:
+            return
+        path = Path(path)
+        suffix = EXPORT_MARKUP_FILE_FILTERS.get(selected_filter)
+        if suffix is not None and not path.name.endswith(suffix):
+            path = path.with_name(path.name + suffix)
         try:
             self._project.export_markup(path)
         except Exception as e:
@@ -376,6 +1155,161 @@ class ProjectPage(WindowPage):
                 QMessageBox.StandardButton.Ok
             )
 
+    def _export_clips(self):
+        if self._clip_export_task is not None:
+            QMessageBox.information(
+                self,
+                "Clip Export In Progress",
+                "Please wait until the running clip export is finished.",
+                QMessageBox.StandardButton.Ok
+            )
+            return
+        chosen = ClipExportDialog(self).show_dialog()
+        if chosen is None:
+            return
+        output_dir, settings = chosen
+        # The labels are read here, editing can go on while the clips are cut
+        sources = list(clip_sources(self._project.markup_data))
+        self._clip_export_task = ProjectPage.ClipExportTask(sources, self._project.markup_data.directory,
+                                                            output_dir, settings)
+        self._clip_export_task.signals.progress_signal.connect(self._clip_export_progressed)
+        self._clip_export_task.signals.finished_signal.connect(self._clip_export_finished)
+        self._clip_export_task.signals.failed_signal.connect(self._clip_export_failed)
+        self._clip_export_status_label.setText("Exporting clips...")
+        self._clip_export_status_label.setVisible(True)
+        QThreadPool.globalInstance().start(self._clip_export_task)
+
+    def _cancel_clip_export(self):
+        if self._clip_export_task:
+            self._clip_export_task.cancel()
+            self._disconnect_clip_export_task()
+
+    def _disconnect_clip_export_task(self):
+        self._clip_export_task.signals.progress_signal.disconnect(self._clip_export_progressed)
+        self._clip_export_task.signals.finished_signal.disconnect(self._clip_export_finished)
+        self._clip_export_task.signals.failed_signal.disconnect(self._clip_export_failed)
+        self._clip_export_task = None
+        self._clip_export_status_label.setVisible(False)
+
+    @Slot(object)
+    def _clip_export_progressed(self, progress: ClipExportProgress):
+        self._clip_export_status_label.setText(
+            f"Exporting clips: {progress.written} written, {progress.up_to_date} up to date, "
+            f"{progress.failed} failed")
+
+    @Slot(object)
+    def _clip_export_finished(self, progress: ClipExportProgress):
+        self._disconnect_clip_export_task()
+        text = (f"{progress.written} labels cut into clips, {progress.up_to_date} were up to date, "
+                f"{progress.failed} failed.")
+        if progress.errors:
+            text += "\n\n" + "\n".join(progress.errors[:10])
+        QMessageBox.information(
+            self,
+            "Clip Export Finished",
+            text,
+            QMessageBox.StandardButton.Ok
+        )
+
+    @Slot(str)
+    def _clip_export_failed(self, message: str):
+        self._disconnect_clip_export_task()
+        QMessageBox.critical(
+            self,
+            "Clip Export Error",
+            message,
+            QMessageBox.StandardButton.Ok
+        )
+
+    def _verify_dataset(self):
+        if not self._ensure_no_scan():
+            return
+        self._start_dataset_scan(full_verify=True)
+
+    def _start_dataset_scan(self, full_verify: bool = False):
+        self._stop_watcher()
+        self._project.markup_data.begin_scan()
+        self._scan_task = ProjectPage.DatasetScanTask(self._project.markup_data, full_verify)
+        self._scan_task.signals.batch_signal.connect(self._apply_scan_batch)
+        self._scan_task.signals.finished_signal.connect(self._scan_finished)
+        self._scan_task.signals.failed_signal.connect(self._scan_failed)
+        self._scan_status_label.setText("Scanning dataset...")
+        self._scan_status_label.setVisible(True)
+        QThreadPool.globalInstance().start(self._scan_task)
+
+    def _cancel_dataset_scan(self):
+        if self._scan_task:
+            self._scan_task.cancel()
+            self._disconnect_scan_task()
+            self._project.markup_data.abort_scan()
+            self._scan_status_label.setVisible(False)
+
+    def _disconnect_scan_task(self):
+        self._scan_task.signals.batch_signal.disconnect(self._apply_scan_batch)
+        self._scan_task.signals.finished_signal.disconnect(self._scan_finished)
+        self._scan_task.signals.failed_signal.disconnect(self._scan_failed)
+        self._scan_task = None
+
+    @Slot(object)
+    def _apply_scan_batch(self, payload):
+        batch, progress = payload
+        self._scan_status_label.setText(self._format_scan_progress(progress))
+        if not batch:
+            return
+        self._project.markup_data.apply_scanned(batch)
+        self._prepare_entry_if_idle()
+
+    @Slot(object)
+    def _scan_finished(self, progress: ScanProgress):
+        self._disconnect_scan_task()
+        self._project.markup_data.finish_scan()
+        self._scan_status_label.setVisible(False)
+        self._prepare_entry_if_idle()
+        self._update_watcher()
+
+    @Slot(str)
+    def _scan_failed(self, message: str):
+        self._disconnect_scan_task()
+        self._project.markup_data.abort_scan()
+        self._scan_status_label.setVisible(False)
+        QMessageBox.critical(
+            self,
+            "Dataset Scan Error",
+            message,
+            QMessageBox.StandardButton.Ok
+        )
+
+    def _prepare_entry_if_idle(self):
+        if self._prepared_hash is None and self._iterator.last_accessed_entry is not None:
+            self._prepare_entry()
+
+    @staticmethod
+    def _format_scan_progress(progress: ScanProgress):
+        text = (f"Scanning dataset: {progress.files_seen} files seen, {progress.files_hashed} hashed, "
+                f"{progress.bytes_per_second / 1024 / 1024:.1f} MB/s")
+        if progress.eta is not None:
+            text += f", ETA {_time_label_mapper(int(progress.eta * 1000))}"
+        return text
+
+    def _ensure_no_scan(self) -> bool:
+        if self._migration_task is not None:
+            QMessageBox.information(
+                self,
+                "Hash Migration In Progress",
+                "Please wait until the dataset is rehashed.",
+                QMessageBox.StandardButton.Ok
+            )
+            return False
+        if self._scan_task is not None:
+            QMessageBox.information(
+                self,
+                "Dataset Scan In Progress",
+                "Please wait until the dataset scan is finished.",
+                QMessageBox.StandardButton.Ok
+            )
+            return False
+        return True
+
     def _save_markup(self):
         validation_errors = dict(filter(None, [
             validate_required_field(self._description_input_text_edit.toPlainText(), "Description")
@@ -384,6 +1318,15 @@ class ProjectPage(WindowPage):
             show_error_message(validation_errors, self)
             return
 
+        if not self._project.markup_data.is_verified(self._iterator.last_accessed_entry.content_hash):
+            QMessageBox.information(
+                self,
+                "Entry Not Verified",
+                "This entry hasn't been confirmed by the dataset scan yet, please wait a moment.",
+                QMessageBox.StandardButton.Ok
+            )
+            return
+
         start, end = self._range_slider.get_range()
         markup = MarkupValue(
             start,
@@ -391,20 +1334,53 @@ class ProjectPage(WindowPage):
             self._description_input_text_edit.toPlainText()
         )
 
-        self._project.markup_data.add(self._iterator.last_accessed_entry.md5, markup, 0)
+        self._project.markup_data.add(self._iterator.last_accessed_entry.content_hash, markup, 0)
         self._history.add_markup(markup, self._player.get_duration(), 0)
 
     def _delete_markup(self, markup_index: int):
         self._project.markup_data.delete(
-            self._iterator.last_accessed_entry.md5,
+            self._iterator.last_accessed_entry.content_hash,
             markup_index
         )
 
+    def _autosave(self):
+        if self._save_task is not None:
+            return
+        if self._project.needs_compaction and self._project_path is not None:
+            # The journal has grown long, it's folded into a snapshot saved in the background
+            self._save_project(in_existing=True)
+            return
+        try:
+            self._project.autosave()
+        except Exception as e:
+            self._autosave_timer.stop()
+            QMessageBox.critical(
+                self,
+                "Autosave Error",
+                f"{e}\nAutosave is paused until the project is saved.",
+                QMessageBox.StandardButton.Ok
+            )
+
     def _close_project(self):
-        # TODO: Ask only if changes were made
+        if self._save_task is not None:
+            QMessageBox.information(
+                self,
+                "Saving In Progress",
+                "The project is being saved, it can be closed once that's done.",
+                QMessageBox.StandardButton.Ok
+            )
+            return
+        if not self._has_unsaved_changes():
+            self._teardown_project()
+            return
+
         message_box = QMessageBox(self)
         message_box.setWindowTitle("Closing Project")
-        message_box.setText("All progress will be lost. Do you want to save this project before closing it?")
+        if self._project.autosaves_labels:
+            message_box.setText("Labels are saved automatically, but other changes will be lost. "
+                                "Do you want to save this project before closing it?")
+        else:
+            message_box.setText("All progress will be lost. Do you want to save this project before closing it?")
         message_box.addButton(QMessageBox.StandardButton.Save)
         message_box.addButton("Save As", QMessageBox.ButtonRole.YesRole)
         message_box.addButton(QMessageBox.StandardButton.No)
@@ -412,26 +1388,45 @@ class ProjectPage(WindowPage):
 
         answer = message_box.exec()
         if answer == QMessageBox.StandardButton.Save:
-            self._save_project(in_existing=True)
+            self._save_project(in_existing=True, after_save=self._teardown_project)
         elif message_box.clickedButton().text() == "Save As":
-            self._save_project(in_existing=False)
-        elif answer == QMessageBox.StandardButton.Cancel:
-            return
-
+            self._save_project(in_existing=False, after_save=self._teardown_project)
+        elif answer == QMessageBox.StandardButton.No:
+            self._teardown_project()
+
+    def _teardown_project(self):
+        self._cancel_dataset_scan()
+        self._cancel_hash_migration()
+        self._cancel_clip_export()
+        self._stop_watcher()
+        self._cancel_prefetch()
+        self._cancel_entry_audio()
+        self._range_slider.set_waveform(None)
+        self._pcm_cache.clear()
         self._player.discard()
+        self._player.discard_preloaded()
+        self._markup_entries.unbind()
+        self._iterator.close()
+        self._autosave_timer.stop()
+        self._project.close()
         self._project = None
         self._project_path = None
         self._iterator = None
 
         self._goto("main")
 
-    def _entry_selected(self, md5: str):
-        self._iterator.last_accessed_entry = md5
+    def _entry_selected(self, content_hash: str):
+        self._iterator.last_accessed_entry = content_hash
         self._prepare_entry()
 
     def _update_history_container_with_duration(self, duration: int):
         self._history.update_markups_with_duration(duration)
 
+    def _record_duration(self, duration: int):
+        # Feeds the duration and coverage query conditions
+        if duration > 0 and self._prepared_hash is not None:
+            self._project.markup_data.set_duration(self._prepared_hash, duration)
+
     @Slot(QMediaPlayer.MediaStatus)
     def _media_load_ui_sync(self, status: QMediaPlayer.MediaStatus):
         self._entry_info.setText(str(self._iterator.last_accessed_entry.entry.entry_info.relative_path))
@@ -452,7 +1447,7 @@ class ProjectPage(WindowPage):
         elif status == QMediaPlayer.MediaStatus.InvalidMedia:
             self._markup_tab_save_button.setDisabled(True)
             self._generate_button.setDisabled(True)
-            self._project.markup_data.refresh_entry(self._iterator.last_accessed_entry.md5)
+            self._project.markup_data.refresh_entry(self._iterator.last_accessed_entry.content_hash)
             if self._iterator.last_accessed_entry.entry.entry_info.is_corrupted:
                 self._media_indicator.set_status(MediaIndicator.Status.CORRUPTED)
             else:
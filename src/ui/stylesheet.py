@@ -0,0 +1,74 @@
+import importlib.metadata
+import importlib.util
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import QStandardPaths, QDir
+from PySide6.QtGui import QFontDatabase, QGuiApplication, QColor, QPalette
+from PySide6.QtWidgets import QWidget
+
+from src.app.file_system_utils import atomic_write
+
+# bumped when what's cached changes
+_CACHE_VERSION = 1
+
+
+def apply_cached_stylesheet(widget: QWidget, theme: str):
+    # qt_material renders its template and regenerates its icons on every launch, which is most of
+    # the start up time. The rendered stylesheet and the icons are cached per theme and qt_material
+    # version, qt_material itself is only imported when the cache is missing.
+    package = importlib.util.find_spec('qt_material')
+    if package is None:
+        return
+    package_dir = Path(package.submodule_search_locations[0])
+    cache_dir = _cache_directory(theme)
+    icons_dir = cache_dir / 'icons'
+
+    cached = _read_cache(cache_dir) if (icons_dir / 'primary').is_dir() else None
+    if cached is None:
+        cached = _build(theme, icons_dir)
+        if cached is None:
+            return
+        with atomic_write(cache_dir / 'stylesheet.json') as file:
+            file.write(json.dumps(cached).encode('utf-8'))
+    else:
+        # what build_stylesheet does besides rendering
+        for font in (package_dir / 'fonts' / 'roboto').glob('*.ttf'):
+            QFontDatabase.addApplicationFont(str(font))
+        QDir.addSearchPath('icon', str(icons_dir))
+        QDir.addSearchPath('qt_material', str(package_dir / 'resources'))
+        primary_color = cached['primary_color']
+        palette = QGuiApplication.palette()
+        palette.setColor(QPalette.ColorRole.Text,
+                         QColor(*[int(primary_color[i:i + 2], 16) for i in range(1, 6, 2)], 92))
+        QGuiApplication.setPalette(palette)
+    widget.setStyleSheet(cached['stylesheet'])
+
+
+def _cache_directory(theme: str) -> Path:
+    version = importlib.metadata.version('qt-material')
+    location = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+    return Path(location) / 'stylesheets' / f'{Path(theme).stem}-{version}-{_CACHE_VERSION}'
+
+
+def _read_cache(cache_dir: Path) -> Optional[dict]:
+    try:
+        cached = json.loads((cache_dir / 'stylesheet.json').read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or not {'stylesheet', 'primary_color'} <= cached.keys():
+        return None
+    return cached
+
+
+def _build(theme: str, icons_dir: Path) -> Optional[dict]:
+    from qt_material import build_stylesheet, get_theme
+
+    os.makedirs(icons_dir, exist_ok=True)
+    # an absolute parent is used as the icons directory as is
+    stylesheet = build_stylesheet(theme, parent=str(icons_dir.resolve()))
+    if stylesheet is None:
+        return None
+    return {'stylesheet': stylesheet, 'primary_color': get_theme(theme)['primaryColor']}
@@ -1,13 +1,21 @@
 from pathlib import Path
+from typing import Callable, Dict
 
 from PySide6 import QtGui
 from PySide6.QtCore import Slot
 from PySide6.QtWidgets import QMainWindow, QStackedWidget
-from qt_material import apply_stylesheet
 
+from src.app.startup_profile import startup_phase
+from src.config import APP_THEME
 from src.ui.pages.MainPage import MainPage
-from src.ui.pages.ProjectPage import ProjectPage
 from src.ui.pages.WindowPage import GotoPayload, WindowPage
+from src.ui.stylesheet import apply_cached_stylesheet
+
+
+def _create_project_page() -> WindowPage:
+    # QtMultimedia and the rest of the project page load once a project is opened
+    from src.ui.pages.ProjectPage import ProjectPage
+    return ProjectPage()
 
 
 class MainWindow(QMainWindow):
@@ -18,29 +26,40 @@ class MainWindow(QMainWindow):
         self.setWindowIcon(QtGui.QIcon(str(Path("resources/icon.png").resolve())))
         self.setMinimumWidth(800)  # TODO: not hardcoded
         self.setMinimumHeight(600)  # TODO: not hardcoded
-        apply_stylesheet(self, theme='dark_purple.xml')
+        with startup_phase("stylesheet"):
+            apply_cached_stylesheet(self, APP_THEME)
         # TODO: icons
 
         # Page container
         self._stacked_widget = QStackedWidget(self)
         self.setCentralWidget(self._stacked_widget)
-        self._pages = {}
+        self._pages: Dict[str, WindowPage] = {}
+        # pages are created on their first visit
+        self._page_factories: Dict[str, Callable[[], WindowPage]] = {}
 
         # Pages
-        self._register_page(MainPage(), "main")
-        self._register_page(ProjectPage(), "project")
+        self._register_page(MainPage, "main")
+        self._register_page(_create_project_page, "project")
+
+        with startup_phase("main page"):
+            self._goto(GotoPayload("main"))
 
-        self._goto(GotoPayload("main"))
+    def _register_page(self, factory: Callable[[], WindowPage], name: str):
+        self._page_factories[name] = factory
 
-    def _register_page(self, page: WindowPage, name: str):
-        self._pages[name] = page
-        self._stacked_widget.addWidget(page)
-        page.goto_signal.connect(self._goto)
+    def _page(self, name: str) -> WindowPage:
+        page = self._pages.get(name)
+        if page is None:
+            page = self._page_factories[name]()
+            self._pages[name] = page
+            self._stacked_widget.addWidget(page)
+            page.goto_signal.connect(self._goto)
+        return page
 
     @Slot(GotoPayload)
     def _goto(self, payload: GotoPayload):
-        if payload.name in self._pages:
-            page = self._pages[payload.name]
+        if payload.name in self._page_factories:
+            page = self._page(payload.name)
             self._stacked_widget.setCurrentWidget(page)
             self.setWindowTitle(page.windowTitle())
             page.on_enter(payload.data)